@@ -1,27 +1,180 @@
+"""
+Alert email dispatch.
+
+A small pool of persistent, authenticated SMTP connections is shared by
+several sender workers. Every message takes a token from the shared "smtp"
+quota (app/quota.py) so the provider's rate limits hold across processes,
+and a connection that has dropped is reopened and the message retried once.
+
+`deliver_email()` sends one message and reports the outcome; the alert
+outbox workers (app/alert_outbox.py) call it and report per-batch
+throughput and failures. Point SMTP_HOST/SMTP_PORT at a local stand-in for
+testing, e.g.
+
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false ...
+"""
+
+import os
+import queue
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import os
+from typing import Dict, Optional, Tuple
+
+from app import quota
 
 EMAIL_SENDER = os.getenv("ALERT_EMAIL")        # your gmail
 EMAIL_PASSWORD = os.getenv("ALERT_EMAIL_PASS") # app password
 
-def send_email_alert(to_email: str, subject: str, message: str):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = EMAIL_SENDER
-        msg["To"] = to_email
-        msg["Subject"] = subject
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 3))
+# Probe connections idle longer than this before reusing them
+SMTP_IDLE_CHECK = 60
+
+# Only a lost connection is retried here. Every SMTPException is also an
+# OSError, and refused recipients, rejected data or a timeout after DATA must
+# not reconnect and resend; those go back to the outbox's retry/dead-letter path.
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError)
+
+_stats_lock = threading.Lock()
+_stats = {"sent": 0, "failed": 0, "rate_limited": 0, "connects": 0, "reconnects": 0}
+
+
+def _count(field: str, n: int = 1):
+    with _stats_lock:
+        _stats[field] += n
+
+
+class _Connection:
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def open(self):
+        self.close()
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if EMAIL_SENDER and EMAIL_PASSWORD:
+            smtp.login(EMAIL_SENDER, EMAIL_PASSWORD)
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        _count("connects")
+
+    def ensure_open(self):
+        if self.smtp is None:
+            self.open()
+        elif time.monotonic() - self.last_used > SMTP_IDLE_CHECK:
+            try:
+                if self.smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except OSError:
+                # Nothing has been sent yet, so any probe failure is safe to reconnect on
+                _count("reconnects")
+                self.open()
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
 
-        msg.attach(MIMEText(message, "plain"))
 
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+class _ConnectionPool:
+    """Up to SMTP_POOL_SIZE connections, opened lazily and reused across sends"""
 
-        return True
+    def __init__(self, size: int):
+        self._size = size
+        self._idle: "queue.LifoQueue[_Connection]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(_Connection())
+
+    def send(self, msg: MIMEMultipart):
+        conn = self._idle.get()
+        try:
+            conn.ensure_open()
+            try:
+                conn.smtp.send_message(msg)
+            except _RECONNECT_ERRORS:
+                # The server dropped us between messages; reconnect and retry once
+                _count("reconnects")
+                conn.open()
+                conn.smtp.send_message(msg)
+            conn.last_used = time.monotonic()
+        except _RECONNECT_ERRORS:
+            conn.close()
+            raise
+        except smtplib.SMTPException:
+            # The server answered (refused recipient, rejected data); the session is still usable
+            raise
+        except OSError:
+            # e.g. a timeout after DATA: the session state is unknown, don't reuse it
+            conn.close()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        # Connections go back closed and reopen lazily on the next send
+        for _ in range(self._size):
+            conn = self._idle.get()
+            conn.close()
+            self._idle.put(conn)
+
+
+_pool = _ConnectionPool(SMTP_POOL_SIZE)
+
+
+def _build_message(to_email: str, subject: str, message: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = EMAIL_SENDER
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(message, "plain"))
+    return msg
+
+
+def deliver_email(to_email: str, subject: str, message: str) -> Tuple[bool, Optional[str]]:
+    """Send one message through the pool; returns (ok, error)"""
+    try:
+        quota.acquire("smtp", "alerts", "alert_email")
+    except quota.QuotaExceeded as e:
+        _count("rate_limited")
+        return False, str(e)
+    try:
+        _pool.send(_build_message(to_email, subject, message))
     except Exception as e:
-        print("Email error:", e)
-        return False
+        _count("failed")
+        return False, str(e)
+    _count("sent")
+    return True, None
+
+
+def send_email_alert(to_email: str, subject: str, message: str):
+    ok, error = deliver_email(to_email, subject, message)
+    if not ok:
+        print("Email error:", error)
+    return ok
+
+
+def email_stats() -> Dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "host": f"{SMTP_HOST}:{SMTP_PORT}",
+            "pool_size": SMTP_POOL_SIZE,
+        }
+
+
+def close_pool():
+    """Quit every pooled SMTP connection (e.g. at shutdown)"""
+    _pool.close()
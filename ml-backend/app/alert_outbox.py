@@ -0,0 +1,380 @@
+"""
+Durable outbox for VajraSOS alert deliveries.
+
+The monitor only detects alerts and `enqueue()`s one message per farmer;
+delivery workers send the email, log the outcome to Firestore and retry
+failures with exponential backoff until OUTBOX_MAX_ATTEMPTS, after which the
+message is dead-lettered. A crashed run therefore loses nothing, and a slow
+SMTP server delays delivery without stretching detection.
+
+Messages live in a Redis stream (consumer group, with a sorted set for
+scheduled retries) through app/redis_client.py. When Redis is unreachable
+they go to a local SQLite table instead; workers drain both.
+
+Run workers outside the API process with:
+    python -m app.alert_outbox [--workers 4]
+"""
+
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app import alert_suppression
+from app.redis_client import get_redis
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTBOX_PATH = os.getenv("ALERT_OUTBOX_PATH", os.path.join(BASE_DIR, "Data", "alert_outbox.sqlite"))
+OUTBOX_WORKERS = int(os.getenv("ALERT_OUTBOX_WORKERS", 4))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("ALERT_OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_BACKOFF_BASE = float(os.getenv("ALERT_OUTBOX_BACKOFF_BASE", 30))
+OUTBOX_BACKOFF_MAX = float(os.getenv("ALERT_OUTBOX_BACKOFF_MAX", 3600))
+# Messages claimed by a worker that died are re-delivered after this long
+OUTBOX_CLAIM_IDLE = int(os.getenv("ALERT_OUTBOX_CLAIM_IDLE", 300))
+
+STREAM = "vajra:outbox"
+RETRY_SET = "vajra:outbox:retry"
+DEAD_STREAM = "vajra:outbox:dead"
+GROUP = "delivery"
+REDIS_RETRY_SECONDS = 30
+BATCH = 10
+
+_lock = threading.Lock()
+_conn = None
+_redis_down_until = 0.0
+_group_ready = False
+_consumer = f"{socket.gethostname()}-{os.getpid()}"
+_workers: List[threading.Thread] = []
+_stop = threading.Event()
+_lag = deque(maxlen=1000)
+_batches = deque(maxlen=100)  # per-batch send throughput and failures
+_stats = {"enqueued": 0, "delivered": 0, "retried": 0, "dead": 0, "redis": 0, "sqlite": 0}
+
+
+def _count(field: str, n: int = 1):
+    with _lock:
+        _stats[field] += n
+
+
+# -------------------- BACKENDS --------------------
+
+def _redis():
+    """Redis client with the consumer group in place, or None while it is considered down"""
+    global _group_ready
+    if time.time() < _redis_down_until:
+        return None
+    r = get_redis()
+    if not _group_ready:
+        try:
+            r.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                _mark_redis_down(e)
+                return None
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+            return None
+        _group_ready = True
+    return r
+
+
+def _mark_redis_down(e: Exception):
+    global _redis_down_until
+    if time.time() >= _redis_down_until:
+        print(f"⚠️ Alert outbox using SQLite (Redis unavailable: {e})")
+    _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(OUTBOX_PATH), exist_ok=True)
+        _conn = sqlite3.connect(OUTBOX_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id TEXT PRIMARY KEY, payload TEXT, created_at REAL, due_at REAL, attempts INTEGER,"
+            " status TEXT, claimed_at REAL, last_error TEXT)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, due_at)")
+    return _conn
+
+
+# -------------------- PRODUCER --------------------
+
+def enqueue(farmer: Dict, alert: str, subject: str, body: str, condition: Optional[Dict] = None,
+            suppression: Optional[List[Tuple]] = None) -> str:
+    """Durably queue one alert delivery; returns the message id
+
+    `suppression` holds the app/alert_suppression.py entries recorded for
+    this alert; they are released if the message is dead-lettered.
+    """
+    message = {
+        "id": uuid.uuid4().hex,
+        "uid": farmer["uid"],
+        "email": farmer.get("email"),
+        "district": farmer.get("district"),
+        "alert": alert,
+        "subject": subject,
+        "body": body,
+        "condition": condition,
+        "suppression": [list(entry) for entry in suppression or []],
+        "created_at": time.time(),
+        "attempts": 0,
+    }
+    _store(message, due_at=message["created_at"])
+    _count("enqueued")
+    return message["id"]
+
+
+def _store(message: Dict, due_at: float):
+    r = _redis()
+    if r is not None:
+        try:
+            if due_at <= time.time():
+                r.xadd(STREAM, {"message": json.dumps(message)})
+            else:
+                r.zadd(RETRY_SET, {json.dumps(message): due_at})
+            return
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    with _lock:
+        _db().execute(
+            "INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?, 'pending', NULL, NULL)",
+            (message["id"], json.dumps(message), message["created_at"], due_at, message["attempts"]),
+        )
+
+
+def _dead_letter(message: Dict):
+    r = _redis()
+    if r is not None:
+        try:
+            r.xadd(DEAD_STREAM, {"message": json.dumps(message)}, maxlen=100000, approximate=True)
+            return
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    with _lock:
+        _db().execute(
+            "INSERT OR REPLACE INTO outbox VALUES (?, ?, ?, ?, ?, 'dead', NULL, ?)",
+            (message["id"], json.dumps(message), message["created_at"], time.time(),
+             message["attempts"], message.get("last_error")),
+        )
+
+
+# -------------------- CONSUMER --------------------
+
+def _claim_redis(r) -> List[Tuple[str, Dict]]:
+    # Move due retries back onto the stream; ZREM decides which worker owns each one
+    for raw in r.zrangebyscore(RETRY_SET, 0, time.time(), start=0, num=BATCH):
+        if r.zrem(RETRY_SET, raw):
+            r.xadd(STREAM, {"message": raw})
+
+    # Take over messages whose consumer died mid-delivery
+    claimed = r.xautoclaim(STREAM, GROUP, _consumer, min_idle_time=OUTBOX_CLAIM_IDLE * 1000, count=BATCH)
+    entries = claimed[1] if claimed else []
+    if not entries:
+        result = r.xreadgroup(GROUP, _consumer, {STREAM: ">"}, count=BATCH, block=1000)
+        entries = result[0][1] if result else []
+    return [
+        (entry_id.decode() if isinstance(entry_id, bytes) else entry_id, json.loads(fields[b"message"]))
+        for entry_id, fields in entries if fields
+    ]
+
+
+def _claim_sqlite() -> List[Dict]:
+    now = time.time()
+    with _lock:
+        rows = _db().execute(
+            "UPDATE outbox SET status = 'inflight', claimed_at = ? WHERE id IN ("
+            " SELECT id FROM outbox WHERE (status = 'pending' AND due_at <= ?)"
+            " OR (status = 'inflight' AND claimed_at < ?) ORDER BY due_at LIMIT ?)"
+            " RETURNING payload, attempts",
+            (now, now, now - OUTBOX_CLAIM_IDLE, BATCH),
+        ).fetchall()
+    return [{**json.loads(payload), "attempts": attempts} for payload, attempts in rows]
+
+
+def _backoff(attempts: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** attempts))
+
+
+def _deliver(message: Dict) -> Tuple[bool, Optional[str]]:
+    """Send one message; reschedule or dead-letter it on failure. Returns (ok, error)"""
+    from app.alert_email_service import deliver_email
+    from app.vajra_sos import log_alert_to_firestore
+
+    if message.get("email"):
+        ok, error = deliver_email(message["email"], message["subject"], message["body"])
+    else:
+        ok, error = False, "no email address"
+
+    if ok:
+        _count("delivered")
+        with _lock:
+            _lag.append(time.time() - message["created_at"])
+        log_alert_to_firestore(message["uid"], message["alert"], True, condition=message.get("condition"))
+        return True, None
+
+    message["attempts"] += 1
+    message["last_error"] = error
+    if message["attempts"] >= OUTBOX_MAX_ATTEMPTS or not message.get("email"):
+        _count("dead")
+        print(f"💀 Alert for {message['uid']} dead-lettered after {message['attempts']} attempts: {error}")
+        _dead_letter(message)
+        # The farmer never got it, so the next run may alert again
+        alert_suppression.forget([tuple(entry) for entry in message.get("suppression") or []])
+        log_alert_to_firestore(message["uid"], message["alert"], False, condition=message.get("condition"))
+    else:
+        _count("retried")
+        _store(message, due_at=time.time() + _backoff(message["attempts"]))
+    return False, error
+
+
+def _record_batch(started: float, outcomes: List[Tuple[str, bool, Optional[str]]]):
+    if not outcomes:
+        return
+    duration = time.monotonic() - started
+    sent = sum(1 for _, ok, _ in outcomes if ok)
+    with _lock:
+        _batches.append({
+            "finished_at": time.time(),
+            "handled": len(outcomes),
+            "sent": sent,
+            "failed": len(outcomes) - sent,
+            "duration_seconds": round(duration, 3),
+            "per_second": round(sent / duration, 2) if duration > 0 else None,
+            "failures": [{"uid": uid, "error": error} for uid, ok, error in outcomes if not ok][:5],
+        })
+
+
+def poll_once() -> int:
+    """Claim and deliver one batch from each backend; returns messages handled"""
+    started = time.monotonic()
+    outcomes = []
+    r = _redis()
+    if r is not None:
+        try:
+            for entry_id, message in _claim_redis(r):
+                outcomes.append((message["uid"], *_deliver(message)))
+                # Acknowledge only after the outcome is durable (sent, rescheduled or dead)
+                r.xack(STREAM, GROUP, entry_id)
+                r.xdel(STREAM, entry_id)
+                _count("redis")
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+
+    for message in _claim_sqlite():
+        outcomes.append((message["uid"], *_deliver(message)))
+        with _lock:
+            _db().execute("DELETE FROM outbox WHERE id = ? AND status = 'inflight'", (message["id"],))
+        _count("sqlite")
+    _record_batch(started, outcomes)
+    return len(outcomes)
+
+
+def _worker_loop():
+    while not _stop.is_set():
+        try:
+            if not poll_once():
+                _stop.wait(1.0)
+        except Exception as e:
+            print(f"🔥 Alert outbox worker error: {e}")
+            _stop.wait(5.0)
+
+
+def start_delivery_workers(count: int = OUTBOX_WORKERS):
+    """Start background delivery workers (idempotent)"""
+    _stop.clear()
+    alive = [t for t in _workers if t.is_alive()]
+    _workers[:] = alive
+    for i in range(len(alive), count):
+        thread = threading.Thread(target=_worker_loop, name=f"alert-outbox-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+
+def stop_delivery_workers(timeout: float = 10.0):
+    _stop.set()
+    for thread in _workers:
+        thread.join(timeout)
+
+
+# -------------------- METRICS --------------------
+
+def outbox_stats() -> Dict:
+    """Queue depth, oldest pending age, delivery lag (enqueue -> sent) and recent batch throughput"""
+    depth = {"redis": None, "retry_scheduled": None, "dead": None}
+    oldest = None
+    r = _redis()
+    if r is not None:
+        try:
+            depth["redis"] = r.xlen(STREAM)
+            depth["retry_scheduled"] = r.zcard(RETRY_SET)
+            depth["dead"] = r.xlen(DEAD_STREAM)
+            first = r.xrange(STREAM, count=1)
+            if first:
+                oldest = json.loads(first[0][1][b"message"])["created_at"]
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+
+    with _lock:
+        counts = dict(_db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        local_oldest = _db().execute(
+            "SELECT MIN(created_at) FROM outbox WHERE status != 'dead'"
+        ).fetchone()[0]
+        lag = sorted(_lag)
+        stats = dict(_stats)
+        batches = list(_batches)
+    if local_oldest is not None:
+        oldest = min(oldest, local_oldest) if oldest is not None else local_oldest
+
+    return {
+        **stats,
+        "depth": {**depth, "sqlite": counts.get("pending", 0) + counts.get("inflight", 0),
+                  "sqlite_dead": counts.get("dead", 0)},
+        "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+        "delivery_lag_seconds": {
+            "p50": round(lag[len(lag) // 2], 1) if lag else None,
+            "p95": round(lag[int(0.95 * (len(lag) - 1))], 1) if lag else None,
+            "max": round(lag[-1], 1) if lag else None,
+        },
+        "workers": sum(1 for t in _workers if t.is_alive()),
+        "batches": {
+            "sent": sum(b["sent"] for b in batches),
+            "failed": sum(b["failed"] for b in batches),
+            "per_second": _rate(batches),
+            "recent": batches[-10:],
+        },
+    }
+
+
+def _rate(batches: List[Dict]) -> Optional[float]:
+    """Messages sent per second of delivery work over the given batches"""
+    busy = sum(b["duration_seconds"] for b in batches)
+    return round(sum(b["sent"] for b in batches) / busy, 2) if busy > 0 else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="VajraSOS alert delivery workers")
+    parser.add_argument("--workers", type=int, default=OUTBOX_WORKERS)
+    args = parser.parse_args()
+
+    start_delivery_workers(args.workers)
+    print(f"📬 Alert outbox: {args.workers} delivery worker(s) running. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(60)
+            print(outbox_stats())
+    except KeyboardInterrupt:
+        stop_delivery_workers()
@@ -0,0 +1,309 @@
+"""
+Declarative, vectorised VajraSOS weather alert rules.
+
+Current weather plus forecast slots for many locations are normalised into
+one array of shape (locations, slots, VARIABLES); slot 0 is the current
+observation and slots 1.. are the 3-hourly forecast up to the horizon. Each
+entry in METRICS reduces one variable over a window of slots for every
+location at once, and RULES compares metrics against thresholds:
+
+    "when"     [(metric, op, threshold), ...], combined with "match" all/any
+    "group"    rules sharing a group are exclusive; the first match wins. The
+               group (or the rule id) is the alert's "hazard", which repeat
+               suppression compares severities within
+    "severity" high | medium | low, carried on the alert itself
+    "message"  str.format template over the metrics (and {horizon}, {times})
+    "times"    (variable, op, threshold): {times} lists the first matching slots
+
+Locations where no rule fires get FALLBACK, and at most MAX_ALERTS alerts
+are kept per location (in RULES order) so messages stay SMS-sized.
+
+    python -m app.alert_rules --locations 5000 --horizon 120
+"""
+
+import operator
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VARIABLES = ("temp", "humidity", "rain", "wind", "fog")
+_VAR = {name: i for i, name in enumerate(VARIABLES)}
+
+# name: (variable, aggregation, window[, threshold]); windows: now | forecast | all
+METRICS = {
+    "max_temp": ("temp", "max", "all"),
+    "min_temp": ("temp", "min", "all"),
+    "temp_range": ("temp", "range", "all"),
+    "total_rain": ("rain", "sum", "forecast"),
+    "max_rain": ("rain", "max", "forecast"),
+    "max_humidity": ("humidity", "max", "all"),
+    "humid_slots": ("humidity", "count_ge", "all", 80),
+    "wind_now": ("wind", "max", "now"),
+    "max_wind": ("wind", "max", "forecast"),
+    "fog_now": ("fog", "max", "now"),
+}
+
+RULES = [
+    {"id": "heatwave", "group": "temp_level", "severity": "high",
+     "when": [("max_temp", ">=", 38)],
+     "message": "🔥 Heatwave risk {max_temp:.0f}°C. Avoid 11-4, increase irrigation, shade tender crops."},
+    {"id": "hot_day", "group": "temp_level", "severity": "medium",
+     "when": [("max_temp", ">=", 34)],
+     "message": "☀️ Hot day {max_temp:.0f}°C. Irrigate early morning/evening to reduce stress."},
+    {"id": "cold_night", "severity": "high",
+     "when": [("min_temp", "<=", 12)],
+     "message": "❄️ Cold night {min_temp:.0f}°C. Protect seedlings; avoid late-evening irrigation."},
+    {"id": "temp_swing", "severity": "medium",
+     "when": [("temp_range", ">=", 12)],
+     "message": "📊 Large temp swing ({min_temp:.0f}–{max_temp:.0f}°C). Maintain soil moisture to buffer stress."},
+    {"id": "heavy_rain", "group": "rain_amount", "severity": "high",
+     "when": [("total_rain", ">=", 20)],
+     "message": "🌧️ Heavy rain ~{total_rain:.1f}mm next {horizon}h. Ensure drainage; postpone spraying/fertilizer."},
+    {"id": "moderate_rain", "group": "rain_amount", "severity": "medium",
+     "when": [("total_rain", ">=", 5)],
+     "message": "🌦️ Moderate rain ~{total_rain:.1f}mm. Good soil moisture; plan field work before showers."},
+    {"id": "light_rain", "group": "rain_amount", "severity": "low",
+     "when": [("total_rain", ">", 0)],
+     "message": "💧 Light rain ~{total_rain:.1f}mm. Minor benefit; plan spray 4-6h before rain."},
+    {"id": "rain_bursts", "severity": "high",
+     "when": [("max_rain", ">=", 10)], "times": ("rain", ">=", 10),
+     "message": "⏰ Heavy bursts expected around {times}. Secure inputs, cover harvested produce."},
+    {"id": "rain_timing", "group": "moisture", "severity": "low",
+     "when": [("max_rain", ">", 0)], "times": ("rain", ">", 0),
+     "message": "⏰ Rain likely around {times}. Schedule spraying/harvest before then."},
+    {"id": "humidity", "group": "moisture", "severity": "low",
+     "when": [("max_humidity", ">=", 80), ("humid_slots", ">=", 3)],
+     "message": "💨 Prolonged humidity ({humid_slots}h >80%). Improve airflow; monitor fungal spots."},
+    {"id": "strong_wind", "group": "wind", "severity": "high", "match": "any",
+     "when": [("wind_now", ">=", 12), ("max_wind", ">=", 12)],
+     "message": "💨 Strong winds. Avoid spraying; secure lightweight structures and support tall plants."},
+    {"id": "moderate_wind", "group": "wind", "severity": "medium", "match": "any",
+     "when": [("wind_now", ">=", 8), ("max_wind", ">=", 9)],
+     "message": "🍃 Moderate winds. Check wind direction before spraying; stake tall crops if needed."},
+    {"id": "fog", "severity": "medium",
+     "when": [("fog_now", ">=", 1)],
+     "message": "🌫️ Low visibility due to fog. Be cautious during transport/field work."},
+]
+
+FALLBACK = {"id": "favorable", "severity": "low",
+            "message": "✅ Conditions favorable. Good window for sowing/field operations."}
+MAX_ALERTS = 3
+TIMES_LISTED = 2
+
+_WINDOWS = {"now": slice(0, 1), "forecast": slice(1, None), "all": slice(None)}
+_OPS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt}
+
+
+# -------------------- NORMALISATION --------------------
+
+def forecast_window(forecast: Optional[Dict], hours: int) -> Optional[List[Dict]]:
+    """Trim a raw OpenWeather forecast payload to the 3-hourly slots in the next `hours`"""
+    if not forecast:
+        return None
+
+    now = datetime.utcnow().timestamp()
+    slots = []
+    for item in forecast.get("list", []):
+        ts = item.get("dt")
+        if ts and 0 <= ts - now <= hours * 3600:
+            slots.append(item)
+    return slots or None
+
+
+def normalize(locations: Sequence[Tuple[Dict, Optional[List[Dict]]]], horizon_hours: int = 24) -> Dict:
+    """Stack (current weather, forecast slots) pairs into one slot array
+
+    Forecast slots missing a temperature or humidity reuse the current
+    reading; missing rain and wind count as zero. Shorter forecasts are
+    padded and masked out through "valid".
+    """
+    n_slots = 1 + max((len(forecast or []) for _, forecast in locations), default=0)
+    values = np.zeros((len(locations), n_slots, len(VARIABLES)))
+    valid = np.zeros((len(locations), n_slots), dtype=bool)
+    times = []
+
+    for i, (current, forecast) in enumerate(locations):
+        main = (current or {}).get("main", {})
+        weather = ((current or {}).get("weather") or [{}])[0] or {}
+        desc = (weather.get("description", "") or "").lower()
+        temp = main.get("temp", 0)
+        humidity = main.get("humidity", 0)
+        values[i, 0] = (temp, humidity, 0, ((current or {}).get("wind") or {}).get("speed", 0),
+                        1 if ("fog" in desc or "mist" in desc) else 0)
+        valid[i, 0] = True
+
+        slot_times = [None]
+        for j, item in enumerate(forecast or [], start=1):
+            main_f = item.get("main", {})
+            values[i, j] = (
+                main_f.get("temp", temp),
+                main_f.get("humidity", humidity),
+                (item.get("rain", {}) or {}).get("3h") or 0,
+                (item.get("wind", {}) or {}).get("speed") or 0,
+                0,
+            )
+            valid[i, j] = True
+            slot_times.append(item.get("dt_txt") or item.get("dt"))
+        times.append(slot_times)
+
+    return {"values": values, "valid": valid, "times": times, "horizon_hours": horizon_hours}
+
+
+# -------------------- EVALUATION --------------------
+
+def compute_metrics(batch: Dict) -> Dict[str, np.ndarray]:
+    """Every METRICS entry as a (locations,) array"""
+    metrics = {}
+    for name, (variable, aggregation, window, *args) in METRICS.items():
+        sl = _WINDOWS[window]
+        x = batch["values"][:, sl, _VAR[variable]]
+        v = batch["valid"][:, sl]
+        if aggregation == "max":
+            metrics[name] = np.max(x, axis=1, where=v, initial=-np.inf)
+        elif aggregation == "min":
+            metrics[name] = np.min(x, axis=1, where=v, initial=np.inf)
+        elif aggregation == "sum":
+            metrics[name] = np.sum(x, axis=1, where=v)
+        elif aggregation == "range":
+            metrics[name] = (np.max(x, axis=1, where=v, initial=-np.inf)
+                             - np.min(x, axis=1, where=v, initial=np.inf))
+        elif aggregation == "count_ge":
+            metrics[name] = np.sum((x >= args[0]) & v, axis=1)
+        else:
+            raise ValueError(f"Unknown aggregation {aggregation!r} for metric {name}")
+    return metrics
+
+
+def _fmt_time(ts) -> str:
+    try:
+        if isinstance(ts, (int, float)):
+            dt = datetime.utcfromtimestamp(ts)
+        else:
+            dt = datetime.strptime(str(ts), "%Y-%m-%d %H:%M:%S")
+        return dt.strftime("%d %b, %I %p").lstrip("0").replace(" 0", " ")
+    except Exception:
+        return "soon"
+
+
+def _slot_times(batch: Dict, i: int, spec: Tuple[str, str, float]) -> str:
+    variable, op, threshold = spec
+    x = batch["values"][i, 1:, _VAR[variable]]
+    hits = np.flatnonzero(_OPS[op](x, threshold) & batch["valid"][i, 1:])[:TIMES_LISTED]
+    return ", ".join(_fmt_time(batch["times"][i][j + 1]) for j in hits)
+
+
+def evaluate(batch: Dict, rules: List[Dict] = None) -> List[List[Dict]]:
+    """Alerts per location: [{"rule", "hazard", "severity", "message", "values"}, ...]"""
+    rules = RULES if rules is None else rules
+    n = batch["values"].shape[0]
+    metrics = compute_metrics(batch)
+
+    fired = np.zeros((len(rules), n), dtype=bool)
+    taken: Dict[str, np.ndarray] = {}
+    for r, rule in enumerate(rules):
+        tests = [_OPS[op](metrics[metric], threshold) for metric, op, threshold in rule["when"]]
+        hit = np.logical_or.reduce(tests) if rule.get("match") == "any" else np.logical_and.reduce(tests)
+        group = rule.get("group")
+        if group:
+            hit &= ~taken.get(group, np.zeros(n, dtype=bool))
+            taken[group] = taken.get(group, np.zeros(n, dtype=bool)) | hit
+        fired[r] = hit
+
+    # Formatting is per alert, so only the (location, rule) pairs that fired are visited
+    columns = {name: values.tolist() for name, values in metrics.items()}
+    results: List[List[Dict]] = [[] for _ in range(n)]
+    for i, r in zip(*np.nonzero(fired.T)):
+        alerts = results[i]
+        if len(alerts) >= MAX_ALERTS:
+            continue
+        rule = rules[r]
+        fields = {name: column[i] for name, column in columns.items()}
+        fields["horizon"] = batch["horizon_hours"]
+        if "times" in rule:
+            fields["times"] = _slot_times(batch, i, rule["times"])
+        alerts.append({"rule": rule["id"], "hazard": rule.get("group", rule["id"]), "severity": rule["severity"],
+                       "message": rule["message"].format(**fields),
+                       "values": {name: fields[name] for name, _, _ in rule["when"]}})
+    for alerts in results:
+        if not alerts:
+            alerts.append({"rule": FALLBACK["id"], "hazard": FALLBACK["id"], "severity": FALLBACK["severity"],
+                           "message": FALLBACK["message"], "values": {}})
+    return results
+
+
+def evaluate_one(current_weather: Dict, forecast: Optional[List[Dict]], horizon_hours: int = 24) -> List[Dict]:
+    return evaluate(normalize([(current_weather, forecast)], horizon_hours))[0]
+
+
+def alert_text(alerts: List[Dict]) -> Optional[str]:
+    """The " | "-joined message form used for emails and SMS"""
+    return " | ".join(alert["message"] for alert in alerts) if alerts else None
+
+
+# -------------------- BENCHMARK --------------------
+
+def _synthetic_locations(n: int, horizon_hours: int, seed: int = 0) -> List[Tuple[Dict, List[Dict]]]:
+    rng = np.random.default_rng(seed)
+    start = int(time.time())
+    n_slots = horizon_hours // 3
+    locations = []
+    for _ in range(n):
+        base = rng.uniform(8, 36)
+        current = {
+            "main": {"temp": base, "humidity": float(rng.uniform(30, 95))},
+            "weather": [{"description": str(rng.choice(["clear sky", "mist", "light rain", "haze"]))}],
+            "wind": {"speed": float(rng.gamma(2, 2.5))},
+        }
+        forecast = []
+        for j in range(n_slots):
+            item = {
+                "dt": start + 3600 * 3 * (j + 1),
+                "main": {"temp": base + float(rng.normal(0, 3)), "humidity": float(rng.uniform(30, 100))},
+                "wind": {"speed": float(rng.gamma(2, 2.5))},
+            }
+            if rng.random() < 0.2:
+                item["rain"] = {"3h": float(rng.exponential(4))}
+            forecast.append(item)
+        locations.append((current, forecast))
+    return locations
+
+
+def benchmark(n_locations: int = 2000, horizon_hours: int = 24) -> Dict:
+    """Time batched evaluation against evaluating locations one at a time"""
+    locations = _synthetic_locations(n_locations, horizon_hours)
+
+    started = time.perf_counter()
+    batch = normalize(locations, horizon_hours)
+    normalized = time.perf_counter()
+    batched = evaluate(batch)
+    evaluated = time.perf_counter()
+    single = [evaluate_one(current, forecast, horizon_hours) for current, forecast in locations]
+    finished = time.perf_counter()
+
+    assert [alert_text(a) for a in batched] == [alert_text(a) for a in single]
+    fired: Dict[str, int] = {}
+    for alerts in batched:
+        for alert in alerts:
+            fired[alert["rule"]] = fired.get(alert["rule"], 0) + 1
+    return {
+        "locations": n_locations,
+        "slots": batch["values"].shape[1],
+        "horizon_hours": horizon_hours,
+        "normalize_ms": round(1000 * (normalized - started), 1),
+        "evaluate_ms": round(1000 * (evaluated - normalized), 1),
+        "one_at_a_time_ms": round(1000 * (finished - evaluated), 1),
+        "per_location_us": round(1e6 * (evaluated - started) / n_locations, 1),
+        "rules_fired": fired,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the VajraSOS alert rule engine")
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--horizon", type=int, default=24, help="Forecast horizon in hours")
+    args = parser.parse_args()
+    print(benchmark(args.locations, args.horizon))
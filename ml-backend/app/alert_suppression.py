@@ -0,0 +1,136 @@
+"""
+Per-farmer alert suppression.
+
+Records, per farmer and district, the highest severity already sent for
+each hazard (an alert rule group such as "temp_level" or "rain_amount", see
+app/alert_rules.py). Within ALERT_SUPPRESSION_WINDOW a hazard is only sent
+again when its severity escalates (hot day -> heatwave); an escalation
+restarts the window. Entries are recorded when the alert is queued and
+released with `forget()` if the outbox dead-letters it.
+
+State lives in Redis (app/redis_client.py) so every monitor process shares
+it, with a per-process fallback while Redis is unreachable.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import redis
+
+from app.redis_client import get_redis
+
+ALERT_SUPPRESSION_WINDOW = int(os.getenv("ALERT_SUPPRESSION_WINDOW", 6 * 3600))
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3}
+REDIS_RETRY_SECONDS = 30
+
+# KEYS: suppression key; ARGV: severity rank, window seconds
+_CHECK_AND_SET_LUA = """
+local previous = tonumber(redis.call('GET', KEYS[1]) or '0')
+if previous >= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+return 1
+"""
+
+_lock = threading.Lock()
+_script = None
+_redis_down_until = 0.0
+_local: Dict[str, Tuple[int, float]] = {}
+_stats = {"checked": 0, "suppressed": 0, "forgotten": 0}
+
+
+def _key(uid: str, district: str, hazard: str) -> str:
+    return f"vajra:suppress:{uid}:{district}:{hazard}"
+
+
+def _redis():
+    global _script
+    if time.time() < _redis_down_until:
+        return None
+    r = get_redis()
+    if _script is None:
+        _script = r.register_script(_CHECK_AND_SET_LUA)
+    return r
+
+
+def _mark_redis_down(e: Exception):
+    global _redis_down_until
+    if time.time() >= _redis_down_until:
+        print(f"⚠️ Alert suppression using local store (Redis unavailable: {e})")
+    _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+
+def _check_local(keys: List[str], ranks: List[int], window: int) -> List[bool]:
+    now = time.time()
+    allowed = []
+    with _lock:
+        for key, rank in zip(keys, ranks):
+            previous, expires = _local.get(key, (0, 0.0))
+            if expires > now and previous >= rank:
+                allowed.append(False)
+                continue
+            _local[key] = (rank, now + window)
+            allowed.append(True)
+        if len(_local) > 100000:
+            for key in [k for k, (_, expires) in _local.items() if expires <= now]:
+                del _local[key]
+    return allowed
+
+
+def filter_new(entries: List[Tuple[str, str, str, str]], window: int = None) -> List[bool]:
+    """For each (uid, district, hazard, severity): True if it should be sent, recording it if so
+
+    All entries are checked in one Redis round trip.
+    """
+    window = ALERT_SUPPRESSION_WINDOW if window is None else window
+    if not entries:
+        return []
+    keys = [_key(uid, district, hazard) for uid, district, hazard, _ in entries]
+    ranks = [SEVERITY_RANK.get(severity, 1) for *_, severity in entries]
+
+    allowed = None
+    r = _redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key, rank in zip(keys, ranks):
+                _script(keys=[key], args=[rank, window], client=pipe)
+            allowed = [bool(int(result)) for result in pipe.execute()]
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    if allowed is None:
+        allowed = _check_local(keys, ranks, window)
+
+    with _lock:
+        _stats["checked"] += len(allowed)
+        _stats["suppressed"] += allowed.count(False)
+    return allowed
+
+
+def forget(entries: List[Tuple[str, str, str, str]]):
+    """Drop recorded entries again (the alert was never delivered)"""
+    if not entries:
+        return
+    keys = [_key(uid, district, hazard) for uid, district, hazard, _ in entries]
+    with _lock:
+        for key in keys:
+            _local.pop(key, None)
+        _stats["forgotten"] += len(keys)
+    r = _redis()
+    if r is not None:
+        try:
+            r.delete(*keys)
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+
+
+def suppression_stats() -> Dict:
+    with _lock:
+        return {
+            **_stats,
+            "window_seconds": ALERT_SUPPRESSION_WINDOW,
+            "backend": "local" if time.time() < _redis_down_until else "redis",
+        }
@@ -0,0 +1,444 @@
+"""
+Precomputed Karnataka district boundaries.
+
+`build()` ingests the district polygons once (FAO GAUL level 2 from Earth
+Engine, or a local GeoJSON file) and stores Douglas-Peucker simplified
+copies for several zoom levels in Data/district_boundaries.json. The file is
+loaded into memory at startup; the satellite router serves it as GeoJSON and
+as hand-encoded Mapbox vector tiles, and `district_at()` finds the district
+containing a point through a coarse grid index.
+
+    python -m app.boundaries build [--source districts.geojson] [--name-field dtname]
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.geocoder import normalize, resolve_district
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BOUNDARIES_PATH = os.getenv("BOUNDARIES_PATH", os.path.join(BASE_DIR, "Data", "district_boundaries.json"))
+GAUL_COLLECTION = "FAO/GAUL/2015/level2"
+STATE_NAME = "Karnataka"
+NAME_FIELDS = ("ADM2_NAME", "district", "DISTRICT", "dtname", "NAME_2", "name")
+
+# Each level is simplified to about a quarter pixel at its zoom; "full" keeps the source
+SIMPLIFY_ZOOMS = (4, 6, 8, 10, 12)
+GRID_DEG = 0.25
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_LAYER = "districts"
+
+_lock = threading.Lock()
+_loaded: Optional[Dict] = None
+
+
+# -------------------- SIMPLIFICATION --------------------
+
+def _simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker on a closed ring, iterative so large rings don't recurse"""
+    if len(ring) <= 4:
+        return ring
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    # Split the ring at its farthest vertex so both halves have distinct endpoints
+    far = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    keep[far] = True
+    stack = [(0, far), (far, len(ring) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = ring[start], ring[end]
+        seg = ring[start + 1:end]
+        dx, dy = b - a
+        length = math.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(*(seg - a).T)
+        else:
+            dist = np.abs(dx * (a[1] - seg[:, 1]) - dy * (a[0] - seg[:, 0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return ring[keep]
+
+
+def _simplify_polygons(polygons: List[List[np.ndarray]], tolerance: float) -> List[List[np.ndarray]]:
+    result = []
+    for polygon in polygons:
+        rings = [_simplify_ring(ring, tolerance) for ring in polygon]
+        # Drop parts and holes that collapse at this resolution
+        if len(rings[0]) < 4:
+            continue
+        result.append([rings[0]] + [r for r in rings[1:] if len(r) >= 4])
+    return result
+
+
+def _tolerance(zoom: int) -> float:
+    return 360.0 / (256 * 2 ** zoom) / 4
+
+
+# -------------------- BUILD --------------------
+
+def _polygons_from_geometry(geometry: Dict) -> List[List[np.ndarray]]:
+    if geometry["type"] == "Polygon":
+        parts = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        parts = geometry["coordinates"]
+    elif geometry["type"] == "GeometryCollection":
+        return [p for g in geometry["geometries"] for p in _polygons_from_geometry(g)]
+    else:
+        return []
+    return [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in part] for part in parts]
+
+
+def _geometry(polygons: List[List[np.ndarray]], digits: int = 6) -> Dict:
+    coords = [[np.round(ring, digits).tolist() for ring in polygon] for polygon in polygons]
+    return {"type": "MultiPolygon", "coordinates": coords}
+
+
+def _features_from_gaul() -> List[Dict]:
+    from app.ee_session import require_ee
+
+    ee = require_ee()
+    districts = ee.FeatureCollection(GAUL_COLLECTION).filter(ee.Filter.eq("ADM1_NAME", STATE_NAME))
+    names = districts.aggregate_array("ADM2_NAME").getInfo()
+    features = []
+    # One district per request keeps every getInfo payload small
+    for name in names:
+        geometry = districts.filter(ee.Filter.eq("ADM2_NAME", name)).geometry().getInfo()
+        features.append({"type": "Feature", "properties": {"ADM2_NAME": name}, "geometry": geometry})
+        print(f"🗺️ Fetched boundary for {name}")
+    return features
+
+
+def build(source: Optional[str] = None, name_field: Optional[str] = None) -> Dict:
+    """Ingest district polygons and write every simplified level to BOUNDARIES_PATH"""
+    if source:
+        with open(source, "r") as f:
+            features = json.load(f)["features"]
+    else:
+        features = _features_from_gaul()
+
+    merged: Dict[str, Dict] = {}
+    for feature in features:
+        props = feature.get("properties") or {}
+        field = name_field or next((k for k in NAME_FIELDS if props.get(k)), None)
+        if field is None or not feature.get("geometry"):
+            continue
+        name = props[field]
+        key = resolve_district(name) or normalize(name)
+        entry = merged.setdefault(key, {"name": name, "polygons": []})
+        entry["polygons"].extend(_polygons_from_geometry(feature["geometry"]))
+
+    districts = {}
+    for key, entry in merged.items():
+        polygons = entry["polygons"]
+        points = np.concatenate([p[0] for p in polygons])
+        levels = {str(z): _geometry(_simplify_polygons(polygons, _tolerance(z))) for z in SIMPLIFY_ZOOMS}
+        levels["full"] = _geometry(polygons)
+        districts[key] = {
+            "name": entry["name"],
+            "bbox": [round(float(v), 6) for v in (*points.min(axis=0), *points.max(axis=0))],
+            "levels": levels,
+        }
+
+    data = {
+        "source": source or GAUL_COLLECTION,
+        "built_at": datetime.utcnow().isoformat(),
+        "zooms": list(SIMPLIFY_ZOOMS),
+        "districts": districts,
+    }
+    os.makedirs(os.path.dirname(BOUNDARIES_PATH), exist_ok=True)
+    with open(BOUNDARIES_PATH + ".tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(BOUNDARIES_PATH + ".tmp", BOUNDARIES_PATH)
+    return {"districts": len(districts), "path": BOUNDARIES_PATH}
+
+
+# -------------------- IN-MEMORY STORE --------------------
+
+def load() -> Optional[Dict]:
+    """Load the built boundaries (once, or again after a rebuild)"""
+    global _loaded
+    if not os.path.exists(BOUNDARIES_PATH):
+        return None
+    mtime = os.path.getmtime(BOUNDARIES_PATH)
+    with _lock:
+        if _loaded is None or _loaded["mtime"] != mtime:
+            with open(BOUNDARIES_PATH, "r") as f:
+                data = json.load(f)
+            polygons = {
+                key: [[np.asarray(ring) for ring in polygon] for polygon in d["levels"]["full"]["coordinates"]]
+                for key, d in data["districts"].items()
+            }
+            _loaded = {
+                "mtime": mtime,
+                "data": data,
+                "zooms": sorted(data["zooms"]),
+                "polygons": polygons,
+                "grid": _build_grid(data["districts"]),
+            }
+        return _loaded
+
+
+def is_available() -> bool:
+    return load() is not None
+
+
+def _level_for_zoom(store: Dict, zoom: int) -> str:
+    finer = [z for z in store["zooms"] if z <= zoom]
+    if zoom > store["zooms"][-1]:
+        return "full"
+    return str(finer[-1] if finer else store["zooms"][0])
+
+
+def geojson(zoom: Optional[int] = None, district: Optional[str] = None) -> Optional[Dict]:
+    """FeatureCollection of district outlines simplified for `zoom` (full detail when None)"""
+    store = load()
+    if store is None:
+        return None
+    level = "full" if zoom is None else _level_for_zoom(store, zoom)
+    features = [
+        {
+            "type": "Feature",
+            "id": key,
+            "properties": {"district": key, "name": d["name"]},
+            "bbox": d["bbox"],
+            "geometry": d["levels"][level],
+        }
+        for key, d in store["data"]["districts"].items()
+        if district is None or key == district
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+# -------------------- POINT IN POLYGON --------------------
+
+def _cell(lon: float, lat: float) -> Tuple[int, int]:
+    return int(math.floor(lon / GRID_DEG)), int(math.floor(lat / GRID_DEG))
+
+
+def _build_grid(districts: Dict) -> Dict[Tuple[int, int], List[str]]:
+    """Grid cell -> districts whose bounding box overlaps it"""
+    grid: Dict[Tuple[int, int], List[str]] = {}
+    for key, d in districts.items():
+        west, south, east, north = d["bbox"]
+        (x0, y0), (x1, y1) = _cell(west, south), _cell(east, north)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                grid.setdefault((x, y), []).append(key)
+    return grid
+
+
+def _in_ring(ring: np.ndarray, lon: float, lat: float) -> bool:
+    x0, y0 = ring[:-1, 0], ring[:-1, 1]
+    x1, y1 = ring[1:, 0], ring[1:, 1]
+    crosses = (y0 > lat) != (y1 > lat)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+    return bool(np.count_nonzero(crosses & (lon < x_at)) % 2)
+
+
+def _in_polygons(polygons: List[List[np.ndarray]], lon: float, lat: float) -> bool:
+    for rings in polygons:
+        if _in_ring(rings[0], lon, lat) and not any(_in_ring(hole, lon, lat) for hole in rings[1:]):
+            return True
+    return False
+
+
+def district_at(lat: float, lon: float) -> Optional[str]:
+    """District key whose boundary contains the point, or None"""
+    store = load()
+    if store is None:
+        return None
+    for key in store["grid"].get(_cell(lon, lat), []):
+        west, south, east, north = store["data"]["districts"][key]["bbox"]
+        if west <= lon <= east and south <= lat <= north and _in_polygons(store["polygons"][key], lon, lat):
+            return key
+    return None
+
+
+# -------------------- MAPBOX VECTOR TILES --------------------
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited protobuf field"""
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 31)
+
+
+def _clip_ring(ring: List[Tuple[float, float]], lo: float, hi: float) -> List[Tuple[float, float]]:
+    """Sutherland-Hodgman clip of a ring against the square [lo, hi]"""
+    for axis, bound, keep_below in ((0, lo, False), (0, hi, True), (1, lo, False), (1, hi, True)):
+        if not ring:
+            break
+        inside = (lambda p: p[axis] <= bound) if keep_below else (lambda p: p[axis] >= bound)
+        clipped = []
+        prev = ring[-1]
+        for point in ring:
+            if inside(point) != inside(prev):
+                t = (bound - prev[axis]) / (point[axis] - prev[axis])
+                cross = [prev[0] + t * (point[0] - prev[0]), prev[1] + t * (point[1] - prev[1])]
+                cross[axis] = bound
+                clipped.append(tuple(cross))
+            if inside(point):
+                clipped.append(point)
+            prev = point
+        ring = clipped
+    return ring
+
+
+def _ring_commands(ring: List[Tuple[int, int]], exterior: bool, cursor: List[int]) -> List[int]:
+    area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+    if area == 0:
+        return []
+    # Exterior rings have positive area in tile coordinates (y down), holes negative
+    if (area > 0) != exterior:
+        ring = ring[::-1]
+    commands = [1 | (1 << 3)]
+    for i, (x, y) in enumerate(ring):
+        if i == 1:
+            commands.append(2 | ((len(ring) - 1) << 3))
+        commands += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+        cursor[0], cursor[1] = x, y
+    commands.append(7 | (1 << 3))
+    return commands
+
+
+def _feature_geometry(polygons: List, z: int, x: int, y: int) -> List[int]:
+    n = 2 ** z
+    commands, cursor = [], [0, 0]
+    for polygon in polygons:
+        for i, ring in enumerate(polygon):
+            coords = np.asarray(ring)
+            # Lon/lat -> Web Mercator tile pixels
+            px = ((coords[:, 0] + 180.0) / 360.0 * n - x) * MVT_EXTENT
+            lat_rad = np.radians(np.clip(coords[:, 1], -85.0511, 85.0511))
+            py = ((1 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2 * n - y) * MVT_EXTENT
+            clipped = _clip_ring(list(zip(px[:-1], py[:-1])), -MVT_BUFFER, MVT_EXTENT + MVT_BUFFER)
+            quantised = []
+            for cx, cy in clipped:
+                point = (int(round(cx)), int(round(cy)))
+                if not quantised or quantised[-1] != point:
+                    quantised.append(point)
+            if len(quantised) > 1 and quantised[0] == quantised[-1]:
+                quantised.pop()
+            if len(quantised) < 3:
+                if i == 0:
+                    break  # exterior fell outside the tile; skip its holes too
+                continue
+            commands += _ring_commands(quantised, i == 0, cursor)
+    return commands
+
+
+def _tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    n = 2 ** z
+    west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def vector_tile(z: int, x: int, y: int) -> Optional[bytes]:
+    """Mapbox vector tile (protobuf) with a "districts" polygon layer"""
+    store = load()
+    if store is None:
+        return None
+    level = _level_for_zoom(store, z)
+    west, south, east, north = _tile_bounds(z, x, y)
+    pad = (east - west) * MVT_BUFFER / MVT_EXTENT
+
+    keys = ["district", "name"]
+    values: List[str] = []
+    features = b""
+    for fid, (key, d) in enumerate(store["data"]["districts"].items(), start=1):
+        bw, bs, be, bn = d["bbox"]
+        if be < west - pad or bw > east + pad or bn < south - pad or bs > north + pad:
+            continue
+        geometry = _feature_geometry(d["levels"][level]["coordinates"], z, x, y)
+        if not geometry:
+            continue
+        tags = []
+        for k, v in enumerate((key, d["name"])):
+            if v not in values:
+                values.append(v)
+            tags += [k, values.index(v)]
+        features += _field(2, (
+            _uint_field(1, fid)
+            + _field(2, b"".join(_varint(t) for t in tags))
+            + _uint_field(3, 3)  # POLYGON
+            + _field(4, b"".join(_varint(c) for c in geometry))
+        ))
+
+    if not features:
+        return b""
+    layer = (
+        _uint_field(15, 2)
+        + _field(1, MVT_LAYER.encode())
+        + features
+        + b"".join(_field(3, k.encode()) for k in keys)
+        + b"".join(_field(4, _field(1, v.encode())) for v in values)
+        + _uint_field(5, MVT_EXTENT)
+    )
+    return _field(3, layer)
+
+
+def boundaries_status() -> Dict:
+    store = load()
+    if store is None:
+        return {"present": False}
+    data = store["data"]
+    return {
+        "present": True,
+        "source": data["source"],
+        "built_at": data["built_at"],
+        "districts": len(data["districts"]),
+        "zooms": data["zooms"],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="District boundary store")
+    parser.add_argument("command", choices=["build", "status"])
+    parser.add_argument("--source", help="GeoJSON file instead of FAO GAUL via Earth Engine")
+    parser.add_argument("--name-field", help="Property holding the district name")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(boundaries_status())
+    else:
+        if not args.source:
+            from app.ee_session import init_ee
+
+            init_ee()
+        print(build(args.source, args.name_field))
@@ -0,0 +1,140 @@
+"""
+Progressive district dashboard.
+
+`/api/dashboard/{district}` starts every section at once and streams each
+one as soon as it is ready, so weather and alerts render while the Earth
+Engine sections are still computing. Sections that need the same upstream
+data share it: weather and alerts use one OpenWeather fetch, and the Earth
+Engine work goes through `ee_executor`, whose single-flight deduplication
+also covers concurrent dashboard and per-component requests.
+
+Each streamed line (NDJSON, or SSE with `?format=sse` /
+`Accept: text/event-stream`) looks like
+    {"section": "weather", "data": {...}, "elapsed_ms": 412.3}
+    {"section": "soil_moisture", "error": "...", "elapsed_ms": 120000.0}
+and the stream ends with a {"section": "done", ...} line.
+"""
+
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app import geocoder
+from app.satellite import get_satellite_tiles
+from app.soil_health import soil_health
+from app.vajra_sos import build_inapp_alerts, forecast_next_24h
+from app.weather_api import (
+    _ee_soil_moisture, _ee_soil_temperature, _soil_reading, fetch_openweather,
+    format_current, format_forecast_24h, soil_moisture_payload, soil_temperature_payload,
+)
+
+router = APIRouter(prefix="/api/dashboard", tags=["Dashboard"])
+
+
+async def _fetch_weather(district: str, lat: float, lon: float) -> Dict:
+    """Raw current weather and forecast, fetched once for every section that needs them"""
+    current, forecast = await asyncio.gather(
+        run_in_threadpool(fetch_openweather, "weather", lat, lon, district),
+        run_in_threadpool(fetch_openweather, "forecast", lat, lon, district),
+    )
+    return {"current": current, "forecast": forecast}
+
+
+async def _weather_section(weather: "asyncio.Future") -> Dict:
+    raw = await weather
+    current, forecast = raw["current"], raw["forecast"]
+    if current is None:
+        raise HTTPException(status_code=503, detail="Weather service unavailable")
+    if forecast is None or "list" not in forecast:
+        raise HTTPException(status_code=503, detail="Forecast service unavailable")
+    section = {
+        "current_weather": format_current(current),
+        "forecast_24h": format_forecast_24h(forecast),
+    }
+    if current.get("archived") or forecast.get("archived"):
+        section["weather_source"] = "archive"
+    return section
+
+
+async def _alerts_section(district: str, weather: "asyncio.Future") -> Dict:
+    raw = await weather
+    return build_inapp_alerts(district, raw["current"], forecast_next_24h(raw["forecast"]))
+
+
+async def _section(name: str, coro, started: float) -> Dict:
+    try:
+        result = {"section": name, "data": await coro}
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result = {"section": name, "error": getattr(e, "detail", None) or str(e)}
+    result["elapsed_ms"] = round(1000 * (time.monotonic() - started), 1)
+    return result
+
+
+def _encode(event: Dict, sse: bool) -> str:
+    payload = json.dumps(event)
+    if sse:
+        return f"event: {event['section']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+@router.get("/{district}")
+async def get_dashboard(district: str, request: Request, format: Optional[str] = None):
+    """Stream every dashboard section for a district as it completes"""
+    coords = await run_in_threadpool(geocoder.resolve, district)
+    if not coords:
+        raise HTTPException(status_code=404, detail="Location not found")
+    lat, lon = coords
+    sse = format == "sse" or (format is None and "text/event-stream" in request.headers.get("accept", ""))
+
+    async def stream():
+        started = time.monotonic()
+        yield _encode({
+            "section": "location",
+            "data": {"district": district, "district_id": geocoder.resolve_district(district),
+                     "latitude": lat, "longitude": lon},
+            "elapsed_ms": 0.0,
+        }, sse)
+
+        weather = asyncio.ensure_future(_fetch_weather(district, lat, lon))
+        sections = {
+            "weather": _weather_section(weather),
+            "alerts": _alerts_section(district, weather),
+            "soil_health": soil_health(district),
+            "soil_temperature": _soil_reading("lst", "modis_lst", _ee_soil_temperature, lat, lon),
+            "soil_moisture": _soil_reading("sm", "smap_sm", _ee_soil_moisture, lat, lon),
+            "satellite": get_satellite_tiles(district, request),
+        }
+        tasks = [asyncio.ensure_future(_section(name, coro, started)) for name, coro in sections.items()]
+        failed = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event = await next_done
+                if "error" in event:
+                    failed.append(event["section"])
+                elif event["section"] == "soil_temperature":
+                    event["data"] = soil_temperature_payload(event["data"])
+                elif event["section"] == "soil_moisture":
+                    event["data"] = soil_moisture_payload(event["data"])
+                yield _encode(event, sse)
+            yield _encode({
+                "section": "done",
+                "failed": failed,
+                "elapsed_ms": round(1000 * (time.monotonic() - started), 1),
+            }, sse)
+        finally:
+            # Client went away: stop waiting (EE work already queued still fills the caches)
+            for task in tasks + [weather]:
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -30,5 +30,41 @@ DISTRICT_COORDS = {
     "udupi": (13.3409, 74.7421),
     "uttara kannada": (14.7951, 74.6850),
     "vijayanagara": (15.3030, 76.6346),
+    "vijayapura": (16.8302, 75.7100),
     "yadgir": (16.7700, 77.1376),
 }
+
+# Kannada names, used as lookup aliases by app/geocoder.py
+DISTRICT_NAMES_KN = {
+    "bagalkot": "ಬಾಗಲಕೋಟೆ",
+    "ballari": "ಬಳ್ಳಾರಿ",
+    "belagavi": "ಬೆಳಗಾವಿ",
+    "bengaluru rural": "ಬೆಂಗಳೂರು ಗ್ರಾಮಾಂತರ",
+    "bengaluru urban": "ಬೆಂಗಳೂರು ನಗರ",
+    "bidar": "ಬೀದರ್",
+    "chamarajanagar": "ಚಾಮರಾಜನಗರ",
+    "chikkaballapur": "ಚಿಕ್ಕಬಳ್ಳಾಪುರ",
+    "chikkamagaluru": "ಚಿಕ್ಕಮಗಳೂರು",
+    "chitradurga": "ಚಿತ್ರದುರ್ಗ",
+    "dakshina kannada": "ದಕ್ಷಿಣ ಕನ್ನಡ",
+    "davanagere": "ದಾವಣಗೆರೆ",
+    "dharwad": "ಧಾರವಾಡ",
+    "gadag": "ಗದಗ",
+    "hassan": "ಹಾಸನ",
+    "haveri": "ಹಾವೇರಿ",
+    "kalaburagi": "ಕಲಬುರಗಿ",
+    "kodagu": "ಕೊಡಗು",
+    "kolar": "ಕೋಲಾರ",
+    "koppal": "ಕೊಪ್ಪಳ",
+    "mandya": "ಮಂಡ್ಯ",
+    "mysuru": "ಮೈಸೂರು",
+    "raichur": "ರಾಯಚೂರು",
+    "ramanagara": "ರಾಮನಗರ",
+    "shivamogga": "ಶಿವಮೊಗ್ಗ",
+    "tumakuru": "ತುಮಕೂರು",
+    "udupi": "ಉಡುಪಿ",
+    "uttara kannada": "ಉತ್ತರ ಕನ್ನಡ",
+    "vijayanagara": "ವಿಜಯನಗರ",
+    "vijayapura": "ವಿಜಯಪುರ",
+    "yadgir": "ಯಾದಗಿರಿ",
+}
@@ -0,0 +1,138 @@
+"""
+Dedicated, bounded executor for blocking Earth Engine calls.
+
+`getInfo()` / `getMapId()` take seconds, so they run on their own small
+thread pool instead of FastAPI's shared one; a burst of map views then
+queues here rather than starving unrelated routes. Identical in-flight
+computations (same operation and key) share one execution, and when the
+queue is full new work is rejected with a 503.
+
+    urls = await ee_executor.run_async("satellite_mapid", key, lambda: compute(key))
+    value = ee_executor.run("soil_ndvi", key, lambda: compute(key))   # from sync code
+
+Queue and execution time are recorded per operation type (`ee_executor_stats()`).
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable
+
+from fastapi import HTTPException
+
+EE_MAX_WORKERS = int(os.getenv("EE_MAX_WORKERS", 8))
+EE_MAX_QUEUE = int(os.getenv("EE_MAX_QUEUE", 64))
+EE_WAIT_TIMEOUT = float(os.getenv("EE_WAIT_TIMEOUT", 120))
+# Recent samples kept per operation for the p95 figures
+SAMPLE_WINDOW = 500
+
+_pool = ThreadPoolExecutor(max_workers=EE_MAX_WORKERS, thread_name_prefix="ee-worker")
+_lock = threading.Lock()
+_in_flight: Dict[Hashable, Future] = {}
+_pending = 0
+_ops: Dict[str, Dict] = {}
+_worker = threading.local()
+
+
+def _op_stats(op: str) -> Dict:
+    return _ops.setdefault(op, {
+        "submitted": 0, "shared": 0, "rejected": 0, "errors": 0,
+        "queue": deque(maxlen=SAMPLE_WINDOW), "exec": deque(maxlen=SAMPLE_WINDOW),
+    })
+
+
+def _execute(op: str, queued_at: float, fn: Callable[[], Any]) -> Any:
+    started = time.monotonic()
+    _worker.active = True
+    try:
+        return fn()
+    finally:
+        _worker.active = False
+        with _lock:
+            stats = _op_stats(op)
+            stats["queue"].append(started - queued_at)
+            stats["exec"].append(time.monotonic() - started)
+
+
+def _finish(op: str, flight: Hashable, future: Future):
+    global _pending
+    with _lock:
+        _pending -= 1
+        if _in_flight.get(flight) is future:
+            del _in_flight[flight]
+        if not future.cancelled() and future.exception() is not None:
+            _op_stats(op)["errors"] += 1
+
+
+def submit(op: str, key: Hashable, fn: Callable[[], Any]) -> Future:
+    """Queue `fn`, or join the identical in-flight call; key None disables sharing"""
+    global _pending
+    flight = (op, key if key is not None else object())
+    with _lock:
+        stats = _op_stats(op)
+        future = _in_flight.get(flight)
+        if future is not None:
+            stats["shared"] += 1
+            return future
+        if _pending >= EE_MAX_WORKERS + EE_MAX_QUEUE:
+            stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Earth Engine is busy, try again shortly")
+        _pending += 1
+        stats["submitted"] += 1
+        future = _pool.submit(_execute, op, time.monotonic(), fn)
+        _in_flight[flight] = future
+    future.add_done_callback(lambda f: _finish(op, flight, f))
+    return future
+
+
+def run(op: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    """Blocking variant for sync code paths"""
+    if getattr(_worker, "active", False):
+        # Already on an EE worker: waiting on the pool from inside it could deadlock
+        return fn()
+    try:
+        return submit(op, key, fn).result(timeout=EE_WAIT_TIMEOUT)
+    except FutureTimeout:
+        raise HTTPException(status_code=504, detail="Earth Engine request timed out")
+
+
+async def run_async(op: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    """Await an Earth Engine call without holding a request thread"""
+    future = asyncio.wrap_future(submit(op, key, fn))
+    try:
+        # Shielded so one caller timing out or disconnecting never cancels the shared call
+        return await asyncio.wait_for(asyncio.shield(future), EE_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Earth Engine request timed out")
+
+
+def _summary(samples) -> Dict:
+    if not samples:
+        return {"avg_ms": None, "p95_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    return {
+        "avg_ms": round(1000 * sum(ordered) / len(ordered), 1),
+        "p95_ms": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 1),
+        "max_ms": round(1000 * ordered[-1], 1),
+    }
+
+
+def ee_executor_stats() -> Dict:
+    with _lock:
+        return {
+            "workers": EE_MAX_WORKERS,
+            "max_queue": EE_MAX_QUEUE,
+            "pending": _pending,
+            "operations": {
+                op: {
+                    **{k: s[k] for k in ("submitted", "shared", "rejected", "errors")},
+                    "queue_time": _summary(s["queue"]),
+                    "exec_time": _summary(s["exec"]),
+                }
+                for op, s in _ops.items()
+            },
+        }
@@ -0,0 +1,111 @@
+"""
+Shared Google Earth Engine session.
+
+Earth Engine is initialised once per process and kept fresh by a background
+thread. Routers ask `ee_ready()` / `require_ee()` instead of calling
+`ee.Initialize` themselves, so an auth failure degrades the EE-backed
+responses instead of crashing the import.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+
+from fastapi import HTTPException
+
+try:
+    import ee
+except ImportError:  # earthengine-api not installed
+    ee = None
+
+EE_PROJECT = os.getenv("EE_PROJECT", "tidy-federation-479517-v3")
+EE_REFRESH_SECONDS = int(os.getenv("EE_REFRESH_SECONDS", 45 * 60))
+EE_RETRY_SECONDS = int(os.getenv("EE_RETRY_SECONDS", 60))
+
+_lock = threading.Lock()
+_refresher = None
+_state = {
+    "status": "uninitialized",  # uninitialized | ok | down | unavailable
+    "project": EE_PROJECT,
+    "initialized_at": None,
+    "last_attempt": None,
+    "last_error": None,
+    "attempts": 0,
+}
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def init_ee(force: bool = False) -> bool:
+    """Initialise Earth Engine once; `force` re-runs it to refresh credentials"""
+    if ee is None:
+        _state["status"] = "unavailable"
+        _state["last_error"] = "earthengine-api not installed"
+        return False
+
+    with _lock:
+        if _state["status"] == "ok" and not force:
+            return True
+
+        _state["attempts"] += 1
+        _state["last_attempt"] = _now_iso()
+        try:
+            ee.Initialize(project=EE_PROJECT)
+        except Exception as e:
+            _state["status"] = "down"
+            _state["last_error"] = str(e)
+            print(f"🔥 Earth Engine initialization error: {e}")
+            return False
+
+        _state["status"] = "ok"
+        _state["initialized_at"] = _now_iso()
+        _state["last_error"] = None
+        return True
+
+
+def ee_ready() -> bool:
+    """True when the shared session is usable (initialises lazily on first use)"""
+    if _state["status"] == "ok":
+        return True
+    if _state["status"] == "uninitialized":
+        return init_ee()
+    return False
+
+
+def require_ee():
+    """Return the `ee` module or raise 503 when Earth Engine is down"""
+    if not ee_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Earth Engine unavailable. Run `earthengine authenticate`.",
+        )
+    return ee
+
+
+def ee_health() -> Dict:
+    """Snapshot of the Earth Engine session state for health checks"""
+    return dict(_state)
+
+
+def _refresh_loop():
+    while True:
+        # Retry quickly while down, otherwise re-initialise to refresh credentials
+        time.sleep(EE_REFRESH_SECONDS if _state["status"] == "ok" else EE_RETRY_SECONDS)
+        init_ee(force=True)
+
+
+def start_ee_session():
+    """Initialise Earth Engine and start the background refresher (idempotent)"""
+    global _refresher
+    if ee is None:
+        init_ee()
+        return
+    if _refresher is not None and _refresher.is_alive():
+        return
+    init_ee()
+    _refresher = threading.Thread(target=_refresh_loop, name="ee-session-refresh", daemon=True)
+    _refresher.start()
@@ -0,0 +1,182 @@
+"""
+In-memory roster of alert-enabled farmers, indexed by district.
+
+The roster loads once with a field projection and paginated cursors (only
+the contact fields are read), then stays current through a Firestore
+snapshot listener on the same query: farmers who sign up, edit their
+profile or switch alerts off are patched into the index as the changes
+arrive. Monitor runs read `groups()` without touching Firestore.
+
+If the listener cannot be attached or stops, the roster falls back to a
+paginated reload when it is older than ROSTER_RELOAD_SECONDS.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app import geocoder
+
+ROSTER_PAGE_SIZE = int(os.getenv("ROSTER_PAGE_SIZE", 1000))
+ROSTER_RELOAD_SECONDS = int(os.getenv("ROSTER_RELOAD_SECONDS", 3600))
+ROSTER_FIELDS = ["district", "email", "emailAddress", "phone", "firstName", "lastName", "language"]
+
+
+def district_key(district: str) -> str:
+    """Farmers' free-text districts that mean the same place share one key"""
+    return geocoder.resolve_district(district) or geocoder.normalize(district)
+
+
+def _farmer_from_doc(uid: str, data: Dict) -> Optional[Dict]:
+    """Compact farmer record, or None when the user cannot receive alerts"""
+    if not data.get("district"):
+        return None
+    email = data.get("email") or data.get("emailAddress")
+    phone = data.get("phone")
+    if not email and not phone:
+        # skip users without any contact
+        return None
+    return {
+        "uid": uid,
+        "name": f"{data.get('firstName', '')} {data.get('lastName', '')}".strip() or "Farmer",
+        "email": email,
+        "phone": phone,
+        "district": data.get("district"),
+        "language": data.get("language", "en"),
+    }
+
+
+class FarmerRoster:
+    def __init__(self, client_factory: Callable[[], Any]):
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._by_district: Dict[str, Dict[str, Dict]] = {}
+        self._district_of: Dict[str, str] = {}
+        self._groups: Optional[Dict[str, List[Dict]]] = None
+        self._watch = None
+        self._listening = False
+        self._stats = {"loads": 0, "documents_read": 0, "changes_applied": 0,
+                       "loaded_at": None, "last_change_at": None, "last_error": None}
+
+    # -------------------- INDEX --------------------
+
+    def _put(self, uid: str, data: Optional[Dict]):
+        """Insert, update or (data None / not eligible) remove one farmer; caller holds the lock"""
+        old = self._district_of.pop(uid, None)
+        if old is not None:
+            self._by_district[old].pop(uid, None)
+            if not self._by_district[old]:
+                del self._by_district[old]
+        farmer = _farmer_from_doc(uid, data) if data else None
+        if farmer is not None:
+            key = district_key(farmer["district"])
+            self._by_district.setdefault(key, {})[uid] = farmer
+            self._district_of[uid] = key
+        self._groups = None
+
+    def _query(self, db):
+        return db.collection("users").where("allowAlerts", "==", True)
+
+    def load(self) -> int:
+        """Full paginated reload of the projected fields; returns farmers indexed"""
+        db = self._client_factory()
+        if db is None:
+            raise RuntimeError("Firestore client unavailable")
+
+        by_district: Dict[str, Dict[str, Dict]] = {}
+        district_of: Dict[str, str] = {}
+        query = self._query(db).select(ROSTER_FIELDS).order_by("__name__").limit(ROSTER_PAGE_SIZE)
+        last, read = None, 0
+        while True:
+            page = list((query.start_after(last) if last is not None else query).stream())
+            for doc in page:
+                farmer = _farmer_from_doc(doc.id, doc.to_dict() or {})
+                if farmer is not None:
+                    key = district_key(farmer["district"])
+                    by_district.setdefault(key, {})[doc.id] = farmer
+                    district_of[doc.id] = key
+            read += len(page)
+            if len(page) < ROSTER_PAGE_SIZE:
+                break
+            last = page[-1]
+
+        with self._lock:
+            self._by_district, self._district_of, self._groups = by_district, district_of, None
+            self._stats["loads"] += 1
+            self._stats["documents_read"] += read
+            self._stats["loaded_at"] = time.time()
+        print(f"📋 Roster loaded: {len(district_of)} farmers with alerts enabled in {len(by_district)} districts")
+        return len(district_of)
+
+    # -------------------- LISTENER --------------------
+
+    def _on_snapshot(self, snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                data = None if change.type.name == "REMOVED" else (doc.to_dict() or {})
+                self._put(doc.id, data)
+            self._stats["changes_applied"] += len(changes)
+            self._stats["documents_read"] += len(changes)
+            self._stats["last_change_at"] = time.time()
+            self._listening = True
+
+    def start(self):
+        """Load the roster and attach the change listener (idempotent)"""
+        if self._watch is not None:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            self._stats["last_error"] = str(e)
+            print(f"🔥 Roster load failed: {e}")
+            return
+        try:
+            db = self._client_factory()
+            # Listeners can't use projections; the first snapshot replays the set once,
+            # after which only changed documents are delivered
+            self._watch = self._query(db).on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self._stats["last_error"] = str(e)
+            print(f"⚠️ Roster listener unavailable, falling back to periodic reloads: {e}")
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+            self._listening = False
+
+    def _listener_alive(self) -> bool:
+        return self._watch is not None and not getattr(self._watch, "_closed", False)
+
+    # -------------------- READS --------------------
+
+    def groups(self) -> Dict[str, List[Dict]]:
+        """{district key: [farmer, ...]} for every alert-enabled farmer"""
+        self.start()
+        stale = (self._stats["loaded_at"] is None
+                 or time.time() - self._stats["loaded_at"] > ROSTER_RELOAD_SECONDS)
+        if not self._listener_alive() and stale:
+            try:
+                self.load()
+            except Exception as e:
+                self._stats["last_error"] = str(e)
+                print(f"🔥 Roster reload failed, using last known roster: {e}")
+        with self._lock:
+            # Rebuilt only after a change, so steady-state reads are a dict lookup
+            if self._groups is None:
+                self._groups = {key: list(farmers.values()) for key, farmers in self._by_district.items()}
+            return self._groups
+
+    def farmers(self) -> List[Dict]:
+        return [farmer for farmers in self.groups().values() for farmer in farmers]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "farmers": len(self._district_of),
+                "districts": len(self._by_district),
+                "listening": self._listener_alive() and self._listening,
+            }
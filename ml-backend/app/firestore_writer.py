@@ -0,0 +1,175 @@
+"""
+Buffered, batched Firestore writes.
+
+`BatchWriter.add()` only appends to an in-memory buffer; a background
+flusher commits it with Firestore batched writes (up to 500 operations per
+commit) whenever a full batch is waiting or FIRESTORE_FLUSH_INTERVAL has
+passed. Failed commits are retried with backoff, and `close()` (also run at
+interpreter exit) flushes whatever is left. A `client_factory` returning
+None means Firestore is not configured: the writer disables itself and
+drops records instead of retrying and buffering them.
+
+The writer only needs an object with `batch()` and `collection()`, so it runs
+unchanged against the Firestore emulator (set FIRESTORE_EMULATOR_HOST) or an
+in-memory stand-in passed as `client_factory`.
+"""
+
+import atexit
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FIRESTORE_BATCH_LIMIT = 500  # Firestore's hard cap on writes per batch
+FIRESTORE_FLUSH_INTERVAL = float(os.getenv("FIRESTORE_FLUSH_INTERVAL", 1.0))
+FIRESTORE_MAX_BUFFER = int(os.getenv("FIRESTORE_MAX_BUFFER", 100000))
+FIRESTORE_COMMIT_RETRIES = int(os.getenv("FIRESTORE_COMMIT_RETRIES", 5))
+
+_writers: Dict[str, "BatchWriter"] = {}
+
+
+class BatchWriter:
+    def __init__(self, client_factory: Callable[[], Any], name: str = "firestore-writer"):
+        self._client_factory = client_factory
+        self._name = name
+        self._lock = threading.Lock()
+        self._buffer: "deque[Tuple[str, Dict, float]]" = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._commit_latency = deque(maxlen=500)
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "failed_commits": 0, "dropped": 0}
+        self._disabled = False
+        self._first_write = None
+        _writers[name] = self
+        atexit.register(self.close)
+
+    def add(self, collection: str, payload: Dict):
+        """Queue one document for `collection` (auto-generated id)"""
+        with self._lock:
+            if self._disabled:
+                self._stats["dropped"] += 1
+                return
+            if len(self._buffer) >= FIRESTORE_MAX_BUFFER:
+                # Keep the newest records when Firestore has been down for a long time
+                self._buffer.popleft()
+                self._stats["dropped"] += 1
+            self._buffer.append((collection, payload, time.time()))
+            self._stats["queued"] += 1
+            full = len(self._buffer) >= FIRESTORE_BATCH_LIMIT
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(FIRESTORE_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def _take(self) -> List[Tuple[str, Dict, float]]:
+        with self._lock:
+            n = min(len(self._buffer), FIRESTORE_BATCH_LIMIT)
+            return [self._buffer.popleft() for _ in range(n)]
+
+    def _disable(self):
+        with self._lock:
+            if not self._disabled:
+                print(f"⚠️ {self._name}: Firestore client unavailable; dropping writes")
+            self._disabled = True
+            self._stats["dropped"] += len(self._buffer)
+            self._buffer.clear()
+
+    def _commit(self, items: List[Tuple[str, Dict, float]]) -> bool:
+        for attempt in range(FIRESTORE_COMMIT_RETRIES):
+            try:
+                db = self._client_factory()
+                if db is None:
+                    # Not configured, not a transient failure: nothing to retry
+                    with self._lock:
+                        self._stats["dropped"] += len(items)
+                    self._disable()
+                    return True
+                batch = db.batch()
+                for collection, payload, _ in items:
+                    batch.set(db.collection(collection).document(), payload)
+                started = time.monotonic()
+                batch.commit()
+                with self._lock:
+                    self._commit_latency.append(time.monotonic() - started)
+                    self._stats["written"] += len(items)
+                    self._stats["batches"] += 1
+                    self._first_write = self._first_write or time.time()
+                return True
+            except Exception as e:
+                with self._lock:
+                    self._stats["failed_commits"] += 1
+                print(f"🔥 Firestore batch commit failed ({len(items)} writes, attempt {attempt + 1}): {e}")
+                if self._stop.is_set() and attempt >= 1:
+                    break  # shutting down: don't hold the process for long
+                time.sleep(random.uniform(0, min(30.0, 0.5 * 2 ** attempt)))
+        return False
+
+    def flush(self) -> int:
+        """Commit everything buffered right now; returns documents written"""
+        written = 0
+        while True:
+            items = self._take()
+            if not items:
+                return written
+            if not self._commit(items):
+                # Put the batch back at the front and try again on the next flush
+                with self._lock:
+                    self._buffer.extendleft(reversed(items))
+                return written
+            if self._disabled:
+                return written
+            written += len(items)
+
+    def close(self):
+        """Stop the flusher and commit what is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latency = sorted(self._commit_latency)
+            oldest = self._buffer[0][2] if self._buffer else None
+            elapsed = time.time() - self._first_write if self._first_write else None
+            return {
+                **self._stats,
+                "buffered": len(self._buffer),
+                "disabled": self._disabled,
+                "oldest_buffered_seconds": round(time.time() - oldest, 1) if oldest else None,
+                "writes_per_second": round(self._stats["written"] / elapsed, 1) if elapsed else None,
+                "commit_latency_ms": {
+                    "avg": round(1000 * sum(latency) / len(latency), 1) if latency else None,
+                    "p95": round(1000 * latency[int(0.95 * (len(latency) - 1))], 1) if latency else None,
+                    "max": round(1000 * latency[-1], 1) if latency else None,
+                },
+            }
+
+
+def writer_stats() -> Dict:
+    """Stats for every writer created in this process, by name"""
+    return {name: writer.stats() for name, writer in _writers.items()}
+
+
+def close_all():
+    """Flush every writer (called on application shutdown)"""
+    for writer in list(_writers.values()):
+        writer.close()
@@ -0,0 +1,318 @@
+"""
+Single place-name resolver shared by the weather, soil, satellite and
+VajraSOS modules.
+
+Lookup order: known district centroids -> alias/transliteration table
+(English spellings and Kannada names) -> fuzzy match -> persistent SQLite
+cache -> network (LocationIQ, then OpenWeather geocoding). Network results,
+including misses, are written to the cache so repeated lookups never leave
+the process.
+
+The DISTRICT_COORDS key is the canonical district ID. `nearest_district()`
+maps a coordinate to the closest district centroid through a small KD-tree.
+"""
+
+import difflib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from app import http_client, quota
+from app.concurrency import TTLCache
+from app.district_centroids import DISTRICT_COORDS, DISTRICT_NAMES_KN
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(BASE_DIR, "Data", "geocode_cache.sqlite"))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", 30 * 24 * 3600))
+GEOCODE_MEMORY_SIZE = int(os.getenv("GEOCODE_MEMORY_SIZE", 4096))
+# Misses are re-checked against the SQLite cache, which enforces GEOCODE_NEGATIVE_TTL
+GEOCODE_MEMORY_NEGATIVE_TTL = min(GEOCODE_NEGATIVE_TTL, 3600)
+FUZZY_CUTOFF = 0.85
+# Points farther than this from every centroid are treated as outside the state
+NEAREST_MAX_KM = float(os.getenv("GEOCODE_NEAREST_MAX_KM", 120))
+
+# Old names, English spellings and common transliterations -> DISTRICT_COORDS key
+DISTRICT_ALIASES = {
+    "bagalkote": "bagalkot",
+    "bellary": "ballari",
+    "bijapur": "vijayapura",
+    "vijayapur": "vijayapura",
+    "belgaum": "belagavi",
+    "belgavi": "belagavi",
+    "bangalore": "bengaluru urban",
+    "bangalore urban": "bengaluru urban",
+    "bengaluru": "bengaluru urban",
+    "bangalore rural": "bengaluru rural",
+    "chamrajnagar": "chamarajanagar",
+    "chamarajnagar": "chamarajanagar",
+    "chikballapur": "chikkaballapur",
+    "chickballapur": "chikkaballapur",
+    "chikmagalur": "chikkamagaluru",
+    "chikkamagalur": "chikkamagaluru",
+    "mangalore": "dakshina kannada",
+    "mangaluru": "dakshina kannada",
+    "south canara": "dakshina kannada",
+    "davangere": "davanagere",
+    "hubli": "dharwad",
+    "hubballi": "dharwad",
+    "gulbarga": "kalaburagi",
+    "kalburgi": "kalaburagi",
+    "coorg": "kodagu",
+    "madikeri": "kodagu",
+    "mysore": "mysuru",
+    "ramanagaram": "ramanagara",
+    "shimoga": "shivamogga",
+    "tumkur": "tumakuru",
+    "karwar": "uttara kannada",
+    "north canara": "uttara kannada",
+    "hospet": "vijayanagara",
+    "hosapete": "vijayanagara",
+    "vijayanagar": "vijayanagara",
+    "yadgiri": "yadgir",
+    # Kannada city and old names; district names come from DISTRICT_NAMES_KN
+    "ಬೆಂಗಳೂರು": "bengaluru urban",
+    "ಮಂಗಳೂರು": "dakshina kannada",
+    "ಹುಬ್ಬಳ್ಳಿ": "dharwad",
+    "ಗುಲ್ಬರ್ಗಾ": "kalaburagi",
+    "ಬಿಜಾಪುರ": "vijayapura",
+    "ಹೊಸಪೇಟೆ": "vijayanagara",
+    "ಕಾರವಾರ": "uttara kannada",
+    "ಮಡಿಕೇರಿ": "kodagu",
+}
+
+_lock = threading.Lock()
+_memory = TTLCache(maxsize=GEOCODE_MEMORY_SIZE, ttl=24 * 3600)
+_MISSING = object()
+_conn = None
+
+
+_STOPWORDS = {"district", "karnataka", "india", "ಜಿಲ್ಲೆ", "ಕರ್ನಾಟಕ", "ಭಾರತ"}
+
+
+def normalize(name: str) -> str:
+    key = (name or "").lower().strip()
+    # Latin letters and the Kannada block; everything else separates words
+    key = re.sub(r"[^a-z\u0c80-\u0cff\s]", " ", key)
+    return " ".join(word for word in key.split() if word not in _STOPWORDS)
+
+
+_ALIASES = {
+    **{normalize(kn): key for key, kn in DISTRICT_NAMES_KN.items()},
+    **{normalize(alias): key for alias, key in DISTRICT_ALIASES.items()},
+}
+_CANDIDATES = list(DISTRICT_COORDS) + list(_ALIASES)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_key(key: str) -> Optional[str]:
+    if key in DISTRICT_COORDS:
+        return key
+    if key in _ALIASES:
+        return _ALIASES[key]
+
+    match = difflib.get_close_matches(key, _CANDIDATES, n=1, cutoff=FUZZY_CUTOFF)
+    if match:
+        return _ALIASES.get(match[0], match[0])
+    return None
+
+
+def resolve_district(name: str) -> Optional[str]:
+    """Map a user-supplied name to a DISTRICT_COORDS key without any I/O"""
+    key = normalize(name)
+    if not key:
+        return None
+    # Fuzzy matches cost milliseconds; every later lookup of the same spelling is a dict hit
+    return _resolve_key(key)
+
+
+def district_info(name: str) -> Optional[Dict]:
+    """Canonical ID, display names and centroid for a district name, or None"""
+    key = resolve_district(name)
+    if key is None:
+        return None
+    lat, lon = DISTRICT_COORDS[key]
+    return {"id": key, "name": key.title(), "name_kn": DISTRICT_NAMES_KN.get(key), "latitude": lat, "longitude": lon}
+
+
+# -------------------- NEAREST DISTRICT --------------------
+
+# Equirectangular projection around the centroids' mean latitude; plenty
+# accurate for ranking distances within one state
+_REF_COS = math.cos(math.radians(sum(lat for lat, _ in DISTRICT_COORDS.values()) / len(DISTRICT_COORDS)))
+
+
+def _project(lat: float, lon: float) -> Tuple[float, float]:
+    return lon * _REF_COS, lat
+
+
+def _build_kdtree(points: List[Tuple[float, float, str]], depth: int = 0):
+    """Nodes are (point, axis, left, right)"""
+    if not points:
+        return None
+    axis = depth % 2
+    points = sorted(points, key=lambda p: p[axis])
+    mid = len(points) // 2
+    return (points[mid], axis,
+            _build_kdtree(points[:mid], depth + 1), _build_kdtree(points[mid + 1:], depth + 1))
+
+
+def _nearest(node, x: float, y: float, best: Tuple[float, Optional[str]]) -> Tuple[float, Optional[str]]:
+    if node is None:
+        return best
+    point, axis, left, right = node
+    d2 = (point[0] - x) ** 2 + (point[1] - y) ** 2
+    if d2 < best[0]:
+        best = (d2, point[2])
+    diff = (x, y)[axis] - point[axis]
+    near, far = (left, right) if diff < 0 else (right, left)
+    best = _nearest(near, x, y, best)
+    if diff * diff < best[0]:
+        best = _nearest(far, x, y, best)
+    return best
+
+
+_kdtree = _build_kdtree([(*_project(lat, lon), key) for key, (lat, lon) in DISTRICT_COORDS.items()])
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def nearest_district(lat: float, lon: float, max_km: float = NEAREST_MAX_KM) -> Optional[Tuple[str, float]]:
+    """(district key, km to its centroid) for the closest centroid, or None beyond max_km"""
+    _, key = _nearest(_kdtree, *_project(lat, lon), (math.inf, None))
+    if key is None:
+        return None
+    km = _haversine_km(lat, lon, *DISTRICT_COORDS[key])
+    return (key, round(km, 1)) if km <= max_km else None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(GEOCODE_CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(GEOCODE_CACHE_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " query TEXT PRIMARY KEY, lat REAL, lon REAL, source TEXT, resolved_at REAL)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def _cache_get(key: str):
+    """Return (hit, coords) from the persistent cache"""
+    with _lock:
+        row = _db().execute(
+            "SELECT lat, lon, resolved_at FROM geocode WHERE query = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return False, None
+    lat, lon, resolved_at = row
+    if lat is None:
+        if time.time() - resolved_at > GEOCODE_NEGATIVE_TTL:
+            return False, None
+        return True, None
+    return True, (lat, lon)
+
+
+def _cache_put(key: str, coords: Optional[Tuple[float, float]], source: Optional[str]):
+    lat, lon = coords if coords else (None, None)
+    with _lock:
+        _db().execute(
+            "INSERT OR REPLACE INTO geocode (query, lat, lon, source, resolved_at) VALUES (?, ?, ?, ?, ?)",
+            (key, lat, lon, source, time.time()),
+        )
+        _db().commit()
+
+
+def _locationiq(name: str) -> Optional[Tuple[float, float]]:
+    api_key = os.getenv("LOCATIONIQ_API_KEY")
+    if not api_key:
+        return None
+
+    queries = [
+        f"{name}, Karnataka, India",
+        f"{name} District, Karnataka, India",
+        f"{name}, India",
+    ]
+    error = None
+    for q in queries:
+        try:
+            r = http_client.get(
+                "https://us1.locationiq.com/v1/search.php",
+                params={"key": api_key, "q": q, "format": "json", "limit": 1},
+                timeout=5,
+            )
+        except requests.RequestException as e:
+            error = e
+            continue
+        if r.status_code in http_client.RETRY_STATUSES:
+            error = requests.HTTPError(f"LocationIQ returned {r.status_code}")
+            continue
+        if r.status_code == 200 and r.json():
+            loc = r.json()[0]
+            return float(loc["lat"]), float(loc["lon"])
+    if error is not None:
+        raise error
+    return None
+
+
+def _openweather(name: str) -> Optional[Tuple[float, float]]:
+    api_key = os.getenv("OPENWEATHER_API_KEY")
+    if not api_key:
+        return None
+    quota.acquire("openweather", "interactive", "geocoder")
+    r = http_client.get(
+        "http://api.openweathermap.org/geo/1.0/direct",
+        params={"q": f"{name},Karnataka,IN", "limit": 1, "appid": api_key},
+        timeout=10,
+        on_retry=lambda: quota.acquire("openweather", "interactive", "geocoder"),
+    )
+    if r.status_code in http_client.RETRY_STATUSES:
+        raise requests.HTTPError(f"OpenWeather geocoding returned {r.status_code}")
+    if r.ok and r.json():
+        loc = r.json()[0]
+        return float(loc["lat"]), float(loc["lon"])
+    return None
+
+
+def resolve(name: str) -> Optional[Tuple[float, float]]:
+    """Resolve a district or place name to (lat, lon), or None"""
+    district = resolve_district(name)
+    if district:
+        return DISTRICT_COORDS[district]
+
+    key = normalize(name)
+    if not key:
+        return None
+    cached = _memory.get(key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    hit, coords = _cache_get(key)
+    if not hit:
+        try:
+            coords = _locationiq(key)
+            source = "locationiq"
+            if coords is None:
+                coords = _openweather(key)
+                source = "openweather"
+        except requests.RequestException as e:
+            # Upstream trouble is not a real miss; don't cache it
+            print(f"🔥 Geocoding error for {name}: {e}")
+            return None
+        _cache_put(key, coords, source if coords else None)
+
+    _memory.set(key, coords, ttl=None if coords else GEOCODE_MEMORY_NEGATIVE_TTL)
+    return coords
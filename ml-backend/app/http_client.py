@@ -0,0 +1,226 @@
+"""
+Shared HTTP client for upstream APIs (OpenWeather, LocationIQ).
+
+One keep-alive `requests.Session` with a connection pool per host, bounded
+retries with jittered exponential backoff, and a circuit breaker per host
+that fails fast while the upstream is unhealthy.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.3))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 3.0))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+
+# Transient upstream statuses; get() retries all but 429 (see its docstring)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without touching the network while a host's breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down"""
+
+    def __init__(self, host: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                # Let exactly one probe through
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == "open"
+
+    def release_probe(self):
+        """Give up a half-open probe without a verdict, so the next call can probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+_stats: Dict[str, Dict] = {}
+
+
+def _host_entry(host: str):
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+            _stats[host] = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0}
+        return _breakers[host], _stats[host]
+
+
+def _bump(stats: Dict, key: str, delta: int = 1):
+    with _lock:
+        stats[key] += delta
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds from a Retry-After header, when given as a number"""
+    value = response.headers.get("Retry-After", "")
+    return float(value) if value.strip().isdigit() else None
+
+
+def get(url: str, params: Optional[Dict] = None, timeout: float = 8,
+        retries: int = HTTP_RETRIES, on_retry: Optional[Callable[[], None]] = None) -> requests.Response:
+    """GET through the shared pool with retries and the host's circuit breaker
+
+    A 429 is handed straight back; retrying a throttled upstream only digs
+    deeper. `on_retry` runs before every further attempt (callers spending a
+    quota take their token there); if it raises, the last response or error
+    is returned instead of retrying. Retries also stop as soon as the
+    breaker opens, so the caller sees the real upstream result.
+    """
+    host = urlparse(url).hostname or url
+    breaker, stats = _host_entry(host)
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        _bump(stats, "requests")
+        _bump(stats, "in_flight")
+        settled = False
+        error = response = None
+        try:
+            response = _session.get(url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            _bump(stats, "errors")
+            breaker.record_failure()
+            settled = True
+            # Only transport failures are worth another attempt
+            if not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                raise
+            error = e
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                settled = True
+                return response
+            _bump(stats, "errors")
+            breaker.record_failure()
+            settled = True
+        finally:
+            _bump(stats, "in_flight", -1)
+            if not settled:
+                # Anything else escaped: free the half-open probe slot
+                breaker.release_probe()
+
+        delay = _backoff(attempt)
+        if response is not None:
+            wait = _retry_after(response)
+            if response.status_code == 429 or (wait is not None and wait > HTTP_BACKOFF_MAX):
+                return response
+            delay = max(delay, wait or 0)
+        give_up = attempt >= retries or breaker.is_open()
+        if not give_up and on_retry is not None:
+            try:
+                on_retry()
+            except requests.RequestException:
+                give_up = True
+        if give_up:
+            if error is not None:
+                raise error
+            return response
+
+        _bump(stats, "retries")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _pool_metrics() -> Dict:
+    pools = {}
+    manager = _adapter.poolmanager
+    for key in list(manager.pools.keys()):
+        pool = manager.pools.get(key)
+        if pool is None:
+            continue
+        idle = pool.pool.qsize() if pool.pool is not None else 0
+        pools[pool.host] = {
+            "connections_opened": pool.num_connections,
+            "requests_served": pool.num_requests,
+            "idle": idle,
+            "maxsize": pool.pool.maxsize if pool.pool is not None else HTTP_POOL_MAXSIZE,
+        }
+    return pools
+
+
+def http_metrics() -> Dict:
+    """Per-host request counters, pool utilisation and breaker state"""
+    with _lock:
+        hosts = {host: dict(stats) for host, stats in _stats.items()}
+        breakers = dict(_breakers)
+    for host, breaker in breakers.items():
+        hosts[host]["breaker"] = breaker.snapshot()
+    return {"hosts": hosts, "pools": _pool_metrics()}
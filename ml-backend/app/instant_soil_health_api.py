@@ -1,25 +1,20 @@
 
 from fastapi import APIRouter, HTTPException
 from app.district_centroids import DISTRICT_COORDS
-import ee
+from app.ee_session import require_ee
+from app.geocoder import resolve_district
 from app.weather_api import get_soil_weather_data
 
 router = APIRouter()
 
-# Initialize Earth Engine if not already
-try:
-    ee.Initialize(project="tidy-federation-479517-v3")
-except Exception:
-    pass
-
-
 
 @router.get("/api/soil-health/{district}")
 def get_soil_health(district: str):
-    key = district.lower().strip()
-    if key not in DISTRICT_COORDS:
+    key = resolve_district(district)
+    if key is None:
         raise HTTPException(status_code=404, detail="Location not found")
     lat, lon = DISTRICT_COORDS[key]
+    ee = require_ee()
     # Use a 5km buffer around the district centroid for better sampling
     point = ee.Geometry.Point(lon, lat)
     region = point.buffer(5000)
@@ -1,8 +1,10 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Query, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
+import secrets
 import tempfile
+from typing import List, Optional
 
 # -------------------- ENV --------------------
 load_dotenv()
@@ -29,17 +31,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -------------------- EARTH ENGINE --------------------
+from app.ee_session import start_ee_session, ee_health
+from app.raster_store import start_raster_ingest, store_status
+from app.boundaries import load as load_boundaries, boundaries_status
+
+@app.on_event("startup")
+def init_earth_engine():
+    start_ee_session()
+    start_raster_ingest()
+    # District outlines are served from memory; build with `python -m app.boundaries build`
+    if load_boundaries() is None:
+        print("⚠️ District boundaries not built; /api/satellite boundary layers disabled")
+
+VAJRA_SCHEDULER_ENABLED = os.getenv("VAJRA_SCHEDULER_ENABLED", "false").lower() == "true"
+
+@app.on_event("startup")
+async def start_vajra_scheduler():
+    # Opt-in so only the replicas meant to run alerts do; the Redis lock covers several.
+    # Runs only queue alerts, so the outbox delivery workers start alongside.
+    if VAJRA_SCHEDULER_ENABLED:
+        from app import alert_outbox, vajra_scheduler
+
+        alert_outbox.start_delivery_workers()
+        vajra_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_vajra_scheduler():
+    from app import alert_outbox, vajra_scheduler
+
+    await vajra_scheduler.stop()
+    if VAJRA_SCHEDULER_ENABLED:
+        alert_outbox.stop_delivery_workers()
+
+@app.on_event("shutdown")
+def flush_background_writers():
+    # Commit buffered Firestore writes before the process exits
+    from app.firestore_writer import close_all
+
+    close_all()
+
 # -------------------- ROUTERS --------------------
 from app.weather_api import router as weather_router
 from app.crop_recommendation_api import router as crop_router
 from app.satellite import router as satellite_router
 from app.soil_health import router as soil_router
+from app.dashboard import router as dashboard_router
 """ from app.instant_soil_health_api import router as instant_soil_health_router """
 
 app.include_router(weather_router)
 app.include_router(crop_router)
 app.include_router(satellite_router)
 app.include_router(soil_router)
+app.include_router(dashboard_router)
 # app.include_router(instant_soil_health_router)
 
 # -------------------- HEALTH CHECK --------------------
@@ -52,10 +96,45 @@ def root():
             "crop-recommendation",
             "satellite",
             "soil-health",
+            "dashboard",
             # "instant-soil-health",
             "disease-diagnosis",
             "vajra-sos",
         ],
+        "earth_engine": ee_health(),
+    }
+
+# -------------------- METRICS --------------------
+from app.http_client import http_metrics
+from app.weather_api import point_cache_stats, bulk_cache_stats
+from app.quota import quota_usage
+from app.satellite import mapid_cache_stats
+from app.ndvi_store import store_status as ndvi_store_status
+from app.ee_executor import ee_executor_stats
+from app.alert_email_service import email_stats
+from app.alert_outbox import outbox_stats
+from app.alert_suppression import suppression_stats
+from app.firestore_writer import writer_stats
+from app.vajra_scheduler import scheduler_stats
+
+@app.get("/api/metrics", tags=["Health"])
+def metrics():
+    return {
+        "http": http_metrics(),
+        "earth_engine": ee_health(),
+        "earth_engine_executor": ee_executor_stats(),
+        "raster_store": store_status(),
+        "weather_point": point_cache_stats(),
+        "weather_bulk": bulk_cache_stats(),
+        "quota": quota_usage(),
+        "satellite_mapids": mapid_cache_stats(),
+        "ndvi_store": ndvi_store_status(),
+        "boundaries": boundaries_status(),
+        "alert_email": email_stats(),
+        "alert_outbox": outbox_stats(),
+        "alert_suppression": suppression_stats(),
+        "firestore_writes": writer_stats(),
+        "vajra_scheduler": scheduler_stats(),
     }
 
 # =====================================================
@@ -116,6 +195,39 @@ def disease_info():
         "endpoint": "/api/disease/predict",
     }
 
+# =====================================================
+# ✅ VAJRA SOS - SCHEDULER
+# =====================================================
+@app.post("/api/vajra-sos/trigger", tags=["VajraSOS Alerts"])
+async def trigger_vajra_sos(
+    district: List[str] = Query(...),
+    x_vajra_token: Optional[str] = Header(None),
+):
+    """Check the named districts now, outside their scheduled slots
+
+    Needs the VAJRA_TRIGGER_TOKEN value in the X-Vajra-Token header; the
+    endpoint is disabled while that variable is unset. Statewide runs are
+    left to the scheduler. Alerts go through the delivery outbox, so the
+    run reports "alerts_queued" (formerly "alerts_sent").
+    """
+    from app import vajra_scheduler
+
+    expected = os.getenv("VAJRA_TRIGGER_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Manual trigger disabled (VAJRA_TRIGGER_TOKEN not set)")
+    if not x_vajra_token or not secrets.compare_digest(x_vajra_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Vajra-Token")
+    district = [d for d in district if d.strip()]
+    if not district:
+        raise HTTPException(status_code=400, detail="Name at least one district")
+
+    run = await vajra_scheduler.trigger(district)
+    return {"success": run["error"] is None, **run}
+
+@app.get("/api/vajra-sos/scheduler", tags=["VajraSOS Alerts"])
+def vajra_sos_scheduler():
+    return scheduler_stats()
+
 # # =====================================================
 # # ✅ VAJRA SOS - WEATHER ALERTS
 # # =====================================================
@@ -127,14 +239,6 @@ def disease_info():
 #     get_inapp_alerts_for_district,
 # )
 
-# @app.post("/api/vajra-sos/trigger", tags=["VajraSOS Alerts"])
-# async def trigger_vajra_sos():
-#     try:
-#         result = monitor_weather_and_send_alerts()
-#         return {"success": True, **result}
-#     except Exception as e:
-#         return {"success": False, "error": str(e)}
-
 # @app.get("/api/vajra-sos/inapp-alerts", tags=["VajraSOS Alerts"])
 # def vajra_sos_inapp_alerts(district: str):
 #     return get_inapp_alerts_for_district(district)
@@ -0,0 +1,267 @@
+"""
+Locally rendered NDVI tiles from a precomputed Karnataka composite.
+
+`ingest()` downloads the Sentinel-2 NDVI median composite for the latest
+completed cropping season once, in blocks, into a memory-mapped uint8 array
+(0..254 -> NDVI 0..1, 255 = no data) and builds 2x overview levels.
+`render_tile()` then produces any XYZ tile with vectorised NumPy sampling
+and a palette lookup, with no Earth Engine call at request time.
+
+    python -m app.ndvi_store ingest [--force]
+"""
+
+import io
+import json
+import math
+import os
+import threading
+import time
+import warnings
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.ee_session import ee, ee_ready
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NDVI_STORE_DIR = os.getenv("NDVI_STORE_DIR", os.path.join(BASE_DIR, "Data", "ndvi"))
+NDVI_PIXEL_SIZE = float(os.getenv("NDVI_PIXEL_SIZE", 0.001))  # degrees, ~110 m
+NDVI_BLOCK = 1024
+NODATA = 255
+TILE_SIZE = 256
+
+# Karnataka extent (west, south, east, north), padded slightly
+KARNATAKA_BOUNDS = (73.9, 11.4, 78.7, 18.6)
+
+# Cropping seasons as (name, start month, end month inclusive)
+SEASONS = [("rabi", 11, 3), ("zaid", 4, 5), ("kharif", 6, 10)]
+
+_lock = threading.Lock()
+_loaded: Optional[Dict] = None
+
+
+def _palette_lut() -> np.ndarray:
+    """256-entry RGBA lookup: 0..254 interpolate the NDVI palette, 255 is transparent"""
+    from app.satellite import NDVI_PALETTE
+
+    stops = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in NDVI_PALETTE], dtype=np.float32)
+    positions = np.linspace(0, 254, len(stops))
+    values = np.arange(255)
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:255, channel] = np.interp(values, positions, stops[:, channel]).round()
+    lut[:255, 3] = 255
+    return lut
+
+
+def latest_completed_season(today: Optional[date] = None) -> Tuple[str, str, str]:
+    """(name, start, end) of the most recently finished season; end is exclusive"""
+    today = today or date.today()
+    candidates = []
+    for year in (today.year - 1, today.year):
+        for name, start_month, end_month in SEASONS:
+            start = date(year, start_month, 1)
+            end_year = year + 1 if end_month < start_month else year
+            end = date(end_year + (end_month == 12), end_month % 12 + 1, 1)
+            if end <= today:
+                candidates.append((end, name, start))
+    end, name, start = max(candidates)
+    return f"{name}-{start.year}", start.isoformat(), end.isoformat()
+
+
+def _meta_path() -> str:
+    return os.path.join(NDVI_STORE_DIR, "meta.json")
+
+
+def _level_path(level: int) -> str:
+    return os.path.join(NDVI_STORE_DIR, f"ndvi_l{level}.npy")
+
+
+def _read_meta() -> Optional[Dict]:
+    if not os.path.exists(_meta_path()):
+        return None
+    with open(_meta_path(), "r") as f:
+        return json.load(f)
+
+
+def _load() -> Optional[Dict]:
+    """Memory-map every overview level, reloading after a new ingest"""
+    global _loaded
+    if not os.path.exists(_meta_path()):
+        return None
+    mtime = os.path.getmtime(_meta_path())
+    with _lock:
+        if _loaded is None or _loaded["mtime"] != mtime:
+            meta = _read_meta()
+            _loaded = {
+                "mtime": mtime,
+                "meta": meta,
+                "levels": [np.load(_level_path(i), mmap_mode="r") for i in range(meta["levels"])],
+                "lut": _palette_lut(),
+            }
+        return _loaded
+
+
+def is_available() -> bool:
+    return _load() is not None
+
+
+def _composite(start: str, end: str):
+    from app.soil_health import S2_COLLECTION, MAX_CLOUD_PERCENT
+
+    west, south, east, north = KARNATAKA_BOUNDS
+    region = ee.Geometry.Rectangle([west, south, east, north])
+    ndvi = (
+        ee.ImageCollection(S2_COLLECTION)
+        .filterBounds(region)
+        .filterDate(start, end)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", MAX_CLOUD_PERCENT))
+        .median()
+        .normalizedDifference(["B8", "B4"])
+    )
+    # Quantise to uint8 on the server to shrink the download
+    return ndvi.clamp(0, 1).multiply(254).round().unmask(NODATA).toUint8().rename("ndvi")
+
+
+def _build_overview(src: np.ndarray, path: str) -> np.ndarray:
+    """2x downsample ignoring no-data pixels, written strip by strip"""
+    height, width = src.shape[0] // 2, src.shape[1] // 2
+    tmp_path = path + ".tmp.npy"
+    dst = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(height, width))
+    for row in range(0, height, NDVI_BLOCK):
+        rows = min(NDVI_BLOCK, height - row)
+        block = np.asarray(src[2 * row:2 * (row + rows), :2 * width], dtype=np.float32)
+        block[block == NODATA] = np.nan
+        block = block.reshape(rows, 2, width, 2)
+        with warnings.catch_warnings():
+            # All-NaN blocks are expected where there is no data
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(block, axis=(1, 3))
+        dst[row:row + rows] = np.where(np.isnan(mean), NODATA, np.round(mean)).astype(np.uint8)
+    dst.flush()
+    del dst
+    # Swap in whole files so live readers never see a half-written level
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+def ingest(force: bool = False) -> Dict:
+    """Download the latest completed season's composite unless already stored"""
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+
+    season, start, end = latest_completed_season()
+    meta = _read_meta()
+    if meta and meta["season"] == season and not force:
+        return {"updated": False, "season": season}
+
+    west, south, east, north = KARNATAKA_BOUNDS
+    px = NDVI_PIXEL_SIZE
+    width = int(round((east - west) / px))
+    height = int(round((north - south) / px))
+    image = _composite(start, end)
+
+    os.makedirs(NDVI_STORE_DIR, exist_ok=True)
+    tmp_path = _level_path(0) + ".tmp.npy"
+    grid = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(height, width))
+    for row in range(0, height, NDVI_BLOCK):
+        for col in range(0, width, NDVI_BLOCK):
+            h = min(NDVI_BLOCK, height - row)
+            w = min(NDVI_BLOCK, width - col)
+            pixels = ee.data.computePixels({
+                "expression": image,
+                "fileFormat": "NUMPY_NDARRAY",
+                "grid": {
+                    "dimensions": {"width": w, "height": h},
+                    "affineTransform": {
+                        "scaleX": px, "shearX": 0, "translateX": west + col * px,
+                        "shearY": 0, "scaleY": -px, "translateY": north - row * px,
+                    },
+                    "crsCode": "EPSG:4326",
+                },
+            })
+            grid[row:row + h, col:col + w] = pixels["ndvi"]
+        print(f"🛰️ NDVI ingest {season}: {min(row + NDVI_BLOCK, height)}/{height} rows")
+    grid.flush()
+    del grid
+    os.replace(tmp_path, _level_path(0))
+
+    # Overview pyramid until the coarsest level fits in one block
+    level, src = 0, np.load(_level_path(0), mmap_mode="r")
+    while max(src.shape) > NDVI_BLOCK:
+        level += 1
+        src = _build_overview(src, _level_path(level))
+
+    new_meta = {
+        "season": season,
+        "start": start,
+        "end": end,
+        "west": west,
+        "north": north,
+        "pixel_size": px,
+        "width": width,
+        "height": height,
+        "levels": level + 1,
+        "version": int(time.time()),
+        "ingested_at": datetime.utcnow().isoformat(),
+    }
+    with open(_meta_path() + ".tmp", "w") as f:
+        json.dump(new_meta, f)
+    os.replace(_meta_path() + ".tmp", _meta_path())
+    return {"updated": True, "season": season, "levels": level + 1}
+
+
+def render_tile(z: int, x: int, y: int) -> Optional[Tuple[bytes, str]]:
+    """Render an XYZ NDVI tile as PNG; returns (bytes, etag) or None without a store"""
+    store = _load()
+    if store is None:
+        return None
+    meta = store["meta"]
+
+    # Pick the coarsest overview that is still at least as fine as the tile
+    tile_px = 360.0 / (TILE_SIZE * 2 ** z)
+    level = 0
+    while level + 1 < meta["levels"] and meta["pixel_size"] * 2 ** (level + 1) <= tile_px:
+        level += 1
+    array = store["levels"][level]
+    px = meta["pixel_size"] * 2 ** level
+
+    # Pixel-centre lon/lat for the tile (Web Mercator rows)
+    n = 2 ** z
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lons = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (y + offsets) / n))))
+
+    cols = np.floor((lons - meta["west"]) / px).astype(np.int64)
+    rows = np.floor((meta["north"] - lats) / px).astype(np.int64)
+    col_ok = (cols >= 0) & (cols < array.shape[1])
+    row_ok = (rows >= 0) & (rows < array.shape[0])
+
+    values = np.full((TILE_SIZE, TILE_SIZE), NODATA, dtype=np.uint8)
+    if col_ok.any() and row_ok.any():
+        values[np.ix_(row_ok, col_ok)] = array[np.ix_(rows[row_ok], cols[col_ok])]
+
+    rgba = store["lut"][values]
+    buf = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buf, format="PNG", compress_level=1)
+    return buf.getvalue(), f"ndvi-{meta['version']}-{z}-{x}-{y}"
+
+
+def store_status() -> Dict:
+    meta = _read_meta()
+    if not meta:
+        return {"present": False}
+    return {"present": True, **{k: meta[k] for k in ("season", "start", "end", "levels", "ingested_at")}}
+
+
+if __name__ == "__main__":
+    import sys
+    from app.ee_session import init_ee
+
+    if len(sys.argv) > 1 and sys.argv[1] == "ingest":
+        init_ee()
+        print(ingest(force="--force" in sys.argv))
+    else:
+        print(store_status())
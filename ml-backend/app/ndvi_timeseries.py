@@ -0,0 +1,139 @@
+"""
+Incrementally maintained monthly NDVI per district.
+
+The first request for a district computes every completed month since
+NDVI_SERIES_START in a single server-side mapped Earth Engine call and
+stores the results in SQLite. Later requests only compute months that have
+completed since, so the store grows by one small reduction per month.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+
+from app.concurrency import SingleFlight
+from app.district_centroids import DISTRICT_COORDS
+from app.ee_session import require_ee
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NDVI_SERIES_PATH = os.getenv("NDVI_SERIES_PATH", os.path.join(BASE_DIR, "Data", "ndvi_timeseries.sqlite"))
+NDVI_SERIES_START = os.getenv("NDVI_SERIES_START", "2024-07")
+# Sentinel-2 scenes keep arriving for a few days after a month ends
+MONTH_SETTLE_DAYS = 5
+
+_lock = threading.Lock()
+_conn = None
+_flight = SingleFlight()
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(NDVI_SERIES_PATH), exist_ok=True)
+        _conn = sqlite3.connect(NDVI_SERIES_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS ndvi_monthly ("
+            " district TEXT, month TEXT, ndvi REAL, image_count INTEGER, computed_at REAL,"
+            " PRIMARY KEY (district, month))"
+        )
+        _conn.commit()
+    return _conn
+
+
+def completed_months(today: date = None) -> List[str]:
+    """'YYYY-MM' for every settled month from NDVI_SERIES_START up to today"""
+    last = (today or date.today()) - timedelta(days=MONTH_SETTLE_DAYS)
+    year, month = map(int, NDVI_SERIES_START.split("-"))
+    months = []
+    while (year, month) < (last.year, last.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _stored(district: str) -> Dict[str, Dict]:
+    with _lock:
+        rows = _db().execute(
+            "SELECT month, ndvi, image_count FROM ndvi_monthly WHERE district = ? ORDER BY month",
+            (district,),
+        ).fetchall()
+    return {month: {"ndvi": ndvi, "image_count": count} for month, ndvi, count in rows}
+
+
+def _compute(district: str, months: List[str]) -> List[Dict]:
+    """Monthly NDVI for `months` in one mapped Earth Engine call"""
+    from app.soil_health import S2_COLLECTION, MAX_CLOUD_PERCENT, SAMPLE_RADIUS_M
+
+    ee = require_ee()
+    lat, lon = DISTRICT_COORDS[district]
+    region = ee.Geometry.Point(lon, lat).buffer(SAMPLE_RADIUS_M)
+    s2 = (
+        ee.ImageCollection(S2_COLLECTION)
+        .filterBounds(region)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", MAX_CLOUD_PERCENT))
+    )
+
+    def per_month(month):
+        start = ee.Date.parse("YYYY-MM", month)
+        col = s2.filterDate(start, start.advance(1, "month"))
+        # An empty month has no bands to reduce; only evaluate when there is imagery
+        ndvi = ee.Algorithms.If(
+            col.size().gt(0),
+            col.median().normalizedDifference(["B8", "B4"]).reduceRegion(
+                reducer=ee.Reducer.mean(), geometry=region, scale=30, maxPixels=1e9
+            ).get("nd"),
+            None,
+        )
+        return ee.Feature(None, {"month": month, "ndvi": ndvi, "image_count": col.size()})
+
+    info = ee.FeatureCollection(ee.List(months).map(per_month)).getInfo()
+    return [f["properties"] for f in info["features"]]
+
+
+def _save(district: str, rows: List[Dict]):
+    now = time.time()
+    with _lock:
+        _db().executemany(
+            "INSERT OR REPLACE INTO ndvi_monthly VALUES (?, ?, ?, ?, ?)",
+            [(district, r["month"], r.get("ndvi"), r.get("image_count", 0), now) for r in rows],
+        )
+        _db().commit()
+
+
+def monthly_ndvi(district: str) -> Dict[str, Dict]:
+    """{month: {"ndvi", "image_count"}} for a district key, extending the store if needed"""
+    stored = _stored(district)
+    missing = [m for m in completed_months() if m not in stored]
+    if not missing:
+        return stored
+
+    def update():
+        # Re-check inside the flight: another caller may have just filled it
+        current = _stored(district)
+        todo = [m for m in completed_months() if m not in current]
+        if todo:
+            _save(district, _compute(district, todo))
+        return _stored(district)
+
+    try:
+        return _flight.do(district, update)
+    except Exception as e:
+        if not stored:
+            raise
+        print(f"⚠️ NDVI series update failed for {district}, serving stored months: {e}")
+        return stored
+
+
+def recent_ndvi(district: str, months: int) -> Dict:
+    """Median of the last `months` monthly values and the window it covers"""
+    series = monthly_ndvi(district)
+    window = sorted(series)[-months:]
+    values = sorted(series[m]["ndvi"] for m in window if series[m]["ndvi"] is not None)
+    if not values:
+        return {"ndvi": None, "start": None, "end": None}
+    mid = len(values) // 2
+    median = values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+    return {"ndvi": median, "start": window[0], "end": window[-1]}
@@ -0,0 +1,213 @@
+"""
+Shared upstream API quota manager.
+
+Each upstream (e.g. "openweather", "smtp") has a per-minute token bucket and a
+per-day budget, stored in Redis (app/redis_client.py) so every worker and
+the VajraSOS monitor draw from the same budget. Falls back to a per-process
+bucket when Redis is unreachable.
+
+Priority lanes keep headroom for safety-critical work: a lane may only take
+a token while more than its reserved share of the bucket remains.
+
+    alerts       -> can use the whole budget, waits up to 30 s
+    interactive  -> leaves 10% in reserve, waits up to 2 s
+    prefetch     -> leaves 30% in reserve, fails fast (also /api/weather/bulk)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+
+import redis
+import requests
+
+from app.redis_client import get_redis
+
+QUOTAS = {
+    "openweather": {
+        "per_minute": int(os.getenv("OPENWEATHER_QUOTA_PER_MINUTE", 60)),
+        "per_day": int(os.getenv("OPENWEATHER_QUOTA_PER_DAY", 30000)),
+    },
+    # Provider sending limits for alert emails (Gmail: ~2000/day per account)
+    "smtp": {
+        "per_minute": int(os.getenv("SMTP_QUOTA_PER_MINUTE", 60)),
+        "per_day": int(os.getenv("SMTP_QUOTA_PER_DAY", 2000)),
+    },
+}
+
+PRIORITIES = {
+    "alerts": {"reserve": 0.0, "max_wait": 30.0},
+    "interactive": {"reserve": 0.10, "max_wait": 2.0},
+    "prefetch": {"reserve": 0.30, "max_wait": 0.0},
+}
+
+REDIS_RETRY_SECONDS = 30
+
+
+class QuotaExceeded(requests.RequestException):
+    """Raised when the budget for a priority lane is exhausted"""
+
+
+# KEYS: bucket hash, day counter
+# ARGV: now, refill/s, capacity, minute reserve, day limit, day reserve, ttl
+_TOKEN_BUCKET_LUA = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts'))
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+if tokens == nil then tokens = capacity; ts = now end
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+
+local used_today = tonumber(redis.call('GET', KEYS[2]) or '0')
+local day_limit = tonumber(ARGV[5])
+if used_today + 1 > day_limit - tonumber(ARGV[6]) then
+  redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+  return {0, tostring(tokens), '-1'}
+end
+if tokens - 1 < tonumber(ARGV[4]) then
+  redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+  local wait = (tonumber(ARGV[4]) + 1 - tokens) / rate
+  return {0, tostring(tokens), tostring(wait)}
+end
+
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[7]))
+return {1, tostring(tokens), '0'}
+"""
+
+_lock = threading.Lock()
+_script = None
+_redis_down_until = 0.0
+_local_buckets: Dict[str, Dict] = {}
+_local_usage: Dict[str, Dict[str, int]] = {}
+
+
+def _today() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def _redis():
+    """Redis client, or None while it is considered down"""
+    global _script
+    if time.time() < _redis_down_until:
+        return None
+    r = get_redis()
+    if _script is None:
+        _script = r.register_script(_TOKEN_BUCKET_LUA)
+    return r
+
+
+def _mark_redis_down(e: Exception):
+    global _redis_down_until
+    if time.time() >= _redis_down_until:
+        print(f"⚠️ Quota manager using local buckets (Redis unavailable: {e})")
+    _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+
+def _take_local(name: str, cfg: Dict, reserve: float):
+    rate = cfg["per_minute"] / 60.0
+    capacity = cfg["per_minute"]
+    now = time.time()
+    with _lock:
+        bucket = _local_buckets.setdefault(name, {"tokens": capacity, "ts": now, "day": _today(), "used": 0})
+        if bucket["day"] != _today():
+            bucket["day"], bucket["used"] = _today(), 0
+        bucket["tokens"] = min(capacity, bucket["tokens"] + (now - bucket["ts"]) * rate)
+        bucket["ts"] = now
+        if bucket["used"] + 1 > cfg["per_day"] * (1 - reserve):
+            return False, bucket["tokens"], -1.0
+        if bucket["tokens"] - 1 < capacity * reserve:
+            return False, bucket["tokens"], (capacity * reserve + 1 - bucket["tokens"]) / rate
+        bucket["tokens"] -= 1
+        bucket["used"] += 1
+        return True, bucket["tokens"], 0.0
+
+
+def _take(name: str, cfg: Dict, reserve: float):
+    """Try to take one token; returns (allowed, tokens_left, wait_seconds; -1 = day exhausted)"""
+    r = _redis()
+    if r is not None:
+        try:
+            allowed, tokens, wait = _script(
+                keys=[f"quota:{name}:bucket", f"quota:{name}:day:{_today()}"],
+                args=[
+                    time.time(), cfg["per_minute"] / 60.0, cfg["per_minute"],
+                    cfg["per_minute"] * reserve, cfg["per_day"], cfg["per_day"] * reserve,
+                    2 * 24 * 3600,
+                ],
+                client=r,
+            )
+            return bool(int(allowed)), float(tokens), float(wait)
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    return _take_local(name, cfg, reserve)
+
+
+def _count(name: str, caller: str, outcome: str):
+    field = f"{caller}:{outcome}"
+    r = _redis()
+    if r is not None:
+        try:
+            key = f"quota:{name}:usage:{_today()}"
+            r.hincrby(key, field, 1)
+            r.expire(key, 8 * 24 * 3600)
+            return
+        except redis.RedisError as e:
+            _mark_redis_down(e)
+    with _lock:
+        usage = _local_usage.setdefault(f"{name}:{_today()}", {})
+        usage[field] = usage.get(field, 0) + 1
+
+
+def acquire(name: str, priority: str = "interactive", caller: str = "unknown"):
+    """Block until a token is available for `priority`, or raise QuotaExceeded"""
+    cfg = QUOTAS.get(name)
+    if cfg is None:
+        return
+    lane = PRIORITIES[priority]
+    deadline = time.monotonic() + lane["max_wait"]
+
+    while True:
+        allowed, _, wait = _take(name, cfg, lane["reserve"])
+        if allowed:
+            _count(name, caller, "used")
+            return
+        remaining = deadline - time.monotonic()
+        if wait < 0 or wait > remaining:
+            _count(name, caller, "rejected")
+            raise QuotaExceeded(f"{name} quota exhausted for {priority} ({caller})")
+        time.sleep(max(wait, 0.05))
+
+
+def quota_usage() -> Dict:
+    """Today's per-caller consumption and rejections for each upstream"""
+    result = {}
+    for name in QUOTAS:
+        usage = None
+        r = _redis()
+        if r is not None:
+            try:
+                raw = r.hgetall(f"quota:{name}:usage:{_today()}")
+                usage = {k.decode(): int(v) for k, v in raw.items()}
+            except redis.RedisError as e:
+                _mark_redis_down(e)
+        if usage is None:
+            with _lock:
+                usage = dict(_local_usage.get(f"{name}:{_today()}", {}))
+
+        callers: Dict[str, Dict[str, int]] = {}
+        for field, count in usage.items():
+            caller, _, outcome = field.rpartition(":")
+            callers.setdefault(caller, {"used": 0, "rejected": 0})[outcome] = count
+        result[name] = {
+            "limits": QUOTAS[name],
+            "backend": "local" if time.time() < _redis_down_until else "redis",
+            "callers": callers,
+        }
+    return result
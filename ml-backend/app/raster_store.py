@@ -0,0 +1,303 @@
+"""
+Local store of the latest MODIS LST and NASA SMAP soil-moisture grids.
+
+An ingest job exports each Karnataka-extent grid once per upstream update
+into a .npy array (named after its image time) plus a JSON sidecar with its
+georeferencing and the array's file name. Lookups memory-map the array and
+read a single pixel, so answering a lat/lon costs no Earth Engine round
+trip while the store is fresh. Swapping the sidecar is what publishes a
+new grid, so readers always pair an array with its own metadata.
+
+Every process may run the ingest thread (RASTER_INGEST_IN_PROCESS); a file
+lock in RASTER_DIR lets one of them ingest at a time and the others skip
+the round. With it disabled, run the job from cron instead.
+
+A layer is fresh while the last ingest check (at most
+RASTER_CHECK_MAX_AGE ago) found it holding the newest upstream image, or
+otherwise while the image is younger than the layer's max_age_hours;
+upstream products are published with a lag, so image age alone would mark
+e.g. SMAP stale most of the time.
+
+Run once (e.g. from cron):  python -m app.raster_store [--force]
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.ee_session import ee, ee_ready
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no lock needed
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RASTER_DIR = os.getenv("RASTER_STORE_DIR", os.path.join(BASE_DIR, "Data", "rasters"))
+RASTER_INGEST_INTERVAL = int(os.getenv("RASTER_INGEST_INTERVAL", 3600))
+RASTER_INGEST_IN_PROCESS = os.getenv("RASTER_INGEST_IN_PROCESS", "true").lower() == "true"
+# A "store holds the newest upstream image" check counts for this long
+RASTER_CHECK_MAX_AGE = int(os.getenv("RASTER_CHECK_MAX_AGE", 3 * RASTER_INGEST_INTERVAL))
+
+# Karnataka extent (west, south, east, north), padded slightly
+KARNATAKA_BOUNDS = (73.9, 11.4, 78.7, 18.6)
+NODATA = -9999.0
+
+LAYERS = {
+    "lst": {
+        "collection": "MODIS/061/MOD11A2",
+        "band": "LST_Day_1km",
+        "scale": 0.02,
+        "offset": -273.15,  # Kelvin*0.02 -> °C
+        "pixel_size": 0.01,
+        "max_age_hours": 24 * 24,  # 8-day composites published with a lag
+    },
+    "sm": {
+        "collection": "NASA/SMAP/SPL4SMGP/008",
+        "band": "sm_surface",
+        "scale": 1.0,
+        "offset": 0.0,
+        "pixel_size": 0.05,
+        "max_age_hours": 24 * 5,  # 3-hourly product, published 2-4 days late
+    },
+}
+
+_lock = threading.Lock()
+_loaded: Dict[str, Dict] = {}
+_ingest_thread = None
+
+
+def _meta_path(layer: str) -> str:
+    return os.path.join(RASTER_DIR, f"{layer}.json")
+
+
+def _array_path(layer: str, meta: Dict) -> str:
+    # Sidecars written before arrays were versioned point at <layer>.npy
+    return os.path.join(RASTER_DIR, meta.get("array", f"{layer}.npy"))
+
+
+def _read_meta(layer: str) -> Optional[Dict]:
+    meta_path = _meta_path(layer)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+
+def _load(layer: str) -> Optional[Dict]:
+    """Memory-map the layer, reloading when the ingest job replaced it"""
+    meta_path = _meta_path(layer)
+    if not os.path.exists(meta_path):
+        return None
+    mtime = os.path.getmtime(meta_path)
+
+    with _lock:
+        entry = _loaded.get(layer)
+        if entry is None or entry["mtime"] != mtime:
+            meta = _read_meta(layer)
+            try:
+                array = np.load(_array_path(layer, meta), mmap_mode="r")
+            except FileNotFoundError:
+                return None
+            entry = {"mtime": mtime, "meta": meta, "array": array}
+            _loaded[layer] = entry
+        return entry
+
+
+def is_fresh(meta: Optional[Dict]) -> bool:
+    if not meta:
+        return False
+    if time.time() - meta.get("checked_at", 0) <= RASTER_CHECK_MAX_AGE:
+        return True
+    max_age_hours = LAYERS.get(meta["layer"], {}).get("max_age_hours", meta["max_age_hours"])
+    age_hours = (time.time() - meta["image_time"] / 1000) / 3600
+    return age_hours <= max_age_hours
+
+
+def _write_meta(layer: str, meta: Dict):
+    meta_path = _meta_path(layer)
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+class _IngestLock:
+    """Exclusive, non-blocking lock on RASTER_DIR/.ingest.lock across processes"""
+
+    def __enter__(self) -> bool:
+        os.makedirs(RASTER_DIR, exist_ok=True)
+        self._file = open(os.path.join(RASTER_DIR, ".ingest.lock"), "a")
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def __exit__(self, *exc):
+        self._file.close()  # releases the lock
+
+
+def lookup(layer: str, lat: float, lon: float):
+    """Return (hit, value) for a point; hit is False when the store is missing or stale"""
+    entry = _load(layer)
+    if entry is None or not is_fresh(entry["meta"]):
+        return False, None
+
+    meta = entry["meta"]
+    col = int((lon - meta["west"]) / meta["pixel_size"])
+    row = int((meta["north"] - lat) / meta["pixel_size"])
+    if not (0 <= row < meta["height"] and 0 <= col < meta["width"]):
+        return False, None
+
+    value = float(entry["array"][row, col])
+    return True, (None if np.isnan(value) else value)
+
+
+def _latest_image_time(layer: str) -> int:
+    cfg = LAYERS[layer]
+    west, south, east, north = KARNATAKA_BOUNDS
+    region = ee.Geometry.Rectangle([west, south, east, north])
+    return ee.ImageCollection(cfg["collection"]).filterBounds(region) \
+        .aggregate_max("system:time_start").getInfo()
+
+
+def ingest(layer: str, force: bool = False) -> Dict:
+    """Export the newest grid for `layer` unless the store already has it"""
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+
+    cfg = LAYERS[layer]
+    meta = _read_meta(layer)
+    image_time = _latest_image_time(layer)
+    if meta and meta["image_time"] == image_time and not force:
+        # Still the newest upstream image: record the check so it stays fresh
+        _write_meta(layer, {**meta, "checked_at": time.time()})
+        return {"layer": layer, "updated": False, "image_time": image_time}
+
+    west, south, east, north = KARNATAKA_BOUNDS
+    px = cfg["pixel_size"]
+    width = int(round((east - west) / px))
+    height = int(round((north - south) / px))
+
+    image = (
+        ee.ImageCollection(cfg["collection"])
+        .filter(ee.Filter.eq("system:time_start", image_time))
+        .mosaic()
+        .select(cfg["band"])
+        .multiply(cfg["scale"])
+        .add(cfg["offset"])
+        .unmask(NODATA)
+    )
+    pixels = ee.data.computePixels({
+        "expression": image,
+        "fileFormat": "NUMPY_NDARRAY",
+        "grid": {
+            "dimensions": {"width": width, "height": height},
+            "affineTransform": {
+                "scaleX": px, "shearX": 0, "translateX": west,
+                "shearY": 0, "scaleY": -px, "translateY": north,
+            },
+            "crsCode": "EPSG:4326",
+        },
+    })
+    grid = np.asarray(pixels[cfg["band"]], dtype=np.float32)
+    grid[grid <= NODATA + 1] = np.nan
+
+    os.makedirs(RASTER_DIR, exist_ok=True)
+    # Write the array under a new name first; replacing the sidecar then publishes
+    # grid and metadata together, so readers never see a partial or mismatched grid
+    array_name = f"{layer}-{image_time}.npy"
+    array_path = os.path.join(RASTER_DIR, array_name)
+    tmp = f"{array_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, grid)
+    os.replace(tmp, array_path)
+    new_meta = {
+        "layer": layer,
+        "array": array_name,
+        "collection": cfg["collection"],
+        "band": cfg["band"],
+        "image_time": image_time,
+        "ingested_at": datetime.utcnow().isoformat(),
+        "west": west,
+        "north": north,
+        "pixel_size": px,
+        "width": width,
+        "height": height,
+        "max_age_hours": cfg["max_age_hours"],
+        "checked_at": time.time(),
+    }
+    _write_meta(layer, new_meta)
+    # Open memory maps keep their data; only new readers follow the sidecar
+    for old in glob.glob(os.path.join(RASTER_DIR, f"{layer}-*.npy")) + [os.path.join(RASTER_DIR, f"{layer}.npy")]:
+        if os.path.basename(old) != array_name and ".tmp" not in old and os.path.exists(old):
+            os.remove(old)
+
+    print(f"🛰️ Raster store updated: {layer} @ {image_time}")
+    return {"layer": layer, "updated": True, "image_time": image_time}
+
+
+def ingest_all(force: bool = False):
+    with _IngestLock() as acquired:
+        if not acquired:
+            return [{"layer": layer, "updated": False, "skipped": "ingest running elsewhere"} for layer in LAYERS]
+        return _ingest_layers(force)
+
+
+def _ingest_layers(force: bool):
+    results = []
+    for layer in LAYERS:
+        try:
+            results.append(ingest(layer, force=force))
+        except Exception as e:
+            print(f"🔥 Raster ingest error ({layer}): {e}")
+            results.append({"layer": layer, "updated": False, "error": str(e)})
+    return results
+
+
+def store_status() -> Dict:
+    status = {}
+    for layer in LAYERS:
+        meta = _read_meta(layer)
+        status[layer] = {
+            "present": meta is not None,
+            "fresh": is_fresh(meta),
+            "image_time": meta["image_time"] if meta else None,
+            "ingested_at": meta["ingested_at"] if meta else None,
+            "checked_at": meta.get("checked_at") if meta else None,
+        }
+    return status
+
+
+def _ingest_loop():
+    while True:
+        ingest_all()
+        time.sleep(RASTER_INGEST_INTERVAL)
+
+
+def start_raster_ingest():
+    """Run the ingest job periodically in a background thread (idempotent)"""
+    global _ingest_thread
+    if not RASTER_INGEST_IN_PROCESS:
+        return
+    if _ingest_thread is not None and _ingest_thread.is_alive():
+        return
+    _ingest_thread = threading.Thread(target=_ingest_loop, name="raster-ingest", daemon=True)
+    _ingest_thread.start()
+
+
+if __name__ == "__main__":
+    import sys
+    from app.ee_session import init_ee
+
+    init_ee()
+    for result in ingest_all(force="--force" in sys.argv):
+        print(result)
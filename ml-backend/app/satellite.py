@@ -1,65 +1,261 @@
-from fastapi import APIRouter, HTTPException
-import ee
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+import json
+import os
+import threading
+import requests
+from typing import Optional
+from urllib.parse import quote
+from app import boundaries, ee_executor, http_client, ndvi_store, tile_cache
+from app.concurrency import SingleFlight, TTLCache
 from app.district_centroids import DISTRICT_COORDS
+from app.ee_session import require_ee
+from app.geocoder import nearest_district, resolve_district
+from app.soil_health import (
+    S2_COLLECTION, NDVI_START, NDVI_END, MAX_CLOUD_PERCENT, SAMPLE_RADIUS_M,
+)
 
 router = APIRouter(
     prefix="/api/satellite",
     tags=["Satellite"]
 )
 
-# ---------- Earth Engine Init ----------
-try:
-    ee.Initialize(project="tidy-federation-479517-v3")
-except Exception:
-    raise RuntimeError(
-        "Earth Engine not authenticated. Run `earthengine authenticate`."
-    )
+# Earth Engine map IDs stay valid for hours; refresh a little before expiry
+MAPID_TTL = int(os.getenv("EE_MAPID_TTL", 4 * 3600))
+MAPID_REFRESH_AHEAD = int(os.getenv("EE_MAPID_REFRESH_AHEAD", 30 * 60))
 
+RGB_VIS = {"bands": ["B4", "B3", "B2"], "min": 0, "max": 3000}
+NDVI_PALETTE = ["#d7191c", "#fdae61", "#ffffbf", "#a6d96a", "#1a9641"]
+NDVI_VIS = {"min": 0, "max": 1, "palette": NDVI_PALETTE}
 
-@router.get("/{district}")
-def get_satellite_tiles(district: str):
-    key = district.lower().strip()
-    print("Satellite district key:", key)
-    print("Available:", list(DISTRICT_COORDS.keys()))
+TILE_LAYERS = ("rgb", "ndvi")
+TILE_MAX_AGE = int(os.getenv("SATELLITE_TILE_MAX_AGE", 7 * 24 * 3600))
+TILE_PROXY = os.getenv("SATELLITE_TILE_PROXY", "true").lower() == "true"
+
+_mapid_cache = TTLCache(maxsize=256, ttl=MAPID_TTL)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def _mapid_key(key: str):
+    vis = json.dumps({"rgb": RGB_VIS, "ndvi": NDVI_VIS}, sort_keys=True)
+    return (key, NDVI_START, NDVI_END, vis)
 
-    if key not in DISTRICT_COORDS:
-        raise HTTPException(status_code=404, detail="Location not found")
 
+def _compute_tile_urls(key: str) -> dict:
     lat, lon = DISTRICT_COORDS[key]
+    ee = require_ee()
     # Use a 5km buffer around the district centroid for better sampling
     point = ee.Geometry.Point(lon, lat)
-    region = point.buffer(5000)  # 5km radius
+    region = point.buffer(SAMPLE_RADIUS_M)  # 5km radius
 
     # Sentinel-2 median composite for RGB
     image = (
-        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+        ee.ImageCollection(S2_COLLECTION)
         .filterBounds(region)
-        .filterDate("2024-07-01", "2026-01-31")
-        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
+        .filterDate(NDVI_START, NDVI_END)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", MAX_CLOUD_PERCENT))
         .median()
     )
 
     # RGB tile URL
-    rgb_tile = image.visualize(
-        bands=["B4", "B3", "B2"],
-        min=0,
-        max=3000
-    ).getMapId()["tile_fetcher"].url_format
+    rgb_tile = image.visualize(**RGB_VIS).getMapId()["tile_fetcher"].url_format
 
     # NDVI tile URL
     ndvi_image = image.normalizedDifference(["B8", "B4"])
-    ndvi_tile = ndvi_image.visualize(
-        min=0,
-        max=1,
-        palette=["#d7191c", "#fdae61", "#ffffbf", "#a6d96a", "#1a9641"]
-    ).getMapId()["tile_fetcher"].url_format
+    ndvi_tile = ndvi_image.visualize(**NDVI_VIS).getMapId()["tile_fetcher"].url_format
+
+    return {"rgb_tile": rgb_tile, "ndvi_tile": ndvi_tile}
+
+
+def _compute_and_cache(key: str) -> dict:
+    urls = _compute_tile_urls(key)
+    _mapid_cache.set(_mapid_key(key), urls)
+    return urls
+
+
+def _load_tile_urls(key: str) -> dict:
+    return ee_executor.run("satellite_mapid", _mapid_key(key), lambda: _compute_and_cache(key))
+
+
+def _refresh_in_background(key: str):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            _load_tile_urls(key)
+        except Exception as e:
+            print(f"🔥 Map ID refresh failed for {key}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, name=f"mapid-refresh-{key}", daemon=True).start()
+
+
+def cached_tile_urls(key: str):
+    """Cached tile URL templates (refreshed ahead of expiry), or None on a miss"""
+    cache_key = _mapid_key(key)
+    urls = _mapid_cache.get(cache_key)
+    if urls is None:
+        return None
+
+    expires_in = _mapid_cache.expires_in(cache_key)
+    if expires_in is not None and expires_in < MAPID_REFRESH_AHEAD:
+        _refresh_in_background(key)
+    return urls
+
+
+def get_tile_urls(key: str) -> dict:
+    """Cached RGB/NDVI tile URL templates for a district key"""
+    urls = cached_tile_urls(key)
+    return urls if urls is not None else _load_tile_urls(key)
+
+
+_tile_flight = SingleFlight()
+
+
+def _tile_layer_key(layer: str, key: str) -> str:
+    # Tiles belong to one composite, so the date window is part of the key
+    return f"{layer}:{key}:{NDVI_START}:{NDVI_END}"
+
+
+def fetch_tile(layer: str, key: str, z: int, x: int, y: int):
+    """Return (png bytes, etag) from the tile store, fetching upstream once on a miss"""
+    store_layer = _tile_layer_key(layer, key)
+    cached = tile_cache.get(store_layer, z, x, y)
+    if cached is not None:
+        return cached
+
+    def load():
+        hit = tile_cache.get(store_layer, z, x, y)
+        if hit is not None:
+            return hit
+        url = get_tile_urls(key)[f"{layer}_tile"].format(z=z, x=x, y=y)
+        res = http_client.get(url, timeout=15)
+        if res.status_code != 200:
+            raise HTTPException(status_code=502, detail=f"Tile upstream returned {res.status_code}")
+        return res.content, tile_cache.put(store_layer, z, x, y, res.content)
 
-    # Boundary tile (GeoJSON or similar, here just a placeholder)
-    boundary_tile = None
+    return _tile_flight.do((store_layer, z, x, y), load)
 
+
+def mapid_cache_stats() -> dict:
     return {
+        "cache": _mapid_cache.stats(),
+        "tiles": {**tile_cache.stats(), "single_flight": _tile_flight.stats()},
+    }
+
+
+@router.get("/tiles/{layer}/{z}/{x}/{y}.png")
+def get_satellite_tile(layer: str, z: int, x: int, y: int, district: str, request: Request):
+    """XYZ tile proxy backed by the local tile store"""
+    if layer not in TILE_LAYERS:
+        raise HTTPException(status_code=404, detail="Unknown layer")
+    key = resolve_district(district)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    try:
+        # NDVI renders locally from the seasonal composite when it has been ingested
+        rendered = ndvi_store.render_tile(z, x, y) if layer == "ndvi" else None
+        data, etag = rendered or fetch_tile(layer, key, z, x, y)
+    except requests.RequestException:
+        raise HTTPException(status_code=503, detail="Tile service unavailable")
+
+    headers = {
+        "Cache-Control": f"public, max-age={TILE_MAX_AGE}",
+        "ETag": f'"{etag}"',
+    }
+    if request.headers.get("if-none-match") == f'"{etag}"':
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/png", headers=headers)
+
+
+def _boundaries_etag() -> str:
+    return f'"boundaries-{boundaries.boundaries_status()["built_at"]}"'
+
+
+@router.get("/boundaries.geojson")
+def get_district_boundaries(request: Request, zoom: Optional[int] = Query(None, ge=0, le=22), district: Optional[str] = None):
+    """District outlines simplified for `zoom` (full detail when omitted)"""
+    key = None
+    if district is not None:
+        key = resolve_district(district)
+        if key is None:
+            raise HTTPException(status_code=404, detail="Location not found")
+    collection = boundaries.geojson(zoom, key)
+    if collection is None:
+        raise HTTPException(status_code=503, detail="District boundaries not built")
+
+    headers = {"Cache-Control": f"public, max-age={TILE_MAX_AGE}", "ETag": _boundaries_etag()}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=json.dumps(collection), media_type="application/geo+json", headers=headers)
+
+
+@router.get("/boundaries/{z}/{x}/{y}.mvt")
+def get_boundary_tile(z: int, x: int, y: int, request: Request):
+    """District outlines as a Mapbox vector tile (layer "districts")"""
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+    data = boundaries.vector_tile(z, x, y)
+    if data is None:
+        raise HTTPException(status_code=503, detail="District boundaries not built")
+
+    headers = {"Cache-Control": f"public, max-age={TILE_MAX_AGE}", "ETag": _boundaries_etag()}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+
+@router.get("/locate")
+def locate_district(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """District whose boundary contains the point
+
+    Without built boundaries this falls back to the nearest district centroid.
+    """
+    if boundaries.is_available():
+        key = boundaries.district_at(lat, lon)
+        if key is None:
+            raise HTTPException(status_code=404, detail="Point is outside the known districts")
+        return {"latitude": lat, "longitude": lon, "district": key, "method": "boundary"}
+
+    nearest = nearest_district(lat, lon)
+    if nearest is None:
+        raise HTTPException(status_code=404, detail="Point is outside the known districts")
+    return {"latitude": lat, "longitude": lon, "district": nearest[0],
+            "distance_km": nearest[1], "method": "nearest_centroid"}
+
+
+@router.get("/{district}")
+async def get_satellite_tiles(district: str, request: Request):
+    key = resolve_district(district)
+
+    if key is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    urls = cached_tile_urls(key)
+    if urls is None:
+        urls = await ee_executor.run_async("satellite_mapid", _mapid_key(key), lambda: _compute_and_cache(key))
+
+    base = str(request.base_url).rstrip("/")
+    # District outlines as vector tiles, once the boundary store has been built
+    boundary_tile = f"{base}/api/satellite/boundaries/{{z}}/{{x}}/{{y}}.mvt" if boundaries.is_available() else None
+
+    response = {
         "district": district,  # Return original (possibly capitalized) district
-        "rgb_tile": rgb_tile,
-        "ndvi_tile": ndvi_tile,
+        "rgb_tile": urls["rgb_tile"],
+        "ndvi_tile": urls["ndvi_tile"],
         "boundary_tile": boundary_tile
     }
+    if TILE_PROXY:
+        # Serve tiles through the local store; keep the upstream templates for reference
+        for layer in TILE_LAYERS:
+            response[f"{layer}_tile_upstream"] = response[f"{layer}_tile"]
+            response[f"{layer}_tile"] = f"{base}/api/satellite/tiles/{layer}/{{z}}/{{x}}/{{y}}.png?district={quote(key)}"
+    return response
@@ -1,75 +1,192 @@
-from fastapi import APIRouter, HTTPException
-import ee
-from app.district_centroids import DISTRICT_COORDS
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import date, timedelta
+from typing import Optional
+import json
+import os
+from app import ee_executor, ndvi_timeseries
+from app.ee_session import require_ee
+from app.geocoder import resolve_district
 
 router = APIRouter(
     prefix="/api/soil-health",
     tags=["Soil Health"]
 )
 
-# ---------- Earth Engine Init ----------
-try:
-    ee.Initialize(project="tidy-federation-479517-v3")
-except Exception:
-    raise RuntimeError(
-        "Earth Engine not authenticated. Run `earthengine authenticate`."
-    )
+S2_COLLECTION = "COPERNICUS/S2_SR_HARMONIZED"
+NDVI_START = "2024-07-01"
+NDVI_END = "2026-01-31"
+MAX_CLOUD_PERCENT = 30
+SAMPLE_RADIUS_M = 5000
+NDVI_WINDOW_MONTHS = 18
 
+# Keep each reduceRegions request well under Earth Engine payload limits
+FARM_CHUNK_FEATURES = int(os.getenv("FARM_CHUNK_FEATURES", 500))
+FARM_CHUNK_VERTICES = int(os.getenv("FARM_CHUNK_VERTICES", 50000))
+FARM_MAX_FEATURES = int(os.getenv("FARM_MAX_FEATURES", 20000))
+FARM_DEFAULT_DAYS = 90
 
-@router.get("/{district}")
-def soil_health(district: str):
-    key = district.lower().strip()
 
-    if key not in DISTRICT_COORDS:
-        raise HTTPException(status_code=404, detail="Location not found")
+def ndvi_status(ndvi: float):
+    """Map an NDVI value to (status, advisory)"""
+    if ndvi < 0.3:
+        return "Poor", "Low vegetation vigor. Improve soil nutrients and irrigation."
+    if ndvi < 0.6:
+        return "Moderate", "Average soil health. Monitor moisture and fertilization."
+    return "Good", "Healthy soil condition. Maintain current practices."
+
 
-    lat, lon = DISTRICT_COORDS[key]
-    
-    # Use a 5km buffer around the district centroid for better sampling
-    point = ee.Geometry.Point(lon, lat)
-    region = point.buffer(5000)  # 5km radius
-
-    # ---------- Sentinel-2 (Harmonized) - Last 6 months ----------
-    image = (
-        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-        .filterBounds(region)
-        .filterDate("2024-07-01", "2026-01-31")  # Extended date range
-        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 30))
+def _vertex_count(geometry: dict) -> int:
+    coords = geometry.get("coordinates") or []
+    if geometry.get("type") == "Polygon":
+        return sum(len(ring) for ring in coords)
+    return sum(len(ring) for polygon in coords for ring in polygon)
+
+
+def _chunk_farms(features: list):
+    """Split features into chunks bounded by feature and vertex counts"""
+    chunk, vertices = [], 0
+    for feature in features:
+        n = _vertex_count(feature["geometry"])
+        if chunk and (len(chunk) >= FARM_CHUNK_FEATURES or vertices + n > FARM_CHUNK_VERTICES):
+            yield chunk
+            chunk, vertices = [], 0
+        chunk.append(feature)
+        vertices += n
+    if chunk:
+        yield chunk
+
+
+def _farm_ndvi_image(ee, start: str, end: str, bounds):
+    ndvi = (
+        ee.ImageCollection(S2_COLLECTION)
+        .filterBounds(bounds)
+        .filterDate(start, end)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", MAX_CLOUD_PERCENT))
         .median()
+        .normalizedDifference(["B8", "B4"])
+        .rename("ndvi")
     )
+    # The constant band counts every pixel so the valid fraction can be derived
+    return ndvi.addBands(ee.Image.constant(1).rename("all"))
 
-    # ---------- NDVI ----------
-    ndvi = (
-        image.normalizedDifference(["B8", "B4"])
-        .reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=region,  # Use region instead of point
-            scale=30,
-            maxPixels=1e9
-        )
-        .get("nd")
-        .getInfo()
+
+def _score_chunk(ee, chunk: list, start: str, end: str):
+    fc = ee.FeatureCollection([
+        ee.Feature(ee.Geometry(f["geometry"]), {"_idx": f["_idx"]}) for f in chunk
+    ])
+    reducer = (
+        ee.Reducer.mean()
+        .combine(ee.Reducer.percentile([10, 90]), sharedInputs=True)
+        .combine(ee.Reducer.count(), sharedInputs=True)
     )
+    stats = _farm_ndvi_image(ee, start, end, fc.geometry().bounds()).reduceRegions(
+        collection=fc, reducer=reducer, scale=10, tileScale=4
+    ).select(["_idx", "ndvi_mean", "ndvi_p10", "ndvi_p90", "ndvi_count", "all_count"], None, False)
+    return [f["properties"] for f in stats.getInfo()["features"]]
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+@router.post("/farms")
+def farm_ndvi_batch(
+    farms: dict = Body(..., description="GeoJSON FeatureCollection of farm polygons"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """Per-polygon NDVI statistics streamed back as NDJSON"""
+    if farms.get("type") != "FeatureCollection" or not isinstance(farms.get("features"), list):
+        raise HTTPException(status_code=400, detail="Expected a GeoJSON FeatureCollection")
+
+    features = []
+    for i, feature in enumerate(farms["features"]):
+        geometry = (feature or {}).get("geometry") or {}
+        if geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            raise HTTPException(status_code=400, detail=f"Feature {i} is not a Polygon/MultiPolygon")
+        features.append({"_idx": i, "id": feature.get("id", i), "geometry": geometry})
+    if len(features) > FARM_MAX_FEATURES:
+        raise HTTPException(status_code=413, detail=f"At most {FARM_MAX_FEATURES} farms per request")
+
+    end = end or date.today()
+    start = start or end - timedelta(days=FARM_DEFAULT_DAYS)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    start, end = start.isoformat(), end.isoformat()
+    ee = require_ee()
+
+    def stream():
+        for chunk in _chunk_farms(features):
+            ids = {f["_idx"]: f["id"] for f in chunk}
+            try:
+                rows = ee_executor.run("farm_ndvi", None, lambda: _score_chunk(ee, chunk, start, end))
+            except Exception as e:
+                for idx in ids:
+                    yield json.dumps({"id": ids[idx], "error": getattr(e, "detail", str(e))}) + "\n"
+                continue
+            for row in rows:
+                total = row.get("all_count") or 0
+                valid = row.get("ndvi_count") or 0
+                yield json.dumps({
+                    "id": ids[row["_idx"]],
+                    "ndvi_mean": _round(row.get("ndvi_mean")),
+                    "ndvi_p10": _round(row.get("ndvi_p10")),
+                    "ndvi_p90": _round(row.get("ndvi_p90")),
+                    "valid_fraction": _round(valid / total if total else None),
+                    "pixel_count": total,
+                }) + "\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"X-NDVI-Window": f"{start}/{end}"},
+    )
+
+
+@router.get("/{district}/timeseries")
+async def soil_health_timeseries(district: str):
+    key = resolve_district(district)
+
+    if key is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    series = await ee_executor.run_async("ndvi_series", key, lambda: ndvi_timeseries.monthly_ndvi(key))
+    months = sorted(series)
+    return {
+        "district": district,
+        "months": months,
+        "ndvi": [round(series[m]["ndvi"], 3) if series[m]["ndvi"] is not None else None for m in months],
+        "image_count": [series[m]["image_count"] for m in months],
+        "source": "Sentinel-2 monthly NDVI (Google Earth Engine)"
+    }
+
+
+@router.get("/{district}")
+async def soil_health(district: str):
+    key = resolve_district(district)
+
+    if key is None:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    # ---------- NDVI: median of the stored monthly series ----------
+    recent = await ee_executor.run_async(
+        "soil_ndvi", key, lambda: ndvi_timeseries.recent_ndvi(key, NDVI_WINDOW_MONTHS)
+    )
+    ndvi = recent["ndvi"]
 
     if ndvi is None:
         raise HTTPException(status_code=500, detail="NDVI computation failed")
 
     ndvi = round(ndvi, 3)
 
-    if ndvi < 0.3:
-        status = "Poor"
-        advisory = "Low vegetation vigor. Improve soil nutrients and irrigation."
-    elif ndvi < 0.6:
-        status = "Moderate"
-        advisory = "Average soil health. Monitor moisture and fertilization."
-    else:
-        status = "Good"
-        advisory = "Healthy soil condition. Maintain current practices."
+    status, advisory = ndvi_status(ndvi)
 
     return {
         "district": district,
         "ndvi": ndvi,
         "soil_health_status": status,
         "advisory": advisory,
+        "period": {"start": recent["start"], "end": recent["end"]},
         "source": "Sentinel-2 NDVI (Google Earth Engine)"
     }
@@ -0,0 +1,183 @@
+"""
+Disk-backed XYZ tile store for the satellite layers (MBTiles-style SQLite).
+
+Tiles are fetched from Earth Engine once, stored with their size and last
+access time, and evicted least-recently-used once the store grows beyond
+TILE_CACHE_MAX_BYTES. Rows use the MBTiles TMS convention (flipped y).
+
+Pre-seed every district at common zoom levels:
+    python -m app.tile_cache seed [--zooms 8-13] [--layers rgb,ndvi]
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TILE_CACHE_PATH = os.getenv("TILE_CACHE_PATH", os.path.join(BASE_DIR, "Data", "satellite_tiles.mbtiles"))
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Only rewrite last_access when it is older than this, to keep reads cheap
+ACCESS_TOUCH_SECONDS = 3600
+
+_lock = threading.Lock()
+_conn = None
+_total_bytes = None
+_stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+
+def _db() -> sqlite3.Connection:
+    global _conn, _total_bytes
+    if _conn is None:
+        os.makedirs(os.path.dirname(TILE_CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(TILE_CACHE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS tiles ("
+            " layer TEXT, zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,"
+            " tile_data BLOB, etag TEXT, size INTEGER, fetched_at REAL, last_access REAL,"
+            " PRIMARY KEY (layer, zoom_level, tile_column, tile_row))"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)")
+        _conn.execute("INSERT OR IGNORE INTO metadata VALUES ('format', 'png')")
+        _conn.commit()
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+    return _conn
+
+
+def _tms_row(z: int, y: int) -> int:
+    return (2 ** z - 1) - y
+
+
+def get(layer: str, z: int, x: int, y: int) -> Optional[Tuple[bytes, str]]:
+    """Return (png bytes, etag) or None"""
+    now = time.time()
+    with _lock:
+        row = _db().execute(
+            "SELECT tile_data, etag, last_access FROM tiles"
+            " WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (layer, z, x, _tms_row(z, y)),
+        ).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        if now - row[2] > ACCESS_TOUCH_SECONDS:
+            _db().execute(
+                "UPDATE tiles SET last_access = ?"
+                " WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (now, layer, z, x, _tms_row(z, y)),
+            )
+            _db().commit()
+    return row[0], row[1]
+
+
+def put(layer: str, z: int, x: int, y: int, data: bytes) -> str:
+    """Store a tile and evict old ones if over budget; returns its etag"""
+    global _total_bytes
+    etag = hashlib.sha1(data).hexdigest()
+    now = time.time()
+    with _lock:
+        db = _db()
+        old = db.execute(
+            "SELECT size FROM tiles WHERE layer = ? AND zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (layer, z, x, _tms_row(z, y)),
+        ).fetchone()
+        db.execute(
+            "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (layer, z, x, _tms_row(z, y), sqlite3.Binary(data), etag, len(data), now, now),
+        )
+        _total_bytes += len(data) - (old[0] if old else 0)
+        if _total_bytes > TILE_CACHE_MAX_BYTES:
+            _evict(db)
+        db.commit()
+    return etag
+
+
+def _evict(db: sqlite3.Connection):
+    """Drop least-recently-used tiles until the store is at 90% of its budget"""
+    global _total_bytes
+    target = int(TILE_CACHE_MAX_BYTES * 0.9)
+    while _total_bytes > target:
+        rows = db.execute(
+            "SELECT rowid, size FROM tiles ORDER BY last_access LIMIT 500"
+        ).fetchall()
+        if not rows:
+            break
+        freed = 0
+        ids = []
+        for rowid, size in rows:
+            ids.append((rowid,))
+            freed += size
+            if _total_bytes - freed <= target:
+                break
+        db.executemany("DELETE FROM tiles WHERE rowid = ?", ids)
+        _total_bytes -= freed
+        _stats["evicted"] += len(ids)
+
+
+def stats() -> Dict:
+    with _lock:
+        _db()
+        return {**_stats, "bytes": _total_bytes, "max_bytes": TILE_CACHE_MAX_BYTES}
+
+
+def tiles_for_bounds(west: float, south: float, east: float, north: float, z: int) -> Iterator[Tuple[int, int]]:
+    """XYZ tile coordinates covering a lon/lat box at zoom `z`"""
+    def to_tile(lon, lat):
+        n = 2 ** z
+        x = int((lon + 180.0) / 360.0 * n)
+        lat_rad = math.radians(lat)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+    x0, y0 = to_tile(west, north)
+    x1, y1 = to_tile(east, south)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+def seed(zooms=range(8, 14), layers=("rgb", "ndvi")):
+    """Fetch every district's tiles at the given zoom levels into the store"""
+    from app.district_centroids import DISTRICT_COORDS
+    from app.satellite import fetch_tile
+    from app.soil_health import SAMPLE_RADIUS_M
+
+    fetched = 0
+    for key, (lat, lon) in DISTRICT_COORDS.items():
+        dlat = SAMPLE_RADIUS_M / 111320.0
+        dlon = dlat / math.cos(math.radians(lat))
+        for z in zooms:
+            for x, y in tiles_for_bounds(lon - dlon, lat - dlat, lon + dlon, lat + dlat, z):
+                for layer in layers:
+                    try:
+                        fetch_tile(layer, key, z, x, y)
+                        fetched += 1
+                    except Exception as e:
+                        print(f"🔥 Tile seed error {layer}/{key}/{z}/{x}/{y}: {e}")
+        print(f"🗺️ Seeded {key}")
+    print(f"✅ Seeded {fetched} tiles")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Satellite tile cache")
+    parser.add_argument("command", choices=["seed", "stats"])
+    parser.add_argument("--zooms", default="8-13", help="e.g. 8-13")
+    parser.add_argument("--layers", default="rgb,ndvi")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(stats())
+    else:
+        from app.ee_session import init_ee
+
+        init_ee()
+        lo, _, hi = args.zooms.partition("-")
+        seed(range(int(lo), int(hi or lo) + 1), tuple(args.layers.split(",")))
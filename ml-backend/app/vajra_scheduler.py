@@ -0,0 +1,305 @@
+"""
+Asyncio scheduler for VajraSOS monitor runs.
+
+Instead of checking every district in one burst at the top of the hour,
+each district gets a fixed slot inside the interval (derived from its key,
+so every replica agrees on it) plus a little random jitter. Districts that
+fall due within VAJRA_SCHEDULER_TICK of each other are checked together in
+one `monitor_weather_and_send_alerts(districts)` call, run in a worker thread.
+
+A district is only checked by one run at a time: a process-local guard
+catches a slow run overlapping its own next slot, and a Redis lock
+(`vajra:sched:lock:<district>`) keeps several replicas from checking the
+same district. Runs that find a district busy skip it and are counted.
+
+Run inside the API process (VAJRA_SCHEDULER_ENABLED=true; main.py starts
+it together with the alert outbox delivery workers) or as a standalone
+worker:
+
+    python -m app.vajra_scheduler
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from app.redis_client import get_redis
+
+VAJRA_INTERVAL_SECONDS = int(os.getenv("VAJRA_INTERVAL_SECONDS", 3600))
+VAJRA_JITTER_SECONDS = float(os.getenv("VAJRA_JITTER_SECONDS", 60))
+VAJRA_RUN_CONCURRENCY = int(os.getenv("VAJRA_RUN_CONCURRENCY", 4))
+# Districts due within this many seconds of each other share one run
+VAJRA_SCHEDULER_TICK = 5.0
+REDIS_RETRY_SECONDS = 30
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_lock = threading.Lock()
+_running: Dict[str, str] = {}  # district -> run id, this process
+_release_script = None
+_redis_down_until = 0.0
+_interval = VAJRA_INTERVAL_SECONDS
+_task: Optional[asyncio.Task] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_inflight = set()  # strong references to launched runs
+_next_due: Dict[str, Tuple[float, float]] = {}  # district -> (slot, slot + jitter)
+_runs = deque(maxlen=200)
+_stats = {"runs": 0, "manual_runs": 0, "districts_checked": 0, "skipped_running": 0,
+          "skipped_locked": 0, "failed_runs": 0}
+
+
+# -------------------- SLOTS --------------------
+
+def _offset(district: str) -> float:
+    """Stable position of a district inside the interval"""
+    h = int(hashlib.sha1(district.encode("utf-8")).hexdigest()[:8], 16)
+    return h / 0xFFFFFFFF * _interval
+
+
+def _first_slot(district: str, now: float) -> float:
+    slot = (now // _interval) * _interval + _offset(district)
+    return slot if slot >= now else slot + _interval
+
+
+def _due(slot: float) -> Tuple[float, float]:
+    return slot, slot + random.uniform(0, VAJRA_JITTER_SECONDS)
+
+
+# -------------------- OVERLAP LOCK --------------------
+
+def _redis():
+    global _release_script
+    if time.time() < _redis_down_until:
+        return None
+    r = get_redis()
+    if _release_script is None:
+        _release_script = r.register_script(_RELEASE_LUA)
+    return r
+
+
+def _mark_redis_down(e: Exception):
+    global _redis_down_until
+    if time.time() >= _redis_down_until:
+        print(f"⚠️ VajraSOS scheduler using local locks only (Redis unavailable: {e})")
+    _redis_down_until = time.time() + REDIS_RETRY_SECONDS
+
+
+def _lock_key(district: str) -> str:
+    return f"vajra:sched:lock:{district}"
+
+
+def _acquire(district: str, run_id: str) -> Optional[str]:
+    """None if acquired, else why the district was skipped ("running" | "locked")"""
+    with _lock:
+        if district in _running:
+            return "running"
+        _running[district] = run_id
+    r = _redis()
+    if r is None:
+        return None
+    try:
+        # Expires after one interval so a crashed replica can't hold a district forever
+        if r.set(_lock_key(district), run_id, nx=True, ex=max(1, int(_interval))):
+            return None
+    except redis.RedisError as e:
+        _mark_redis_down(e)
+        return None
+    with _lock:
+        _running.pop(district, None)
+    return "locked"
+
+
+def _release(district: str, run_id: str):
+    with _lock:
+        if _running.get(district) == run_id:
+            del _running[district]
+    r = _redis()
+    if r is None:
+        return
+    try:
+        _release_script(keys=[_lock_key(district)], args=[run_id])
+    except redis.RedisError as e:
+        _mark_redis_down(e)
+
+
+# -------------------- RUNS --------------------
+
+def _run_districts(districts: List[str], due_at: float, trigger: str) -> Dict:
+    from app.vajra_sos import monitor_weather_and_send_alerts
+
+    run_id = uuid.uuid4().hex
+    started = time.time()
+    record = {"run_id": run_id, "trigger": trigger, "started_at": started,
+              "lag_seconds": round(max(0.0, started - due_at), 2),
+              "districts": [], "skipped": {}, "duration_seconds": None, "alerts_queued": 0, "error": None}
+
+    for district in districts:
+        reason = _acquire(district, run_id)
+        if reason is None:
+            record["districts"].append(district)
+        else:
+            record["skipped"][district] = reason
+    try:
+        if record["districts"]:
+            summary = monitor_weather_and_send_alerts(record["districts"])
+            record["alerts_queued"] = summary.get("alerts_queued", 0)
+    except Exception as e:
+        record["error"] = str(e)
+        print(f"🔥 VajraSOS run failed for {record['districts']}: {e}")
+    finally:
+        for district in record["districts"]:
+            _release(district, run_id)
+        record["duration_seconds"] = round(time.time() - started, 2)
+
+    with _lock:
+        _stats["runs"] += 1
+        _stats["manual_runs"] += trigger == "manual"
+        _stats["districts_checked"] += len(record["districts"])
+        _stats["skipped_running"] += sum(1 for r in record["skipped"].values() if r == "running")
+        _stats["skipped_locked"] += sum(1 for r in record["skipped"].values() if r == "locked")
+        _stats["failed_runs"] += record["error"] is not None
+        _runs.append(record)
+    return record
+
+
+async def _launch(districts: List[str], due_at: float, trigger: str) -> Dict:
+    async with _semaphore:
+        return await asyncio.to_thread(_run_districts, districts, due_at, trigger)
+
+
+def _roster_districts() -> List[str]:
+    from app.vajra_sos import _roster
+
+    return list(_roster.groups())
+
+
+async def _scheduler_loop():
+    print(f"🌾 VajraSOS scheduler: districts staggered across {_interval}s, up to {VAJRA_JITTER_SECONDS:.0f}s jitter")
+    while True:
+        try:
+            districts = await asyncio.to_thread(_roster_districts)
+        except Exception as e:
+            print(f"🔥 VajraSOS scheduler could not read the roster: {e}")
+            districts = list(_next_due)
+
+        now = time.time()
+        for district in districts:
+            if district not in _next_due:
+                _next_due[district] = _due(_first_slot(district, now))
+        for district in set(_next_due) - set(districts):
+            del _next_due[district]
+
+        due = [d for d, (_, at) in _next_due.items() if at <= now + VAJRA_SCHEDULER_TICK]
+        if due:
+            due_at = min(_next_due[d][1] for d in due)
+            for district in due:
+                _next_due[district] = _due(_next_due[district][0] + _interval)
+            # Not awaited: a slow run must not hold back the next slots
+            run = asyncio.create_task(_launch(due, due_at, "scheduled"))
+            _inflight.add(run)
+            run.add_done_callback(_inflight.discard)
+
+        upcoming = min((at for _, at in _next_due.values()), default=now + 60)
+        await asyncio.sleep(min(60.0, max(VAJRA_SCHEDULER_TICK, upcoming - time.time())))
+
+
+def start(interval_seconds: int = None) -> asyncio.Task:
+    """Start the scheduler on the running event loop (idempotent)"""
+    global _task, _semaphore, _interval
+    if _task is not None and not _task.done():
+        return _task
+    _interval = interval_seconds or VAJRA_INTERVAL_SECONDS
+    _semaphore = asyncio.Semaphore(VAJRA_RUN_CONCURRENCY)
+    _task = asyncio.get_running_loop().create_task(_scheduler_loop())
+    return _task
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+async def trigger(districts: Optional[List[str]] = None) -> Dict:
+    """Check `districts` (any spelling; default: every roster district) right now"""
+    global _semaphore
+    from app.farmer_roster import district_key
+
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(VAJRA_RUN_CONCURRENCY)
+    if districts is None:
+        keys = await asyncio.to_thread(_roster_districts)
+    else:
+        keys = list(dict.fromkeys(district_key(d) for d in districts))
+    return await _launch(keys, time.time(), "manual")
+
+
+def run_worker(interval_seconds: int = None):
+    """Standalone worker: outbox delivery plus the scheduler, with one immediate full run"""
+    from app import alert_outbox
+
+    async def main():
+        await trigger()
+        start(interval_seconds)
+        await _task
+
+    alert_outbox.start_delivery_workers()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n🛑 VajraSOS service stopped by user")
+
+
+# -------------------- METRICS --------------------
+
+def scheduler_stats() -> Dict:
+    with _lock:
+        runs = list(_runs)
+        stats = dict(_stats)
+        running = sorted(_running)
+
+    def dist(values):
+        values = sorted(values)
+        if not values:
+            return {"p50": None, "p95": None, "max": None}
+        return {"p50": values[len(values) // 2], "p95": values[int(0.95 * (len(values) - 1))], "max": values[-1]}
+
+    upcoming = sorted(at for _, at in _next_due.values())
+    return {
+        **stats,
+        "active": _task is not None and not _task.done(),
+        "interval_seconds": _interval,
+        "districts_scheduled": len(_next_due),
+        "next_run_in_seconds": round(upcoming[0] - time.time(), 1) if upcoming else None,
+        "running": running,
+        "lag_seconds": dist([r["lag_seconds"] for r in runs if r["trigger"] == "scheduled"]),
+        "duration_seconds": dist([r["duration_seconds"] for r in runs]),
+        "recent_runs": [
+            {k: r[k] for k in ("trigger", "started_at", "lag_seconds", "duration_seconds",
+                               "districts", "skipped", "alerts_queued", "error")}
+            for r in runs[-10:]
+        ],
+        "lock_backend": "local" if time.time() < _redis_down_until else "redis",
+    }
+
+
+if __name__ == "__main__":
+    run_worker()
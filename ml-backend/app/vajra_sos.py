@@ -10,19 +10,23 @@ Features:
 import os
 import firebase_admin
 from firebase_admin import credentials, firestore
-import schedule
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, List, Dict
 from dotenv import load_dotenv
-from app.alert_email_service import send_email_alert
+from app import alert_outbox, alert_rules, alert_suppression, geocoder, http_client, quota, weather_archive
+from app.farmer_roster import FarmerRoster
+from app.firestore_writer import BatchWriter
 import hashlib
 
 load_dotenv()
 
 # Configuration
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+MONITOR_CONCURRENCY = int(os.getenv("VAJRA_MONITOR_CONCURRENCY", 8))
+# Forecast hours the alert rules look ahead (OpenWeather provides up to 120)
+ALERT_HORIZON_HOURS = int(os.getenv("VAJRA_ALERT_HORIZON_HOURS", 24))
 # OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
 # Firebase initialization flag
@@ -61,36 +65,18 @@ def get_firestore_client():
         return None
 
 
+# Alert history is written in Firestore batches rather than one round trip per alert
+_alert_log = BatchWriter(get_firestore_client, name="alert_log")
+
+
+# Alert-enabled farmers, kept current by a Firestore listener instead of a scan per run
+_roster = FarmerRoster(get_firestore_client)
+
+
 def get_farmers_from_firestore() -> List[Dict]:
-    """Fetch all farmers with alerts enabled from Firestore"""
+    """All farmers with alerts enabled (served from the in-memory roster)"""
     try:
-        db = get_firestore_client()
-        if not db:
-            return []
-        
-        farmers = []
-        # Query users collection for farmers who have opted in for alerts
-        users_ref = db.collection("users").where("allowAlerts", "==", True).stream()
-        
-        for doc in users_ref:
-            user_data = doc.to_dict()
-            # Prefer email for alerts; fall back to phone only if email missing
-            if "district" in user_data:
-                email = user_data.get("email") or user_data.get("emailAddress")
-                phone = user_data.get("phone")
-                if not email and not phone:
-                    # skip users without any contact
-                    continue
-
-                farmers.append({
-                    "uid": doc.id,
-                    "name": f"{user_data.get('firstName', '')} {user_data.get('lastName', '')}".strip() or "Farmer",
-                    "email": email,
-                    "phone": phone,
-                    "district": user_data.get("district"),
-                    "language": user_data.get("language", "en"),
-                })
-        
+        farmers = _roster.farmers()
         print(f"📋 Found {len(farmers)} farmers with alerts enabled")
         return farmers
     except Exception as e:
@@ -99,205 +85,65 @@ def get_farmers_from_firestore() -> List[Dict]:
 
 
 def get_district_coordinates(district: str) -> Optional[tuple]:
-    """Get latitude/longitude for a district using geocoding"""
-    try:
-        # Use OpenWeatherMap's geocoding API
-        url = f"http://api.openweathermap.org/geo/1.0/direct?q={district},Karnataka,IN&limit=1&appid={OPENWEATHER_API_KEY}"
-        response = requests.get(url, timeout=10)
-        
-        if response.ok:
-            data = response.json()
-            if data:
-                return (data[0]["lat"], data[0]["lon"])
-        
-        # Fallback: Karnataka district coordinates
-        KARNATAKA_DISTRICTS = {
-            "bangalore": (12.9716, 77.5946),
-            "bengaluru": (12.9716, 77.5946),
-            "mysore": (12.2958, 76.6394),
-            "mysuru": (12.2958, 76.6394),
-            "mangalore": (12.9141, 74.8560),
-            "mangaluru": (12.9141, 74.8560),
-            "hubli": (15.3647, 75.1240),
-            "dharwad": (15.4589, 75.0078),
-            "belgaum": (15.8497, 74.4977),
-            "belagavi": (15.8497, 74.4977),
-            "shimoga": (13.9299, 75.5681),
-            "shivamogga": (13.9299, 75.5681),
-            "tumkur": (13.3379, 77.1173),
-            "tumakuru": (13.3379, 77.1173),
-            "davangere": (14.4644, 75.9218),
-            "hassan": (13.0072, 76.0962),
-            "mandya": (12.5218, 76.8951),
-            "kodagu": (12.3375, 75.8069),
-            "coorg": (12.3375, 75.8069),
-            "chitradurga": (14.2251, 76.3980),
-            "kolar": (13.1362, 78.1292),
-            "chikmagalur": (13.3161, 75.7720),
-            "chikkamagaluru": (13.3161, 75.7720),
-            "udupi": (13.3409, 74.7421),
-            "raichur": (16.2120, 77.3439),
-            "bellary": (15.1394, 76.9214),
-            "ballari": (15.1394, 76.9214),
-            "bijapur": (16.8302, 75.7100),
-            "vijayapura": (16.8302, 75.7100),
-            "gulbarga": (17.3297, 76.8343),
-            "kalaburagi": (17.3297, 76.8343),
-            "bidar": (17.9104, 77.5199),
-            "gadag": (15.4166, 75.6303),
-            "haveri": (14.7951, 75.3991),
-            "dakshina kannada": (12.9141, 74.8560),
-            "uttara kannada": (14.5000, 74.5000),
-            "koppal": (15.3500, 76.1500),
-            "ramanagara": (12.7226, 77.2810),
-            "yadgir": (16.7704, 77.1380),
-            "chamarajanagar": (11.9261, 76.9437),
-        }
-        
-        district_lower = district.lower().strip()
-        return KARNATAKA_DISTRICTS.get(district_lower)
-    except Exception as e:
-        print(f"🔥 Geocoding error for {district}: {e}")
-        return None
+    """Get latitude/longitude for a district via the shared geocoder"""
+    return geocoder.resolve(district)
 
 
-def get_weather_data(latitude: float, longitude: float) -> Optional[Dict]:
-    """Fetch current weather data from OpenWeatherMap API"""
+def _fetch_openweather(endpoint: str, latitude: float, longitude: float, priority: str, caller: str) -> Optional[Dict]:
+    quota.acquire("openweather", priority, caller)
+    url = f"https://api.openweathermap.org/data/2.5/{endpoint}?lat={latitude}&lon={longitude}&appid={OPENWEATHER_API_KEY}&units=metric"
+    response = http_client.get(url, timeout=10,
+                               on_retry=lambda: quota.acquire("openweather", priority, caller))
+    if response.ok:
+        return response.json()
+    return None
+
+
+def get_weather_data(latitude: float, longitude: float, district: Optional[str] = None,
+                     priority: str = "alerts", caller: str = "vajra_monitor") -> Optional[Dict]:
+    """Fetch current weather data from OpenWeatherMap API (archive fallback when a district is given)"""
     try:
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={latitude}&lon={longitude}&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = requests.get(url, timeout=10)
-        if response.ok:
-            return response.json()
-        return None
+        data = _fetch_openweather("weather", latitude, longitude, priority, caller)
     except Exception as e:
         print(f"🔥 Weather API error: {e}")
-        return None
+        data = None
+
+    if district:
+        if data:
+            weather_archive.record("current", district, data)
+        else:
+            data = weather_archive.fallback_current(district)
+    return data
 
 
-def get_forecast_data(latitude: float, longitude: float) -> Optional[List[Dict]]:
-    """Fetch 3-hourly forecast (next 5 days) and trim to next 24h for alert logic"""
+def get_forecast_data(latitude: float, longitude: float, district: Optional[str] = None,
+                      priority: str = "alerts", caller: str = "vajra_monitor") -> Optional[List[Dict]]:
+    """Fetch 3-hourly forecast (next 5 days) and trim to ALERT_HORIZON_HOURS for alert logic"""
     try:
-        url = f"https://api.openweathermap.org/data/2.5/forecast?lat={latitude}&lon={longitude}&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = requests.get(url, timeout=10)
-        if not response.ok:
-            return None
-
-        data = response.json()
-        now = datetime.utcnow().timestamp()
-        next_24h = []
-        for item in data.get("list", []):
-            ts = item.get("dt")
-            if ts and 0 <= ts - now <= 24 * 3600:
-                next_24h.append(item)
-        return next_24h or None
+        data = _fetch_openweather("forecast", latitude, longitude, priority, caller)
     except Exception as e:
         print(f"🔥 Forecast API error: {e}")
-        return None
+        data = None
+
+    if district:
+        if data:
+            weather_archive.record("forecast", district, data)
+        else:
+            data = weather_archive.fallback_forecast(district)
+    return alert_rules.forecast_window(data, ALERT_HORIZON_HOURS)
 
 
-def check_weather_alerts(current_weather: Dict, forecast_24h: Optional[List[Dict]]) -> Optional[str]:
-    """Analyze current + next-24h forecast and generate concise, actionable alerts"""
+def forecast_next_24h(forecast: Optional[Dict]) -> Optional[List[Dict]]:
+    """Trim a raw OpenWeather forecast payload to the 3-hourly slots in the next 24h"""
+    return alert_rules.forecast_window(forecast, 24)
+
+
+def check_weather_alerts(current_weather: Dict, forecast_24h: Optional[List[Dict]],
+                         horizon_hours: int = 24) -> Optional[str]:
+    """Analyze current + forecast and generate concise, actionable alerts (see app/alert_rules.py)"""
     if not current_weather:
         return None
-
-    alerts = []
-    # Current snapshot
-    main = current_weather.get("main", {})
-    weather = current_weather.get("weather", [{}])[0]
-    wind = current_weather.get("wind", {})
-
-    temp = main.get("temp", 0)
-    humidity = main.get("humidity", 0)
-    wind_speed = wind.get("speed", 0)
-    weather_desc = (weather.get("description", "") or "").lower()
-
-    # Forecast stats (next 24h)
-    temps = [temp]
-    humidities = [humidity]
-    rain_slots = []
-    wind_slots = []
-    if forecast_24h:
-        for item in forecast_24h:
-            main_f = item.get("main", {})
-            temps.append(main_f.get("temp", temp))
-            humidities.append(main_f.get("humidity", humidity))
-            rain_val = (item.get("rain", {}) or {}).get("3h") or 0
-            wind_val = (item.get("wind", {}) or {}).get("speed") or 0
-            ts = item.get("dt_txt") or item.get("dt")
-            if rain_val > 0:
-                rain_slots.append((rain_val, ts))
-            if wind_val >= 9:
-                wind_slots.append((wind_val, ts))
-
-    max_temp = max(temps)
-    min_temp = min(temps)
-    max_humidity = max(humidities)
-    high_humidity_hours = sum(1 for h in humidities if h >= 80)
-    total_rain = sum(r[0] for r in rain_slots)
-    heavy_rain_slots = [r for r in rain_slots if r[0] >= 10]
-
-    def fmt_time(ts) -> str:
-        try:
-            if isinstance(ts, (int, float)):
-                dt = datetime.utcfromtimestamp(ts)
-            else:
-                dt = datetime.strptime(str(ts), "%Y-%m-%d %H:%M:%S")
-            return dt.strftime("%d %b, %I %p").lstrip("0").replace(" 0", " ")
-        except Exception:
-            return "soon"
-
-    # Temperature alerts
-    if max_temp >= 38:
-        alerts.append(f"🔥 Heatwave risk {max_temp:.0f}°C. Avoid 11-4, increase irrigation, shade tender crops.")
-    elif max_temp >= 34:
-        alerts.append(f"☀️ Hot day {max_temp:.0f}°C. Irrigate early morning/evening to reduce stress.")
-    if min_temp <= 12:
-        alerts.append(f"❄️ Cold night {min_temp:.0f}°C. Protect seedlings; avoid late-evening irrigation.")
-    if max_temp - min_temp >= 12:
-        alerts.append(f"📊 Large temp swing ({min_temp:.0f}–{max_temp:.0f}°C). Maintain soil moisture to buffer stress.")
-
-    # Rain alerts
-    if total_rain >= 20:
-        alerts.append(f"🌧️ Heavy rain ~{total_rain:.1f}mm next 24h. Ensure drainage; postpone spraying/fertilizer.")
-    elif total_rain >= 5:
-        alerts.append(f"🌦️ Moderate rain ~{total_rain:.1f}mm. Good soil moisture; plan field work before showers.")
-    elif total_rain > 0:
-        alerts.append(f"💧 Light rain ~{total_rain:.1f}mm. Minor benefit; plan spray 4-6h before rain.")
-
-    if heavy_rain_slots:
-        times = ", ".join(fmt_time(ts) for _, ts in heavy_rain_slots[:2])
-        alerts.append(f"⏰ Heavy bursts expected around {times}. Secure inputs, cover harvested produce.")
-    if rain_slots:
-        times = ", ".join(fmt_time(ts) for _, ts in rain_slots[:2])
-        alerts.append(f"⏰ Rain likely around {times}. Schedule spraying/harvest before then.")
-    elif max_humidity >= 80 and high_humidity_hours >= 3:
-        alerts.append(f"💨 Prolonged humidity ({high_humidity_hours}h >80%). Improve airflow; monitor fungal spots.")
-
-    # Wind alerts
-    if wind_speed >= 12 or any(w[0] >= 12 for w in wind_slots):
-        alerts.append("💨 Strong winds. Avoid spraying; secure lightweight structures and support tall plants.")
-    elif wind_speed >= 8 or any(w[0] >= 9 for w in wind_slots):
-        alerts.append("🍃 Moderate winds. Check wind direction before spraying; stake tall crops if needed.")
-
-    # Fog/mist
-    if "fog" in weather_desc or "mist" in weather_desc:
-        alerts.append("🌫️ Low visibility due to fog. Be cautious during transport/field work.")
-
-    # Fallback: pleasant conditions
-    if not alerts:
-        alerts.append("✅ Conditions favorable. Good window for sowing/field operations.")
-
-    # Keep SMS concise
-    return " | ".join(alerts[:3]) if alerts else None
-
-
-def _infer_severity(alert_text: str) -> str:
-    t = (alert_text or "").lower()
-    if any(k in t for k in ["heatwave", "heavy rain", "heavy bursts", "strong winds", "frost", "cold night"]):
-        return "high"
-    if any(k in t for k in ["moderate rain", "hot day", "large temp swing", "high disease risk", "moderate winds", "fog"]):
-        return "medium"
-    return "low"
+    return alert_rules.alert_text(alert_rules.evaluate_one(current_weather, forecast_24h, horizon_hours))
 
 
 def _stable_id(district: str, alert_text: str) -> str:
@@ -305,6 +151,16 @@ def _stable_id(district: str, alert_text: str) -> str:
     return hashlib.sha1(raw).hexdigest()[:16]
 
 
+def _unsuppressed_alerts(district: str, farmers: List[Dict], alerts: List[Dict]) -> Dict[str, List[Dict]]:
+    """{uid: alerts still to send}; a hazard already sent at the same or higher severity is dropped"""
+    entries = [
+        (farmer["uid"], district, alert["hazard"], alert["severity"])
+        for farmer in farmers for alert in alerts
+    ]
+    allowed = iter(alert_suppression.filter_new(entries))
+    return {farmer["uid"]: [alert for alert in alerts if next(allowed)] for farmer in farmers}
+
+
 def get_inapp_alerts_for_district(district: str) -> Dict:
     """Generate VajraSOS weather alerts for in-app notifications (no SMS).
 
@@ -323,8 +179,14 @@ def get_inapp_alerts_for_district(district: str) -> Dict:
             "error": f"Could not resolve coordinates for {district_name}",
         }
 
-    weather_data = get_weather_data(coords[0], coords[1])
-    forecast_data = get_forecast_data(coords[0], coords[1])
+    weather_data = get_weather_data(coords[0], coords[1], district_name, priority="interactive", caller="vajra_inapp")
+    forecast_data = get_forecast_data(coords[0], coords[1], district_name, priority="interactive", caller="vajra_inapp")
+    return build_inapp_alerts(district_name, weather_data, forecast_data, ALERT_HORIZON_HOURS)
+
+
+def build_inapp_alerts(district_name: str, weather_data: Optional[Dict],
+                       forecast_data: Optional[List[Dict]], horizon_hours: int = 24) -> Dict:
+    """In-app alert payload from already fetched current weather and forecast"""
     if not weather_data:
         return {
             "district": district_name,
@@ -333,9 +195,7 @@ def get_inapp_alerts_for_district(district: str) -> Dict:
             "error": "Could not fetch weather data",
         }
 
-    alert_text = check_weather_alerts(weather_data, forecast_data)
-    if not alert_text:
-        return {"district": district_name, "generatedAt": datetime.utcnow().isoformat(), "alerts": []}
+    rule_alerts = alert_rules.evaluate_one(weather_data, forecast_data, horizon_hours)
 
     # current condition summary to include in the payload
     main_now = weather_data.get("main", {})
@@ -343,22 +203,22 @@ def get_inapp_alerts_for_district(district: str) -> Dict:
     condition_text = (weather_now.get("description") or "").capitalize()
     temp_now = main_now.get("temp")
 
-    parts = [p.strip() for p in alert_text.split("|") if p.strip()]
     now_iso = datetime.utcnow().isoformat()
     alerts = []
-    for part in parts:
+    for alert in rule_alerts:
         alerts.append(
             {
-                "id": _stable_id(district_name, part),
+                "id": _stable_id(district_name, alert["message"]),
                 "title": f"VajraSOS • {district_name}",
-                "message": part,
+                "message": alert["message"],
                 "currentCondition": {
                     "description": condition_text,
                     "temp_c": temp_now,
                 },
                 "type": "weather",
                 "icon": "Cloud",
-                "severity": _infer_severity(part),
+                "severity": alert["severity"],
+                "rule": alert["rule"],
                 "time": now_iso,
             }
         )
@@ -371,29 +231,9 @@ def get_inapp_alerts_for_district(district: str) -> Dict:
     }
 
 
-
-
-
-def send_email_notification(to_email: str, subject: str, message: str) -> bool:
-    """Send notification email using alert_email_service (synchronous)."""
-    try:
-        ok = send_email_alert(to_email, subject, message)
-        if ok:
-            print(f"📩 Email sent to {to_email}")
-        else:
-            print(f"⚠️ Email send failed for {to_email}")
-        return bool(ok)
-    except Exception as e:
-        print(f"🔥 Error sending email to {to_email}: {e}")
-        return False
-
-
 def log_alert_to_firestore(farmer_uid: str, alert_message: str, email_sent: bool, condition: Optional[Dict] = None):
-    """Log alert to Firestore for history tracking"""
+    """Queue an alert log record; the batch writer commits it to Firestore in the background"""
     try:
-        db = get_firestore_client()
-        if not db:
-            return
         payload = {
             "userId": farmer_uid,
             "message": alert_message,
@@ -404,104 +244,164 @@ def log_alert_to_firestore(farmer_uid: str, alert_message: str, email_sent: bool
         if condition:
             payload["condition"] = condition
 
-        db.collection("alerts").add(payload)
+        _alert_log.add("alerts", payload)
     except Exception as e:
         print(f"🔥 Error logging alert: {e}")
 
 
-def monitor_weather_and_send_alerts():
-    """Main function to monitor weather for all farmers and send alerts"""
+def _check_district(district: str) -> Dict:
+    """Fetch current weather + forecast once for a district; alerts are evaluated for all districts together"""
+    result = {"district": district, "weather": None, "forecast": None, "alerts": [], "alert": None,
+              "openweather_calls": 0, "error": None}
+    try:
+        coords = get_district_coordinates(district)
+        if not coords:
+            result["error"] = f"Could not get coordinates for {district}"
+            return result
+
+        weather_data = get_weather_data(coords[0], coords[1], district)
+        forecast_data = get_forecast_data(coords[0], coords[1], district)
+        result["openweather_calls"] = 2
+        if not weather_data:
+            result["error"] = "Could not fetch weather data"
+            return result
+
+        result["weather"] = weather_data
+        result["forecast"] = forecast_data
+    except Exception as e:
+        # One district's failure (geocoder cache, archive files, ...) must not abort the run
+        result["error"] = f"Check failed: {e}"
+    return result
+
+
+def _alert_email(farmer: Dict, alert: str, weather_data: Dict) -> Dict:
+    """Subject/body for one farmer plus the condition logged with the alert"""
+    subject = f"KrishiNexa Alert for {farmer.get('district')}"
+    # Prepend a short current-condition summary to the email body
+    main_now = weather_data.get("main", {})
+    weather_now = (weather_data.get("weather", [{}])[0] or {})
+    condition_text = (weather_now.get("description") or "").capitalize()
+    temp_now = main_now.get("temp")
+    condition_summary = f"Current: {condition_text}"
+    if temp_now is not None:
+        condition_summary += f" · {temp_now:.1f}°C"
+
+    return {
+        "farmer": farmer,
+        "alert": alert,
+        "subject": subject,
+        "body": f"{condition_summary}\n\n{alert}",
+        "condition": {"description": condition_text, "temp_c": temp_now},
+    }
+
+
+def monitor_weather_and_send_alerts(districts: Optional[List[str]] = None):
+    """Main function to monitor weather for all farmers and send alerts
+
+    Farmers are grouped by normalized district so each district's weather is
+    fetched and checked once (MONITOR_CONCURRENCY districts at a time) and the
+    result is fanned out to its farmers. `districts` (roster keys) limits the
+    run to those districts; app/vajra_scheduler.py uses it to stagger runs.
+    """
+    started = time.monotonic()
     print("\n" + "="*50)
     print(f"🔄 VajraSOS Weather Check - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*50)
     
-    farmers = get_farmers_from_firestore()
+    # Roster is already grouped by normalized district; no Firestore scan here
+    try:
+        groups = _roster.groups()
+    except Exception as e:
+        print(f"🔥 Error fetching farmers: {e}")
+        groups = {}
+    if districts is not None:
+        groups = {key: groups[key] for key in districts if key in groups}
+    farmers_count = sum(len(f) for f in groups.values())
     
-    if not farmers:
+    if not farmers_count:
         print("⚠️ No farmers found with alerts enabled")
-        return {"checked": 0, "alerts_sent": 0}
-    
-    alerts_sent = 0
-    
-    for farmer in farmers:
-        try:
-            print(f"\n👨‍🌾 Checking: {farmer['name']} ({farmer['district']})")
-            
-            # Get coordinates for district
-            coords = get_district_coordinates(farmer['district'])
-            if not coords:
-                print(f"  ⚠️ Could not get coordinates for {farmer['district']}")
-                continue
-            
-            # Get weather data (current + forecast)
-            weather_data = get_weather_data(coords[0], coords[1])
-            forecast_data = get_forecast_data(coords[0], coords[1])
-            if not weather_data:
-                print(f"  ⚠️ Could not fetch weather data")
+        return {"checked": 0, "alerts_queued": 0, "districts": 0, "upstream_calls": {"openweather": 0},
+                "duration_seconds": round(time.monotonic() - started, 2)}
+
+    # Fetch with the first farmer's spelling; archive/geocoder keys normalise it anyway
+    with ThreadPoolExecutor(max_workers=MONITOR_CONCURRENCY) as pool:
+        checks = dict(zip(groups, pool.map(
+            lambda key: _check_district(groups[key][0]['district']), groups
+        )))
+
+    # One vectorised rule evaluation over every district that has weather
+    fetched = [key for key in groups if not checks[key]["error"]]
+    batch = alert_rules.normalize(
+        [(checks[key]["weather"], checks[key]["forecast"]) for key in fetched], ALERT_HORIZON_HOURS
+    )
+    for key, alerts in zip(fetched, alert_rules.evaluate(batch)):
+        checks[key]["alerts"] = alerts
+        checks[key]["alert"] = alert_rules.alert_text(alerts)
+
+    alerts_queued = 0
+    alerts_suppressed = 0
+    failed_districts = []
+    for key, district_farmers in groups.items():
+        check = checks[key]
+        print(f"\n📍 {key}: {len(district_farmers)} farmer(s)")
+        if check["error"]:
+            print(f"  ⚠️ {check['error']}")
+            failed_districts.append(key)
+            continue
+        if not check["alert"]:
+            print(f"  ✅ Weather normal - no alerts needed")
+            continue
+
+        print(f"  ⚠️ ALERT: {check['alert'][:100]}...")
+        recipients = [farmer for farmer in district_farmers if farmer.get('email')]
+        for farmer in district_farmers:
+            if not farmer.get('email'):
+                print(f"  ⚠️ Skipping {farmer['uid']}: no email")
+        pending = _unsuppressed_alerts(key, recipients, check["alerts"])
+        for farmer in recipients:
+            alerts = pending[farmer["uid"]]
+            if not alerts:
+                alerts_suppressed += 1
                 continue
-            
-            # Check for alerts
-            alert = check_weather_alerts(weather_data, forecast_data)
-            
-            if alert:
-                print(f"  ⚠️ ALERT: {alert[:100]}...")
-                # Send email (email-only flow)
-                email = farmer.get('email')
-                if not email:
-                    print(f"  ⚠️ Skipping {farmer['uid']}: no email")
-                else:
-                    subject = f"KrishiNexa Alert for {farmer.get('district')}"
-                    # Prepend a short current-condition summary to the email body
-                    main_now = weather_data.get("main", {})
-                    weather_now = (weather_data.get("weather", [{}])[0] or {})
-                    condition_text = (weather_now.get("description") or "").capitalize()
-                    temp_now = main_now.get("temp")
-                    condition_summary = f"Current: {condition_text}"
-                    if temp_now is not None:
-                        condition_summary += f" · {temp_now:.1f}°C"
-
-                    email_body = f"{condition_summary}\n\n{alert}"
-                    email_sent = send_email_notification(email, subject, email_body)
-                    log_alert_to_firestore(
-                        farmer['uid'], alert, email_sent, condition={"description": condition_text, "temp_c": temp_now}
-                    )
-                    if email_sent:
-                        alerts_sent += 1
-            else:
-                print(f"  ✅ Weather normal - no alerts needed")
-                
-        except Exception as e:
-            print(f"  🔥 Error processing farmer {farmer['name']}: {e}")
-    
-    print(f"\n📊 Summary: Checked {len(farmers)} farmers, sent {alerts_sent} alerts")
-    return {"checked": len(farmers), "alerts_sent": alerts_sent}
+            # Email-only flow: the outbox workers send, retry and log each alert; a
+            # dead-lettered message releases its suppression entries again
+            email = _alert_email(farmer, alert_rules.alert_text(alerts), check["weather"])
+            suppression = [(farmer["uid"], key, alert["hazard"], alert["severity"]) for alert in alerts]
+            alert_outbox.enqueue(farmer, email["alert"], email["subject"], email["body"], email["condition"],
+                                 suppression=suppression)
+            alerts_queued += 1
+
+    summary = {
+        "checked": farmers_count,
+        "roster": {k: _roster.stats()[k] for k in ("documents_read", "changes_applied", "listening")},
+        "alerts_queued": alerts_queued,
+        "alerts_suppressed": alerts_suppressed,
+        "districts": len(groups),
+        "districts_failed": failed_districts,
+        "upstream_calls": {"openweather": sum(c["openweather_calls"] for c in checks.values())},
+        "duration_seconds": round(time.monotonic() - started, 2),
+    }
+    print(
+        f"\n📊 Summary: Checked {farmers_count} farmers in {len(groups)} districts, queued {alerts_queued} alerts "
+        f"({alerts_suppressed} suppressed as repeats), "
+        f"{summary['upstream_calls']['openweather']} OpenWeather calls in {summary['duration_seconds']}s"
+    )
+    return summary
 
 
 def start_vajra_sos_service(interval_hours: int = 1):
-    """Start the VajraSOS background service"""
-    print("🌾 VajraSOS Service Starting...")
-    print(f"📅 Will check weather every {interval_hours} hour(s)")
-    
-    # Run immediately
-    monitor_weather_and_send_alerts()
-    
-    # Schedule periodic runs
-    schedule.every(interval_hours).hours.do(monitor_weather_and_send_alerts)
-    
-    print("\n🌾 VajraSOS is running. Press Ctrl+C to stop.\n")
-    
-    try:
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
-    except KeyboardInterrupt:
-        print("\n🛑 VajraSOS service stopped by user")
+    """Start the VajraSOS background service (standalone worker, see app/vajra_scheduler.py)"""
+    from app import vajra_scheduler
+
+    vajra_scheduler.run_worker(interval_hours * 3600)
 
 
 # FastAPI endpoint integration
 async def trigger_weather_alerts():
     """Trigger weather alert check (for API endpoint)"""
-    return monitor_weather_and_send_alerts()
+    from app import vajra_scheduler
+
+    return await vajra_scheduler.trigger()
 
 
 if __name__ == "__main__":
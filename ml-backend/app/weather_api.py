@@ -1,106 +1,95 @@
 from fastapi import APIRouter, HTTPException
+from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import asyncio
 import requests
 import os
+from app import ee_executor, geocoder, http_client, quota, raster_store, weather_archive
+from app.concurrency import SingleFlight, TTLCache
 from app.district_centroids import DISTRICT_COORDS
+from app.ee_session import ee, ee_ready
 
 router = APIRouter(prefix="/api/weather", tags=["Weather"])
 
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-LOCATIONIQ_API_KEY = os.getenv("LOCATIONIQ_API_KEY")
+OPENWEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"
+BULK_CONCURRENCY = int(os.getenv("WEATHER_BULK_CONCURRENCY", 8))
+# One bulk payload costs ~2 OpenWeather calls per district; share it for this long
+BULK_CACHE_TTL = int(os.getenv("WEATHER_BULK_CACHE_TTL", 300))
+
+POINT_GEOHASH_PRECISION = int(os.getenv("WEATHER_POINT_GEOHASH_PRECISION", 5))  # ~4.9 km cells
+POINT_CACHE_TTL = int(os.getenv("WEATHER_POINT_CACHE_TTL", 600))
+POINT_CACHE_SIZE = int(os.getenv("WEATHER_POINT_CACHE_SIZE", 20000))
+
+MODIS_LST_COLLECTION = "MODIS/061/MOD11A2"
+SMAP_COLLECTION = "NASA/SMAP/SPL4SMGP/008"
 
 if not OPENWEATHER_API_KEY:
     raise RuntimeError("OPENWEATHER_API_KEY not set")
 
 
 def geocode_place(district: str):
-    key = district.lower().strip()
+    return geocoder.resolve(district)
 
-    # Guaranteed fallback using known district centroids
-    if key in DISTRICT_COORDS:
-        return DISTRICT_COORDS[key]
 
-    if not LOCATIONIQ_API_KEY:
-        return None
+ARCHIVE_KINDS = {"weather": "current", "forecast": "forecast"}
 
-    queries = [
-        f"{district}, Karnataka, India",
-        f"{district} District, Karnataka, India",
-        f"{district}, India",
-    ]
 
-    for q in queries:
-        try:
-            r = requests.get(
-                "https://us1.locationiq.com/v1/search.php",
-                params={
-                    "key": LOCATIONIQ_API_KEY,
-                    "q": q,
-                    "format": "json",
-                    "limit": 1,
-                },
-                timeout=5,
-            )
-            if r.status_code == 200 and r.json():
-                loc = r.json()[0]
-                return float(loc["lat"]), float(loc["lon"])
-        except Exception:
-            continue
-
-    return None
+def fetch_openweather(endpoint: str, lat: float, lon: float, district: str = None,
+                      priority: str = "interactive", caller: str = "weather_api"):
+    """Fetch `weather` or `forecast` JSON for a point; None when unavailable
 
+    With a `district`, fresh payloads are archived and the archive answers
+    when OpenWeather is unreachable or our quota is spent.
+    """
+    payload = _fetch_openweather(endpoint, lat, lon, priority, caller)
+    if district:
+        kind = ARCHIVE_KINDS[endpoint]
+        if payload is not None:
+            weather_archive.record(kind, district, payload)
+        elif kind == "current":
+            payload = weather_archive.fallback_current(district)
+        else:
+            payload = weather_archive.fallback_forecast(district)
+    return payload
 
-@router.get("/{district}")
-def get_weather_forecast(district: str):
-    coords = geocode_place(district)
-    if not coords:
-        raise HTTPException(status_code=404, detail="Location not found")
-    lat, lon = coords
 
-    # --- Import and call soil_health for this district ---
+def _fetch_openweather(endpoint: str, lat: float, lon: float, priority: str, caller: str):
     try:
-        from app.soil_health import soil_health as get_soil_health
-        soil_health_data = get_soil_health(district)
-    except Exception as e:
-        soil_health_data = None
-
-    # -------- CURRENT WEATHER --------
-    current_res = requests.get(
-        "https://api.openweathermap.org/data/2.5/weather",
-        params={
-            "lat": lat,
-            "lon": lon,
-            "units": "metric",
-            "appid": OPENWEATHER_API_KEY,
-        },
-        timeout=8,
-    )
-
-    if current_res.status_code != 200:
-        raise HTTPException(status_code=503, detail="Weather service unavailable")
-
-    current = current_res.json()
+        quota.acquire("openweather", priority, caller)
+        res = http_client.get(
+            f"{OPENWEATHER_BASE_URL}/{endpoint}",
+            params={
+                "lat": lat,
+                "lon": lon,
+                "units": "metric",
+                "appid": OPENWEATHER_API_KEY,
+            },
+            timeout=8,
+            on_retry=lambda: quota.acquire("openweather", priority, caller),
+        )
+    except requests.RequestException:
+        return None
 
-    # -------- FORECAST --------
-    forecast_res = requests.get(
-        "https://api.openweathermap.org/data/2.5/forecast",
-        params={
-            "lat": lat,
-            "lon": lon,
-            "units": "metric",
-            "appid": OPENWEATHER_API_KEY,
-        },
-        timeout=8,
-    )
+    if res.status_code != 200:
+        return None
+    return res.json()
 
-    if forecast_res.status_code != 200:
-        raise HTTPException(status_code=503, detail="Forecast service unavailable")
 
-    forecast = forecast_res.json()
+def format_current(current: dict) -> dict:
+    return {
+        "temperature": current["main"]["temp"],
+        "humidity": current["main"]["humidity"],
+        "weather": current["weather"][0]["description"].title(),
+        "wind_speed": current["wind"]["speed"],
+    }
 
-    if "list" not in forecast:
-        raise HTTPException(status_code=500, detail="Invalid forecast response")
 
-    forecast_24h = [
+def format_forecast_24h(forecast: dict) -> list:
+    return [
         {
             "time": item["dt_txt"],
             "temperature": item["main"]["temp"],
@@ -111,100 +100,421 @@ def get_weather_forecast(district: str):
         for item in forecast["list"][:8]
     ]
 
+
+def soil_temperature_payload(temp) -> dict:
+    temp = round(temp, 1) if temp is not None else None
+    temp_status = "Optimal" if temp is not None and 15 <= temp <= 25 else ("Low" if temp is not None and temp < 15 else ("High" if temp is not None and temp > 25 else None))
+    temp_advisory = (
+        "Ideal soil temperature for most crops." if temp_status == "Optimal" else
+        "Soil temperature is below optimal. Consider warming measures." if temp_status == "Low" else
+        "Soil temperature is above optimal. Consider cooling/irrigation." if temp_status == "High" else
+        "Temperature data unavailable"
+    )
+    return {
+        "value": temp,
+        "unit": "°C",
+        "status": temp_status,
+        "advisory": temp_advisory,
+        "source": "MODIS (Google Earth Engine)"
+    }
+
+
+def soil_moisture_payload(moisture) -> dict:
+    """`moisture` is the raw SMAP volumetric fraction (m³/m³)"""
+    moisture = round(moisture * 100, 1) if moisture is not None else None
+    # Use correct optimal range: 20-35%
+    if moisture is not None:
+        if 20 <= moisture <= 35:
+            moisture_status = "Optimal"
+            moisture_advisory = "Soil moisture is within the optimal range for crops."
+        elif moisture < 20:
+            moisture_status = "Below optimal"
+            moisture_advisory = "Soil moisture is below optimal. Consider irrigation."
+        elif moisture > 35:
+            moisture_status = "Above optimal"
+            moisture_advisory = "Soil moisture is above optimal. Consider drainage."
+        else:
+            moisture_status = None
+            moisture_advisory = "Moisture data unavailable"
+    else:
+        moisture_status = None
+        moisture_advisory = "Moisture data unavailable"
+    return {
+        "value": moisture,
+        "unit": "%",
+        "status": moisture_status,
+        "advisory": moisture_advisory,
+        "source": "NASA SMAP (Google Earth Engine)"
+    }
+
+
+async def _soil_reading(layer: str, op: str, compute, lat: float, lon: float):
+    """Raster store value, else the Earth Engine computation on the EE executor"""
+    hit, value = raster_store.lookup(layer, lat, lon)
+    if hit:
+        return value
+    return await ee_executor.run_async(op, (lat, lon), lambda: compute(lat, lon))
+
+
+def _ee_soil_temperature(lat: float, lon: float):
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+    point = ee.Geometry.Point(lon, lat)
+    # MODIS Land Surface Temperature (LST) - use most recent image
+    modis = ee.ImageCollection(MODIS_LST_COLLECTION) \
+        .filterBounds(point) \
+        .sort('system:time_start', False) \
+        .first()
+    # MODIS LST is in Kelvin*0.02, convert to Celsius
+    lst = modis.select('LST_Day_1km').multiply(0.02).subtract(273.15)
+    return lst.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=point,
+        scale=1000,
+        maxPixels=1e9
+    ).get('LST_Day_1km').getInfo()
+
+
+def _ee_soil_moisture(lat: float, lon: float):
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+    point = ee.Geometry.Point(lon, lat)
+    smap = ee.ImageCollection(SMAP_COLLECTION) \
+        .filterBounds(point) \
+        .sort('system:time_start', False) \
+        .first()
+    # The new dataset's surface soil moisture band is 'sm_surface' (see GEE docs)
+    sm = smap.select('sm_surface')
+    return sm.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=point,
+        scale=10000,
+        maxPixels=1e9
+    ).get('sm_surface').getInfo()
+
+
+def _latest_mosaic(collection_id: str, region):
+    col = ee.ImageCollection(collection_id).filterBounds(region)
+    latest = col.aggregate_max("system:time_start")
+    return col.filter(ee.Filter.eq("system:time_start", latest)).mosaic()
+
+
+def fetch_district_soil_batch(districts: list) -> dict:
+    """LST, soil moisture and NDVI for many districts in one Earth Engine round trip
+
+    Returns {district: {"lst": °C, "sm": m³/m³, "ndvi": float}} (values may be None).
+    """
+    from app.soil_health import (
+        S2_COLLECTION, NDVI_START, NDVI_END, MAX_CLOUD_PERCENT, SAMPLE_RADIUS_M,
+    )
+
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+
+    points = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point(DISTRICT_COORDS[d][1], DISTRICT_COORDS[d][0]), {"district": d})
+        for d in districts
+    ])
+    buffers = points.map(lambda f: f.buffer(SAMPLE_RADIUS_M))
+    bounds = buffers.geometry().bounds()
+
+    lst = _latest_mosaic(MODIS_LST_COLLECTION, bounds) \
+        .select('LST_Day_1km').multiply(0.02).subtract(273.15).rename("lst")
+    sm = _latest_mosaic(SMAP_COLLECTION, bounds).select('sm_surface').rename("sm")
+    soil = lst.addBands(sm).reduceRegions(
+        collection=points, reducer=ee.Reducer.mean(), scale=1000
+    ).select(["district", "lst", "sm"], None, False)
+
+    ndvi = (
+        ee.ImageCollection(S2_COLLECTION)
+        .filterBounds(bounds)
+        .filterDate(NDVI_START, NDVI_END)
+        .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", MAX_CLOUD_PERCENT))
+        .median()
+        .normalizedDifference(["B8", "B4"])
+        .rename("ndvi")
+        .reduceRegions(collection=buffers, reducer=ee.Reducer.mean(), scale=30)
+        .select(["district", "ndvi"], None, False)
+    )
+
+    info = ee.Dictionary({"soil": soil, "ndvi": ndvi}).getInfo()
+
+    result = {d: {"lst": None, "sm": None, "ndvi": None} for d in districts}
+    for feature in info["soil"]["features"] + info["ndvi"]["features"]:
+        props = feature.get("properties", {})
+        row = result.get(props.get("district"))
+        if row is not None:
+            for name in ("lst", "sm", "ndvi"):
+                if props.get(name) is not None:
+                    row[name] = props[name]
+    return result
+
+
+def _fetch_district_weather(district: str, lat: float, lon: float) -> dict:
+    # One bulk request is two calls per district, about a minute's budget: run it on
+    # the prefetch lane so it leaves its reserve to alerts and single lookups, and
+    # let the archive answer for the districts past that share
+    current = fetch_openweather("weather", lat, lon, district, priority="prefetch", caller="weather_bulk")
+    if current is None:
+        raise RuntimeError("Weather service unavailable")
+    forecast = fetch_openweather("forecast", lat, lon, district, priority="prefetch", caller="weather_bulk")
+    if forecast is None or "list" not in forecast:
+        raise RuntimeError("Forecast service unavailable")
+
+    row = format_current(current)
+    slots = format_forecast_24h(forecast)
+    temps = [s["temperature"] for s in slots] or [row["temperature"]]
+    row["temp_max_24h"] = max(temps)
+    row["temp_min_24h"] = min(temps)
+    row["rain_24h"] = round(sum(s["rainfall"] for s in slots), 1)
+    return row
+
+
+BULK_WEATHER_COLUMNS = [
+    "temperature", "humidity", "weather", "wind_speed",
+    "temp_max_24h", "temp_min_24h", "rain_24h",
+]
+
+
+_bulk_cache = TTLCache(maxsize=1, ttl=BULK_CACHE_TTL)
+_bulk_flight = SingleFlight()
+
+
+@router.get("/bulk")
+def get_bulk_weather():
+    """Weather and soil readings for every district as a columnar payload
+
+    Built at most once per BULK_CACHE_TTL and shared by concurrent callers,
+    so page loads don't each spend the OpenWeather minute budget.
+    """
+    data = _bulk_cache.get("bulk")
+    cached = data is not None
+    if not cached:
+        def load():
+            fresh = _bulk_cache.get("bulk")
+            if fresh is None:
+                fresh = _build_bulk_weather()
+                _bulk_cache.set("bulk", fresh)
+            return fresh
+
+        data = _bulk_flight.do("bulk", load)
+    return {**data, "cached": cached}
+
+
+def _build_bulk_weather() -> dict:
+    districts = list(DISTRICT_COORDS)
+    errors = []
+
+    # The soil batch runs on the Earth Engine executor while the weather fans out here
+    with ThreadPoolExecutor(max_workers=BULK_CONCURRENCY) as pool:
+        soil_future = pool.submit(
+            ee_executor.run, "soil_batch", tuple(districts), lambda: fetch_district_soil_batch(districts)
+        )
+        weather_futures = [pool.submit(_fetch_district_weather, d, *DISTRICT_COORDS[d]) for d in districts]
+
+        rows = []
+        for district, future in zip(districts, weather_futures):
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                rows.append({})
+                errors.append({"district": district, "component": "weather", "error": str(e)})
+
+        try:
+            soil = soil_future.result()
+        except Exception as e:
+            soil = {}
+            errors.append({"district": None, "component": "earth_engine", "error": getattr(e, "detail", str(e))})
+
+    columns = {
+        "latitude": [DISTRICT_COORDS[d][0] for d in districts],
+        "longitude": [DISTRICT_COORDS[d][1] for d in districts],
+    }
+    for name in BULK_WEATHER_COLUMNS:
+        columns[name] = [row.get(name) for row in rows]
+
+    soil_rows = [soil.get(d, {}) for d in districts]
+    columns["soil_temperature"] = [soil_temperature_payload(r.get("lst"))["value"] for r in soil_rows]
+    columns["soil_moisture"] = [soil_moisture_payload(r.get("sm"))["value"] for r in soil_rows]
+    columns["ndvi"] = [round(r["ndvi"], 3) if r.get("ndvi") is not None else None for r in soil_rows]
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "districts": districts,
+        "units": {
+            "temperature": "°C", "wind_speed": "m/s", "rain_24h": "mm",
+            "soil_temperature": "°C", "soil_moisture": "%",
+        },
+        "columns": columns,
+        "errors": errors,
+    }
+
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+_point_cache = TTLCache(maxsize=POINT_CACHE_SIZE, ttl=POINT_CACHE_TTL)
+_point_flight = SingleFlight()
+
+
+def geohash_cell(lat: float, lon: float, precision: int = POINT_GEOHASH_PRECISION):
+    """Return (geohash, (south, west, north, east)) of the cell containing the point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_ALPHABET[ch])
+            bits, ch = 0, 0
+    return "".join(chars), (lat_range[0], lon_range[0], lat_range[1], lon_range[1])
+
+
+def _fetch_cell_weather(cell_lat: float, cell_lon: float) -> dict:
+    current = fetch_openweather("weather", cell_lat, cell_lon, caller="weather_point")
+    forecast = fetch_openweather("forecast", cell_lat, cell_lon, caller="weather_point")
+    if current is None or forecast is None or "list" not in forecast:
+        raise HTTPException(status_code=503, detail="Weather service unavailable")
+    return {
+        "current_weather": format_current(current),
+        "forecast_24h": format_forecast_24h(forecast),
+    }
+
+
+@router.get("/point")
+def get_point_weather(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    """Weather for arbitrary coordinates, shared per geohash cell"""
+    cell, (south, west, north, east) = geohash_cell(lat, lon)
+    cell_lat, cell_lon = round((south + north) / 2, 5), round((west + east) / 2, 5)
+
+    data = _point_cache.get(cell)
+    cached = data is not None
+    if not cached:
+        def load():
+            # Another leader may have filled the cell between our miss and now
+            fresh = _point_cache.get(cell)
+            if fresh is None:
+                fresh = _fetch_cell_weather(cell_lat, cell_lon)
+                _point_cache.set(cell, fresh)
+            return fresh
+
+        data = _point_flight.do(cell, load)
+
+    nearest = geocoder.nearest_district(lat, lon)
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "district": nearest[0] if nearest else None,
+        "cell": cell,
+        "cell_center": {"latitude": cell_lat, "longitude": cell_lon},
+        "cached": cached,
+        **data,
+    }
+
+
+def point_cache_stats() -> dict:
+    return {"cache": _point_cache.stats(), "single_flight": _point_flight.stats()}
+
+
+def bulk_cache_stats() -> dict:
+    return {"cache": _bulk_cache.stats(), "single_flight": _bulk_flight.stats()}
+
+
+@router.get("/history/{district}")
+def get_weather_history(
+    district: str,
+    kind: str = "current",
+    hours: int = Query(24 * 7, ge=1, le=weather_archive.ARCHIVE_QUERY_MAX_HOURS),
+    metric: Optional[str] = None,
+    agg: str = "sum",
+    bucket: Optional[str] = None,
+):
+    """Archived observations/forecasts for the last `hours`, optionally aggregated"""
+    if kind not in weather_archive.KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {weather_archive.KINDS}")
+    if bucket is not None and bucket not in weather_archive.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {weather_archive.BUCKETS}")
+    end = int(datetime.utcnow().timestamp())
+    start = end - hours * 3600
+
+    if metric:
+        try:
+            return weather_archive.aggregate(district, kind, metric, agg, start, end, bucket)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    data = weather_archive.query(district, kind, start, end)
+    return {
+        "district": weather_archive.district_key(district),
+        "kind": kind,
+        "columns": {name: values.tolist() for name, values in data.items() if name != "district"},
+    }
+
+
+@router.get("/{district}")
+async def get_weather_forecast(district: str):
+    coords = await run_in_threadpool(geocode_place, district)
+    if not coords:
+        raise HTTPException(status_code=404, detail="Location not found")
+    lat, lon = coords
+
+    # Earth Engine readings queue on the EE executor while OpenWeather is fetched
+    from app.soil_health import soil_health as get_soil_health
+    earth_engine = asyncio.gather(
+        get_soil_health(district),
+        _soil_reading("lst", "modis_lst", _ee_soil_temperature, lat, lon),
+        _soil_reading("sm", "smap_sm", _ee_soil_moisture, lat, lon),
+        return_exceptions=True,
+    )
+
+    # -------- CURRENT WEATHER / FORECAST --------
+    current, forecast = await asyncio.gather(
+        run_in_threadpool(fetch_openweather, "weather", lat, lon, district),
+        run_in_threadpool(fetch_openweather, "forecast", lat, lon, district),
+    )
+    if current is None:
+        raise HTTPException(status_code=503, detail="Weather service unavailable")
+    if forecast is None:
+        raise HTTPException(status_code=503, detail="Forecast service unavailable")
+
+    if "list" not in forecast:
+        raise HTTPException(status_code=500, detail="Invalid forecast response")
+
+    soil_health_data, soil_temp, soil_moisture = await earth_engine
+    if isinstance(soil_health_data, Exception):
+        soil_health_data = None
+
     # Compose response with soil data if available
     response = {
         "district": district,
         "latitude": lat,
         "longitude": lon,
-        "current_weather": {
-            "temperature": current["main"]["temp"],
-            "humidity": current["main"]["humidity"],
-            "weather": current["weather"][0]["description"].title(),
-            "wind_speed": current["wind"]["speed"],
-        },
-        "forecast_24h": forecast_24h,
+        "current_weather": format_current(current),
+        "forecast_24h": format_forecast_24h(forecast),
     }
+    if current.get("archived") or forecast.get("archived"):
+        response["weather_source"] = "archive"
     if soil_health_data:
         response["soil_health_status"] = soil_health_data.get("soil_health_status")
         response["soil_ndvi"] = soil_health_data.get("ndvi")
         response["soil_advisory"] = soil_health_data.get("advisory")
         response["soil_health_source"] = soil_health_data.get("source")
-    # --- Get real soil temperature from MODIS (Google Earth Engine) ---
-    try:
-        import ee
-        ee.Initialize(project="tidy-federation-479517-v3")
-        point = ee.Geometry.Point(lon, lat)
-        # MODIS Land Surface Temperature (LST) - use most recent image
-        modis = ee.ImageCollection("MODIS/061/MOD11A2") \
-            .filterBounds(point) \
-            .sort('system:time_start', False) \
-            .first()
-        # MODIS LST is in Kelvin*0.02, convert to Celsius
-        lst = modis.select('LST_Day_1km').multiply(0.02).subtract(273.15)
-        temp = lst.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=point,
-            scale=1000,
-            maxPixels=1e9
-        ).get('LST_Day_1km').getInfo()
-        temp = round(temp, 1) if temp is not None else None
-        temp_status = "Optimal" if temp is not None and 15 <= temp <= 25 else ("Low" if temp is not None and temp < 15 else ("High" if temp is not None and temp > 25 else None))
-        temp_advisory = (
-            "Ideal soil temperature for most crops." if temp_status == "Optimal" else
-            "Soil temperature is below optimal. Consider warming measures." if temp_status == "Low" else
-            "Soil temperature is above optimal. Consider cooling/irrigation." if temp_status == "High" else
-            "Temperature data unavailable"
-        )
-        response["soil_temperature"] = {
-            "value": temp,
-            "unit": "°C",
-            "status": temp_status,
-            "advisory": temp_advisory,
-            "source": "MODIS (Google Earth Engine)"
-        }
-    except Exception as e:
-        response["soil_temperature"] = {"value": None, "unit": "°C", "status": None, "advisory": "Temperature data unavailable", "source": "MODIS (Google Earth Engine)"}
 
-    # --- Get real soil moisture from NASA SMAP (Google Earth Engine) ---
-    try:
-        smap = ee.ImageCollection("NASA/SMAP/SPL4SMGP/008") \
-            .filterBounds(point) \
-            .sort('system:time_start', False) \
-            .first()
-        # The new dataset's surface soil moisture band is 'sm_surface' (see GEE docs)
-        sm = smap.select('sm_surface')
-        moisture = sm.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=point,
-            scale=10000,
-            maxPixels=1e9
-        ).get('sm_surface').getInfo()
-        moisture = round(moisture * 100, 1) if moisture is not None else None
-        # Use correct optimal range: 20-35%
-        if moisture is not None:
-            if 20 <= moisture <= 35:
-                moisture_status = "Optimal"
-                moisture_advisory = "Soil moisture is within the optimal range for crops."
-            elif moisture < 20:
-                moisture_status = "Below optimal"
-                moisture_advisory = "Soil moisture is below optimal. Consider irrigation."
-            elif moisture > 35:
-                moisture_status = "Above optimal"
-                moisture_advisory = "Soil moisture is above optimal. Consider drainage."
-            else:
-                moisture_status = None
-                moisture_advisory = "Moisture data unavailable"
-        else:
-            moisture_status = None
-            moisture_advisory = "Moisture data unavailable"
-        response["soil_moisture"] = {
-            "value": moisture,
-            "unit": "%",
-            "status": moisture_status,
-            "advisory": moisture_advisory,
-            "source": "NASA SMAP (Google Earth Engine)"
-        }
-    except Exception as e:
-        response["soil_moisture"] = {"value": None, "unit": "%", "status": None, "advisory": "Moisture data unavailable", "source": "NASA SMAP (Google Earth Engine)"}
+    # --- Real soil temperature from MODIS (Google Earth Engine) ---
+    response["soil_temperature"] = soil_temperature_payload(
+        None if isinstance(soil_temp, Exception) else soil_temp
+    )
+
+    # --- Real soil moisture from NASA SMAP (Google Earth Engine) ---
+    response["soil_moisture"] = soil_moisture_payload(
+        None if isinstance(soil_moisture, Exception) else soil_moisture
+    )
 
     return response
@@ -0,0 +1,328 @@
+"""
+Append-only archive of OpenWeather current and 3-hourly forecast records.
+
+Every payload fetched for a district is normalised into columns and written
+as a small compressed .npz part inside a per-day partition:
+
+    Data/weather_archive/<kind>/<YYYY-MM-DD>/part-<time_ns>-<pid>-<thread>.npz
+
+`compact()` merges a day's parts into one file; the writer triggers it for
+a partition every ARCHIVE_COMPACT_EVERY parts and runs `compact_all()` for
+past days once a day, so reads stay bounded. `query()` / `aggregate()`
+answer time-range questions from disk, and `fallback_current()` /
+`fallback_forecast()` rebuild OpenWeather-shaped payloads when the API is
+unreachable.
+"""
+
+import glob
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.geocoder import normalize, resolve_district
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.getenv("WEATHER_ARCHIVE_DIR", os.path.join(BASE_DIR, "Data", "weather_archive"))
+FALLBACK_CURRENT_MAX_AGE = int(os.getenv("WEATHER_FALLBACK_MAX_AGE", 6 * 3600))
+ARCHIVE_COMPACT_EVERY = int(os.getenv("WEATHER_ARCHIVE_COMPACT_EVERY", 50))
+ARCHIVE_COMPACT_ALL_INTERVAL = 24 * 3600
+BUCKETS = ("day",)
+# Longest window history queries may span
+ARCHIVE_QUERY_MAX_HOURS = int(os.getenv("WEATHER_ARCHIVE_QUERY_MAX_HOURS", 366 * 24))
+
+KINDS = ("current", "forecast")
+NUMERIC_COLUMNS = [
+    "ts", "fetched_at", "temp", "temp_min", "temp_max", "humidity",
+    "pressure", "wind_speed", "rain_mm", "clouds",
+]
+TEXT_COLUMNS = ["district", "weather"]
+
+_write_lock = threading.Lock()
+_compact_lock = threading.Lock()  # one compaction at a time in this process
+_parts_written: Dict[str, int] = {}  # partition path -> parts written since its last compaction
+_last_compact_all = 0.0
+
+
+def district_key(district: str) -> str:
+    return resolve_district(district) or normalize(district)
+
+
+def _normalize_item(item: Dict, rain_key: str) -> Dict:
+    main = item.get("main", {}) or {}
+    weather = (item.get("weather") or [{}])[0] or {}
+    return {
+        "ts": item.get("dt") or 0,
+        "temp": main.get("temp"),
+        "temp_min": main.get("temp_min"),
+        "temp_max": main.get("temp_max"),
+        "humidity": main.get("humidity"),
+        "pressure": main.get("pressure"),
+        "wind_speed": (item.get("wind", {}) or {}).get("speed"),
+        "rain_mm": (item.get("rain", {}) or {}).get(rain_key) or 0,
+        "clouds": (item.get("clouds", {}) or {}).get("all"),
+        "weather": weather.get("description") or "",
+    }
+
+
+def _to_columns(rows: List[Dict], district: str, fetched_at: int) -> Dict[str, np.ndarray]:
+    columns = {}
+    for name in NUMERIC_COLUMNS:
+        if name == "fetched_at":
+            columns[name] = np.full(len(rows), fetched_at, dtype=np.int64)
+        elif name == "ts":
+            columns[name] = np.array([r["ts"] for r in rows], dtype=np.int64)
+        else:
+            columns[name] = np.array(
+                [np.nan if r[name] is None else r[name] for r in rows], dtype=np.float32
+            )
+    columns["district"] = np.array([district] * len(rows), dtype=str)
+    columns["weather"] = np.array([r["weather"] for r in rows], dtype=str)
+    return columns
+
+
+def _day(ts: int) -> str:
+    return datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def _write_parts(kind: str, columns: Dict[str, np.ndarray], fetched_at: int):
+    days = np.array([_day(int(ts)) for ts in columns["ts"]])
+    for day in np.unique(days):
+        mask = days == day
+        part_dir = os.path.join(ARCHIVE_DIR, kind, str(day))
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.npz")
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, **{name: values[mask] for name, values in columns.items()})
+        os.replace(tmp, path)
+        _parts_written[part_dir] = _parts_written.get(part_dir, 0) + 1
+
+
+def record(kind: str, district: str, payload: Dict):
+    """Archive an OpenWeather `weather` (kind="current") or `forecast` payload"""
+    if kind not in KINDS or not payload:
+        return
+    try:
+        if kind == "current":
+            rows = [_normalize_item(payload, "1h")]
+        else:
+            rows = [_normalize_item(item, "3h") for item in payload.get("list", [])]
+        rows = [r for r in rows if r["ts"]]
+        if not rows:
+            return
+        fetched_at = int(time.time())
+        columns = _to_columns(rows, district_key(district), fetched_at)
+        with _write_lock:
+            _write_parts(kind, columns, fetched_at)
+        _schedule_compaction(kind)
+    except Exception as e:
+        print(f"🔥 Weather archive write error ({kind}, {district}): {e}")
+
+
+def _schedule_compaction(kind: str):
+    """Compact busy partitions, and past days once a day, off the request path"""
+    global _last_compact_all
+    jobs = []
+    with _write_lock:
+        for part_dir, count in list(_parts_written.items()):
+            if count >= ARCHIVE_COMPACT_EVERY and os.path.dirname(part_dir) == os.path.join(ARCHIVE_DIR, kind):
+                _parts_written[part_dir] = 0
+                jobs.append((compact, (kind, os.path.basename(part_dir))))
+        if time.time() - _last_compact_all > ARCHIVE_COMPACT_ALL_INTERVAL:
+            _last_compact_all = time.time()
+            jobs.append((compact_all, ()))
+    for fn, args in jobs:
+        threading.Thread(target=_run_compaction, args=(fn, args), name="weather-archive-compact", daemon=True).start()
+
+
+def _run_compaction(fn, args):
+    try:
+        fn(*args)
+    except Exception as e:
+        print(f"🔥 Weather archive compaction error: {e}")
+
+
+def _partition_dirs(kind: str, start: int, end: int) -> List[str]:
+    dirs = []
+    day = datetime.utcfromtimestamp(start).date()
+    last = datetime.utcfromtimestamp(end).date()
+    while day <= last:
+        path = os.path.join(ARCHIVE_DIR, kind, day.isoformat())
+        if os.path.isdir(path):
+            dirs.append(path)
+        day += timedelta(days=1)
+    return dirs
+
+
+def _part_files(path: str) -> List[str]:
+    return sorted(f for f in glob.glob(os.path.join(path, "part-*.npz")) if not f.endswith(".tmp.npz"))
+
+
+def _load_files(files: List[str]) -> Optional[Dict[str, np.ndarray]]:
+    """Concatenate parts; raises FileNotFoundError if one vanished meanwhile"""
+    parts = []
+    for file in files:
+        with np.load(file, allow_pickle=False) as data:
+            parts.append({name: data[name] for name in data.files})
+    if not parts:
+        return None
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def _load_partition(path: str) -> Optional[Dict[str, np.ndarray]]:
+    # A concurrent compaction replaces parts with one merged file; list again and reload
+    for _ in range(3):
+        try:
+            return _load_files(_part_files(path))
+        except FileNotFoundError:
+            continue
+    print(f"⚠️ Weather archive partition {path} kept changing while reading; skipped")
+    return None
+
+
+def query(district: str, kind: str, start: int, end: int, latest_only: bool = True) -> Dict[str, np.ndarray]:
+    """Columns for one district with `start <= ts <= end` (epoch seconds), sorted by ts
+
+    For forecasts the same slot is fetched many times; `latest_only` keeps the
+    most recently fetched value per timestamp.
+    """
+    key = district_key(district)
+    chunks = []
+    for path in _partition_dirs(kind, start, end):
+        data = _load_partition(path)
+        if data is None:
+            continue
+        mask = (data["district"] == key) & (data["ts"] >= start) & (data["ts"] <= end)
+        if mask.any():
+            chunks.append({name: values[mask] for name, values in data.items()})
+
+    if not chunks:
+        return {name: np.array([]) for name in NUMERIC_COLUMNS + TEXT_COLUMNS}
+
+    merged = {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+    order = np.lexsort((merged["fetched_at"], merged["ts"]))
+    merged = {name: values[order] for name, values in merged.items()}
+
+    if latest_only and len(merged["ts"]):
+        # After sorting, the last row of each ts run is the newest fetch
+        keep = np.append(merged["ts"][1:] != merged["ts"][:-1], True)
+        merged = {name: values[keep] for name, values in merged.items()}
+    return merged
+
+
+AGGREGATIONS = {
+    "sum": np.nansum,
+    "mean": np.nanmean,
+    "min": np.nanmin,
+    "max": np.nanmax,
+}
+
+
+def aggregate(district: str, kind: str, metric: str, agg: str, start: int, end: int,
+              bucket: Optional[str] = None) -> Dict:
+    """Aggregate one metric over a time range, optionally per UTC day"""
+    if metric not in NUMERIC_COLUMNS or agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported metric/aggregation: {metric}/{agg}")
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"Unsupported bucket: {bucket} (supported: {', '.join(BUCKETS)})")
+
+    data = query(district, kind, start, end)
+    values = data[metric].astype(np.float64)
+    fn = AGGREGATIONS[agg]
+    result = {"district": district_key(district), "metric": metric, "agg": agg, "count": int(len(values))}
+
+    if bucket == "day":
+        days = np.array([_day(int(ts)) for ts in data["ts"]])
+        result["buckets"] = {
+            str(day): float(fn(values[days == day])) for day in np.unique(days)
+        }
+    else:
+        result["value"] = float(fn(values)) if len(values) else None
+    return result
+
+
+def _shape_item(data: Dict[str, np.ndarray], i: int, rain_key: str) -> Dict:
+    def num(name):
+        v = float(data[name][i])
+        return None if np.isnan(v) else v
+
+    ts = int(data["ts"][i])
+    return {
+        "dt": ts,
+        "dt_txt": datetime.utcfromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        "main": {
+            "temp": num("temp"),
+            "temp_min": num("temp_min"),
+            "temp_max": num("temp_max"),
+            "humidity": num("humidity"),
+            "pressure": num("pressure"),
+        },
+        "weather": [{"description": str(data["weather"][i])}],
+        "wind": {"speed": num("wind_speed")},
+        "rain": {rain_key: num("rain_mm") or 0},
+        "clouds": {"all": num("clouds")},
+    }
+
+
+def fallback_current(district: str, max_age: int = FALLBACK_CURRENT_MAX_AGE) -> Optional[Dict]:
+    """Most recent archived observation, shaped like an OpenWeather `weather` payload"""
+    now = int(time.time())
+    data = query(district, "current", now - max_age, now)
+    if not len(data["ts"]):
+        return None
+    payload = _shape_item(data, len(data["ts"]) - 1, "1h")
+    payload["archived"] = True
+    return payload
+
+
+def fallback_forecast(district: str) -> Optional[Dict]:
+    """Archived forecast slots from now onwards, shaped like an OpenWeather `forecast` payload"""
+    now = int(time.time())
+    data = query(district, "forecast", now - 3 * 3600, now + 6 * 24 * 3600)
+    if not len(data["ts"]):
+        return None
+    return {
+        "list": [_shape_item(data, i, "3h") for i in range(len(data["ts"]))],
+        "archived": True,
+    }
+
+
+def compact(kind: str, day: str):
+    """Merge one day's parts into a single file"""
+    path = os.path.join(ARCHIVE_DIR, kind, day)
+    with _compact_lock:
+        files = _part_files(path)
+        if len(files) < 2:
+            return
+        # Merge exactly the listed files; parts written meanwhile stay as they are.
+        # Loading and compressing run outside _write_lock so record() is not held up.
+        try:
+            data = _load_files(files)
+        except FileNotFoundError:
+            return  # another process is compacting this partition
+        target = os.path.join(path, f"part-{time.time_ns()}-{os.getpid()}-compacted.npz")
+        np.savez_compressed(target + ".tmp.npz", **data)
+        with _write_lock:
+            os.replace(target + ".tmp.npz", target)
+            for f in files:
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+
+
+def compact_all(older_than_days: int = 1):
+    """Compact every partition older than `older_than_days` (run from cron)"""
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+    for kind in KINDS:
+        for path in sorted(glob.glob(os.path.join(ARCHIVE_DIR, kind, "*"))):
+            day = os.path.basename(path)
+            if day < cutoff:
+                compact(kind, day)
+
+
+if __name__ == "__main__":
+    compact_all()
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+
+from app import alert_rules
+
+
+def _reference_alerts(current_weather, forecast_24h):
+    """The hand-written check_weather_alerts the rule table replaced"""
+    if not current_weather:
+        return None
+
+    alerts = []
+    main = current_weather.get("main", {})
+    weather = current_weather.get("weather", [{}])[0]
+    wind = current_weather.get("wind", {})
+
+    temp = main.get("temp", 0)
+    humidity = main.get("humidity", 0)
+    wind_speed = wind.get("speed", 0)
+    weather_desc = (weather.get("description", "") or "").lower()
+
+    temps = [temp]
+    humidities = [humidity]
+    rain_slots = []
+    wind_slots = []
+    for item in forecast_24h or []:
+        main_f = item.get("main", {})
+        temps.append(main_f.get("temp", temp))
+        humidities.append(main_f.get("humidity", humidity))
+        rain_val = (item.get("rain", {}) or {}).get("3h") or 0
+        wind_val = (item.get("wind", {}) or {}).get("speed") or 0
+        ts = item.get("dt_txt") or item.get("dt")
+        if rain_val > 0:
+            rain_slots.append((rain_val, ts))
+        if wind_val >= 9:
+            wind_slots.append((wind_val, ts))
+
+    max_temp = max(temps)
+    min_temp = min(temps)
+    max_humidity = max(humidities)
+    high_humidity_hours = sum(1 for h in humidities if h >= 80)
+    total_rain = sum(r[0] for r in rain_slots)
+    heavy_rain_slots = [r for r in rain_slots if r[0] >= 10]
+
+    def fmt_time(ts):
+        try:
+            if isinstance(ts, (int, float)):
+                dt = datetime.utcfromtimestamp(ts)
+            else:
+                dt = datetime.strptime(str(ts), "%Y-%m-%d %H:%M:%S")
+            return dt.strftime("%d %b, %I %p").lstrip("0").replace(" 0", " ")
+        except Exception:
+            return "soon"
+
+    if max_temp >= 38:
+        alerts.append(f"🔥 Heatwave risk {max_temp:.0f}°C. Avoid 11-4, increase irrigation, shade tender crops.")
+    elif max_temp >= 34:
+        alerts.append(f"☀️ Hot day {max_temp:.0f}°C. Irrigate early morning/evening to reduce stress.")
+    if min_temp <= 12:
+        alerts.append(f"❄️ Cold night {min_temp:.0f}°C. Protect seedlings; avoid late-evening irrigation.")
+    if max_temp - min_temp >= 12:
+        alerts.append(f"📊 Large temp swing ({min_temp:.0f}–{max_temp:.0f}°C). Maintain soil moisture to buffer stress.")
+
+    if total_rain >= 20:
+        alerts.append(f"🌧️ Heavy rain ~{total_rain:.1f}mm next 24h. Ensure drainage; postpone spraying/fertilizer.")
+    elif total_rain >= 5:
+        alerts.append(f"🌦️ Moderate rain ~{total_rain:.1f}mm. Good soil moisture; plan field work before showers.")
+    elif total_rain > 0:
+        alerts.append(f"💧 Light rain ~{total_rain:.1f}mm. Minor benefit; plan spray 4-6h before rain.")
+
+    if heavy_rain_slots:
+        times = ", ".join(fmt_time(ts) for _, ts in heavy_rain_slots[:2])
+        alerts.append(f"⏰ Heavy bursts expected around {times}. Secure inputs, cover harvested produce.")
+    if rain_slots:
+        times = ", ".join(fmt_time(ts) for _, ts in rain_slots[:2])
+        alerts.append(f"⏰ Rain likely around {times}. Schedule spraying/harvest before then.")
+    elif max_humidity >= 80 and high_humidity_hours >= 3:
+        alerts.append(f"💨 Prolonged humidity ({high_humidity_hours}h >80%). Improve airflow; monitor fungal spots.")
+
+    if wind_speed >= 12 or any(w[0] >= 12 for w in wind_slots):
+        alerts.append("💨 Strong winds. Avoid spraying; secure lightweight structures and support tall plants.")
+    elif wind_speed >= 8 or any(w[0] >= 9 for w in wind_slots):
+        alerts.append("🍃 Moderate winds. Check wind direction before spraying; stake tall crops if needed.")
+
+    if "fog" in weather_desc or "mist" in weather_desc:
+        alerts.append("🌫️ Low visibility due to fog. Be cautious during transport/field work.")
+
+    if not alerts:
+        alerts.append("✅ Conditions favorable. Good window for sowing/field operations.")
+    return " | ".join(alerts[:3])
+
+
+EDGE_CASES = [
+    ({"main": {"temp": 25, "humidity": 50}}, None),
+    ({"main": {"temp": 25, "humidity": 50}, "weather": [{"description": "Mist"}]}, []),
+    ({"main": {"temp": 40, "humidity": 20}, "wind": {"speed": 13}}, None),
+    ({"main": {"temp": 30, "humidity": 85}}, [
+        {"dt_txt": "2026-06-01 03:00:00", "main": {"humidity": 90}},
+        {"dt_txt": "2026-06-01 06:00:00", "main": {"humidity": 88}, "rain": {"3h": 12.5}},
+        {"dt_txt": "2026-06-01 09:00:00", "rain": {"3h": 11}, "wind": {"speed": 9}},
+    ]),
+]
+
+
+def test_batched_rules_match_reference():
+    locations = EDGE_CASES + alert_rules._synthetic_locations(500, 24, seed=7)
+    results = alert_rules.evaluate(alert_rules.normalize(locations, 24))
+    for (current, forecast), alerts in zip(locations, results):
+        assert alert_rules.alert_text(alerts) == _reference_alerts(current, forecast)
+
+
+@pytest.mark.parametrize("temp, rule_id, severity", [(39, "heatwave", "high"), (35, "hot_day", "medium")])
+def test_exclusive_group_shares_hazard(temp, rule_id, severity):
+    alerts = alert_rules.evaluate_one({"main": {"temp": temp, "humidity": 40}}, None)
+    assert [(a["rule"], a["hazard"], a["severity"]) for a in alerts] == [(rule_id, "temp_level", severity)]
+
+
+def test_fallback_when_nothing_fires():
+    alerts = alert_rules.evaluate_one({"main": {"temp": 25, "humidity": 50}}, None)
+    assert [a["rule"] for a in alerts] == ["favorable"]
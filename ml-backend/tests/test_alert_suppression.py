@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from app import alert_suppression
+
+
+@pytest.fixture(params=["local", "redis"])
+def store(request, monkeypatch):
+    """alert_suppression against its local fallback and against (fake) Redis"""
+    monkeypatch.setattr(alert_suppression, "_local", {})
+    monkeypatch.setattr(alert_suppression, "_script", None)
+    if request.param == "local":
+        monkeypatch.setattr(alert_suppression, "_redis_down_until", time.time() + 3600)
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        client = fakeredis.FakeRedis()
+        monkeypatch.setattr(alert_suppression, "_redis_down_until", 0.0)
+        monkeypatch.setattr(alert_suppression, "get_redis", lambda: client)
+    return alert_suppression
+
+
+def test_repeat_within_window_is_suppressed(store):
+    entry = ("farmer-1", "mysuru", "temp_level", "medium")
+    assert store.filter_new([entry]) == [True]
+    assert store.filter_new([entry]) == [False]
+
+
+def test_escalation_within_hazard_is_sent(store):
+    assert store.filter_new([("farmer-1", "mysuru", "temp_level", "medium")]) == [True]
+    assert store.filter_new([("farmer-1", "mysuru", "temp_level", "high")]) == [True]
+    # De-escalating back to a hot day is still covered by the heatwave alert
+    assert store.filter_new([("farmer-1", "mysuru", "temp_level", "medium")]) == [False]
+    assert store.filter_new([("farmer-1", "mysuru", "temp_level", "high")]) == [False]
+
+
+def test_entries_are_per_farmer_district_and_hazard(store):
+    store.filter_new([("farmer-1", "mysuru", "temp_level", "high")])
+    assert store.filter_new([
+        ("farmer-1", "mysuru", "temp_level", "high"),
+        ("farmer-2", "mysuru", "temp_level", "high"),
+        ("farmer-1", "udupi", "temp_level", "high"),
+        ("farmer-1", "mysuru", "wind", "high"),
+    ]) == [False, True, True, True]
+
+
+def test_window_expiry(store):
+    entry = ("farmer-1", "mysuru", "wind", "medium")
+    assert store.filter_new([entry], window=1) == [True]
+    time.sleep(1.1)
+    assert store.filter_new([entry], window=1) == [True]
+
+
+def test_forget_releases_entries(store):
+    entry = ("farmer-1", "mysuru", "rain_amount", "high")
+    assert store.filter_new([entry]) == [True]
+    store.forget([entry])
+    assert store.filter_new([entry]) == [True]
@@ -0,0 +1,35 @@
+import math
+import random
+
+from app import geocoder
+from app.district_centroids import DISTRICT_COORDS, DISTRICT_NAMES_KN
+
+
+_PROJECTED = {key: geocoder._project(lat, lon) for key, (lat, lon) in DISTRICT_COORDS.items()}
+
+
+def _brute_force(lat, lon):
+    x, y = geocoder._project(lat, lon)
+    return min(_PROJECTED, key=lambda key: (_PROJECTED[key][0] - x) ** 2 + (_PROJECTED[key][1] - y) ** 2)
+
+
+def test_kdtree_matches_brute_force():
+    rng = random.Random(11)
+    for _ in range(5000):
+        lat, lon = rng.uniform(11.4, 18.6), rng.uniform(73.9, 78.7)
+        _, key = geocoder._nearest(geocoder._kdtree, *geocoder._project(lat, lon), (math.inf, None))
+        assert key == _brute_force(lat, lon)
+
+
+def test_centroid_resolves_to_itself():
+    for key, (lat, lon) in DISTRICT_COORDS.items():
+        assert geocoder.nearest_district(lat, lon) == (key, 0.0)
+
+
+def test_points_outside_the_state_are_rejected():
+    assert geocoder.nearest_district(28.61, 77.21) is None  # New Delhi
+
+
+def test_kannada_names_resolve():
+    for key, name_kn in DISTRICT_NAMES_KN.items():
+        assert geocoder.resolve_district(f"{name_kn} ಜಿಲ್ಲೆ") == key